@@ -0,0 +1,28 @@
+"""Benchmark of device discovery with real mDNS traffic (opt-in).
+
+Simulated devices are advertised on the loopback interface and found with
+DysonPureCoolLink.auto_connect. Set DYSON_DISCOVERY_DEVICES to the number
+of devices to run it, 10% of them are replaced or expire while searching.
+"""
+
+import os
+
+import pytest
+
+from libpurecoollink.dyson_mdns_simulator import DiscoveryBenchmark
+
+DEVICES = int(os.environ.get("DYSON_DISCOVERY_DEVICES", "0"))
+
+
+def bench_auto_connect_discovery(benchmark):
+    if not DEVICES:
+        pytest.skip("DYSON_DISCOVERY_DEVICES not set")
+    discovery = DiscoveryBenchmark(DEVICES, churn=DEVICES // 10,
+                                   expired=DEVICES // 10)
+    result = benchmark.pedantic(discovery.run, rounds=1, iterations=1)
+    benchmark.extra_info.update(
+        devices=result.expected, discovered=result.discovered,
+        cpu_time=result.cpu_time, packets_sent=result.packets_sent,
+        bytes_sent=result.bytes_sent,
+        packets_dropped=result.packets_dropped)
+    assert result.complete, result
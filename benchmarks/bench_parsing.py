@@ -0,0 +1,52 @@
+"""Benchmarks of device messages parsing.
+
+Each round parses a whole corpus, messages per second are ops per second
+multiplied by the extra info "messages".
+"""
+
+from libpurecoollink.dyson_360_eye import Dyson360EyeState, \
+    Dyson360EyeMapGlobal, Dyson360EyeMapData, Dyson360EyeMapGrid, \
+    Dyson360EyeTelemetryData, Dyson360Goodbye
+from libpurecoollink.dyson_pure_state import DysonPureCoolState, \
+    DysonPureHotCoolState, DysonEnvironmentalSensorState
+from libpurecoollink.utils import decrypt_password
+
+
+def bench_pure_cool_state(run, corpus):
+    run(DysonPureCoolState, corpus["pure_state"])
+
+
+def bench_pure_hot_cool_state(run, corpus):
+    run(DysonPureHotCoolState, corpus["hot_state"])
+
+
+def bench_environmental_sensor_state(run, corpus):
+    run(DysonEnvironmentalSensorState, corpus["sensor"])
+
+
+def bench_360_eye_state(run, corpus):
+    run(Dyson360EyeState, corpus["eye_state"])
+
+
+def bench_360_eye_map_global(run, corpus):
+    run(Dyson360EyeMapGlobal, corpus["eye_map_global"])
+
+
+def bench_360_eye_map_data(run, corpus):
+    run(Dyson360EyeMapData, corpus["eye_map_data"])
+
+
+def bench_360_eye_map_grid(run, corpus):
+    run(Dyson360EyeMapGrid, corpus["eye_map_grid"])
+
+
+def bench_360_eye_telemetry_data(run, corpus):
+    run(Dyson360EyeTelemetryData, corpus["eye_telemetry"])
+
+
+def bench_360_eye_goodbye(run, corpus):
+    run(Dyson360Goodbye, corpus["eye_goodbye"])
+
+
+def bench_decrypt_password(run, corpus):
+    run(decrypt_password, corpus["credentials"])
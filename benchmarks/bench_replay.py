@@ -0,0 +1,57 @@
+"""Benchmarks of the whole message pipeline, replaying captured traffic.
+
+Each round connects a device to a ReplayTransport and replays a corpus
+through decoding, state construction and a listener. Messages per second
+are ops per second multiplied by the extra info "messages".
+"""
+
+from libpurecoollink.device_factory import DeviceFactory
+from libpurecoollink.dyson_replay import ReplayTransport
+from libpurecoollink.dyson_simulator import SimulatedPureCoolLink, \
+    Simulated360Eye
+
+
+def _listener(message):
+    pass
+
+
+def _records(topic, payloads):
+    return [(index, topic, payload.encode("utf-8"))
+            for index, payload in enumerate(payloads)]
+
+
+def _replay(simulated, records):
+    transport = ReplayTransport(records)
+    device = DeviceFactory().create(simulated.json_body())
+    device.client_factory = transport.client
+    device.add_message_listener(_listener)
+    device.connect("127.0.0.1")
+    transport.wait()
+    return device
+
+
+def bench_pure_cool_link_pipeline(benchmark, corpus):
+    simulated = SimulatedPureCoolLink("SIM-475")
+    records = _records(simulated.status_topic,
+                       corpus["pure_state"] + corpus["sensor"])
+    benchmark.extra_info["messages"] = len(records)
+
+    def replay():
+        _replay(simulated, records).disconnect()
+
+    benchmark(replay)
+
+
+def bench_360_eye_pipeline(benchmark, corpus):
+    simulated = Simulated360Eye("SIM-N223")
+    records = _records(simulated.status_topic,
+                       corpus["eye_state"] + corpus["eye_map_global"] +
+                       corpus["eye_map_data"] + corpus["eye_map_grid"] +
+                       corpus["eye_telemetry"])
+    benchmark.extra_info["messages"] = len(records)
+
+    def replay():
+        # pylint: disable=protected-access
+        _replay(simulated, records)._mqtt.loop_stop()
+
+    benchmark(replay)
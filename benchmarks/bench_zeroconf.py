@@ -0,0 +1,14 @@
+"""Benchmarks of mDNS packets handling.
+
+Packets advertise 1, 10 and 40 devices (see DNS_DEVICES).
+"""
+
+from libpurecoollink.zeroconf import DNSIncoming
+
+
+def bench_dns_incoming(run, corpus):
+    run(DNSIncoming, corpus["dns_packets"])
+
+
+def bench_dns_outgoing_packet(run, corpus, dns_packet):
+    run(dns_packet, corpus["dns_records"])
@@ -0,0 +1,189 @@
+"""Payload corpora and allocation measurement of the benchmark suite."""
+
+import json
+import os
+import tracemalloc
+
+import pytest
+
+from libpurecoollink.const import DYSON_MQTT_SERVICE_TYPE
+from libpurecoollink.dyson_payload import serialize_command, STATE_SET
+from libpurecoollink.dyson_simulator import SimulatedBroker, \
+    SimulatedPureCoolLink, SimulatedPureHotCoolLink, Simulated360Eye
+from libpurecoollink.utils import encrypt_password
+from libpurecoollink.zeroconf import DNSOutgoing, DNSPointer, DNSService, \
+    DNSText, DNSAddress, _FLAGS_QR_RESPONSE, _FLAGS_AA, _CLASS_IN, \
+    _TYPE_PTR, _TYPE_SRV, _TYPE_TXT, _TYPE_A
+
+DATA = os.path.join(os.path.dirname(__file__), os.pardir, "tests", "data")
+# Simulated messages of each stream
+CORPUS_SIZE = 100
+# Devices advertised in each DNS packet
+DNS_DEVICES = (1, 10, 40)
+
+
+def _fixture(*path):
+    with open(os.path.join(DATA, *path), "r", encoding="utf-8") as payload:
+        return payload.read()
+
+
+class _Capture:
+    """Subscriber recording payloads published by simulated devices."""
+
+    def __init__(self):
+        self.payloads = []
+
+    def deliver(self, topic, payload):
+        self.payloads.append(payload.decode("utf-8"))
+
+
+def _simulate(device, commands=()):
+    """Return payloads emitted by a simulated device.
+
+    Commands are sent first, then all streams are updated CORPUS_SIZE
+    times.
+    """
+    broker = SimulatedBroker()
+    broker.add_device(device)
+    capture = _Capture()
+    broker.subscribe(capture, device.status_topic)
+    for command in commands:
+        broker.publish(device.command_topic, command)
+    for index in range(CORPUS_SIZE):
+        broker.update(index * 3600)
+    return capture.payloads
+
+
+def _messages(payloads, *msgs):
+    return [payload for payload in payloads
+            if json.loads(payload)["msg"] in msgs]
+
+
+def _fan_commands():
+    return [serialize_command("REQUEST-CURRENT-STATE")] + [
+        serialize_command(STATE_SET, {"data": {
+            "fmod": "FAN", "fnsp": "{0:04d}".format(speed),
+            "oson": "ON" if speed % 2 else "OFF"}})
+        for speed in range(1, 11)]
+
+
+def _dns_records(count):
+    """Return records advertising devices, like Zeroconf answers."""
+    records = []
+    for index in range(count):
+        serial = "SIM-{0:05d}".format(index)
+        name = "475_{0}.{1}".format(serial, DYSON_MQTT_SERVICE_TYPE)
+        server = "{0}.local.".format(serial)
+        records += [
+            DNSPointer(DYSON_MQTT_SERVICE_TYPE, _TYPE_PTR, _CLASS_IN, 3600,
+                       name),
+            DNSService(name, _TYPE_SRV, _CLASS_IN, 3600, 0, 0, 1883,
+                       server),
+            DNSText(name, _TYPE_TXT, _CLASS_IN, 3600, b"\x00"),
+            DNSAddress(server, _TYPE_A, _CLASS_IN, 3600,
+                       bytes([192, 168, index // 256, index % 256]))]
+    return records
+
+
+def _dns_packet(records):
+    """Return a DNS response packet containing records."""
+    out = DNSOutgoing(_FLAGS_QR_RESPONSE | _FLAGS_AA)
+    for record in records:
+        out.add_answer_at_time(record, 0)
+    return out.packet()
+
+
+@pytest.fixture(scope="session")
+def corpus():
+    """Return payload corpora, by name.
+
+    Corpora contain the test fixtures and messages emitted by simulated
+    devices.
+    """
+    pure = _simulate(SimulatedPureCoolLink("SIM-475", seed=1,
+                                           state_interval=1,
+                                           sensor_interval=1),
+                     _fan_commands())
+    hot = _simulate(SimulatedPureHotCoolLink("SIM-455", seed=2,
+                                             state_interval=1),
+                    _fan_commands())
+    eye = _simulate(Simulated360Eye("SIM-N223", seed=3, state_interval=1,
+                                    map_interval=1),
+                    [serialize_command("REQUEST-CURRENT-STATE"),
+                     serialize_command("START",
+                                       {"fullCleanType": "immediate"})])
+    with open(os.path.join(DATA, "manifest.json"), "r",
+              encoding="utf-8") as manifest:
+        credentials = [device["LocalCredentials"]
+                       for device in json.load(manifest)]
+    dns_records = [_dns_records(count) for count in DNS_DEVICES]
+    return {
+        "pure_state": [_fixture("state.json")] + _messages(
+            pure, "CURRENT-STATE", "STATE-CHANGE"),
+        "hot_state": [_fixture("state_hot.json")] + _messages(
+            hot, "CURRENT-STATE", "STATE-CHANGE"),
+        "sensor": [_fixture("sensor.json"),
+                   _fixture("sensor_sltm_off.json")] + _messages(
+                       pure, "ENVIRONMENTAL-CURRENT-SENSOR-DATA"),
+        "eye_state": [_fixture("vacuum", "state.json"),
+                      _fixture("vacuum", "state-change.json")] + _messages(
+                          eye, "CURRENT-STATE", "STATE-CHANGE"),
+        "eye_map_global": [_fixture("vacuum", "map-global.json")] + _messages(
+            eye, "MAP-GLOBAL"),
+        "eye_map_data": [_fixture("vacuum", "map-data.json")],
+        "eye_map_grid": [_fixture("vacuum", "map-grid.json")],
+        "eye_telemetry": [_fixture("vacuum", "telemetry-data.json")],
+        "eye_goodbye": [_fixture("vacuum", "goodbye.json")],
+        "credentials": credentials + [
+            encrypt_password("{0:032x}".format(index * 7919))
+            for index in range(CORPUS_SIZE)],
+        "dns_records": dns_records,
+        "dns_packets": [_dns_packet(records) for records in dns_records]
+    }
+
+
+@pytest.fixture
+def dns_packet():
+    """Return a function building a DNS response packet from records."""
+    return _dns_packet
+
+
+def _allocations(function, payloads):
+    """Return bytes allocated while handling each payload, on average.
+
+    peak: max memory allocated at once while handling a payload
+    retained: memory still referenced by the result
+    """
+    results = []
+    peak = retained = 0
+    tracemalloc.start()
+    try:
+        for payload in payloads:
+            tracemalloc.clear_traces()
+            results.append(function(payload))
+            current, maximum = tracemalloc.get_traced_memory()
+            peak += maximum
+            retained += current
+    finally:
+        tracemalloc.stop()
+    return {"messages": len(payloads),
+            "peak_bytes_per_message": peak // len(payloads),
+            "retained_bytes_per_message": retained // len(payloads)}
+
+
+@pytest.fixture
+def run(benchmark):
+    """Benchmark a function over a corpus.
+
+    Allocations per message are recorded in the benchmark extra info, and
+    stored with the timings.
+    """
+    def run_benchmark(function, payloads):
+        benchmark.extra_info.update(_allocations(function, payloads))
+
+        def handle_all():
+            for payload in payloads:
+                function(payload)
+
+        benchmark(handle_all)
+    return run_benchmark
@@ -8,6 +8,9 @@ DYSON_PURE_COOL_LINK_DESK = "469"
 DYSON_PURE_HOT_COOL_LINK_TOUR = "455"
 DYSON_360_EYE = "N223"
 
+# mDNS service type advertised by devices
+DYSON_MQTT_SERVICE_TYPE = "_dyson_mqtt._tcp.local."
+
 
 class FanMode(Enum):
     """Fan mode."""
@@ -0,0 +1,86 @@
+"""Dyson devices factory."""
+
+import json
+import logging
+
+from .const import DYSON_PURE_COOL_LINK_TOUR, DYSON_PURE_COOL_LINK_DESK, \
+    DYSON_PURE_HOT_COOL_LINK_TOUR, DYSON_360_EYE
+from .dyson_360_eye import Dyson360Eye
+from .dyson_pure_cool_link import DysonPureCoolLink
+from .dyson_pure_hotcool_link import DysonPureHotCoolLink
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class DeviceFactory:
+    """Build Dyson devices from manifest entries.
+
+    Device classes are registered by product type. Unknown product types
+    are built with the default device class (Pure Cool Link).
+    """
+
+    def __init__(self, default_device_class=DysonPureCoolLink):
+        """Create a new device factory.
+
+        :param default_device_class: Class used for unknown product types
+        """
+        self._default_device_class = default_device_class
+        self._registry = {
+            DYSON_PURE_COOL_LINK_TOUR: DysonPureCoolLink,
+            DYSON_PURE_COOL_LINK_DESK: DysonPureCoolLink,
+            DYSON_PURE_HOT_COOL_LINK_TOUR: DysonPureHotCoolLink,
+            DYSON_360_EYE: Dyson360Eye
+        }
+
+    def register(self, product_type, device_class):
+        """Register a device class for a product type.
+
+        :param product_type: Product type (const.DYSON_*)
+        :param device_class: Device class, called with the manifest entry
+        """
+        self._registry[product_type] = device_class
+
+    def unregister(self, product_type):
+        """Remove the device class registered for a product type.
+
+        :param product_type: Product type (const.DYSON_*)
+        """
+        self._registry.pop(product_type, None)
+
+    def device_class(self, product_type):
+        """Return the device class used for a product type.
+
+        :param product_type: Product type (const.DYSON_*)
+        """
+        return self._registry.get(product_type, self._default_device_class)
+
+    def create(self, json_body):
+        """Create a device from a manifest entry.
+
+        :param json_body: JSON message returned by the HTTPS API
+        :return: Dyson device
+        """
+        return self.device_class(json_body['ProductType'])(json_body)
+
+    def create_devices(self, manifest):
+        """Create devices from manifest entries.
+
+        :param manifest: Iterable of manifest entries (dict)
+        :return: List of Dyson devices
+        """
+        return [self.create(json_body) for json_body in manifest]
+
+    def load_manifest(self, manifest_file):
+        """Create devices from a local JSON manifest file.
+
+        The file has the same format as the manifest returned by the
+        Dyson Web Services: a JSON list of devices.
+
+        :param manifest_file: Path of the manifest file
+        :return: List of Dyson devices
+        """
+        with open(manifest_file, "r", encoding="utf-8") as manifest:
+            devices = self.create_devices(json.load(manifest))
+        _LOGGER.debug("%s devices loaded from %s", len(devices),
+                      manifest_file)
+        return devices
@@ -5,13 +5,16 @@
 import logging
 import requests
 from requests.auth import HTTPBasicAuth
-from .utils import is_360_eye_device, is_heating_device
 
+from .device_factory import DeviceFactory
 from .dyson_360_eye import Dyson360Eye
 from .dyson_pure_cool_link import DysonPureCoolLink
 from .dyson_pure_hotcool_link import DysonPureHotCoolLink
 from .exceptions import DysonNotLoggedException
 
+__all__ = ["DysonAccount", "DeviceFactory", "Dyson360Eye",
+           "DysonPureCoolLink", "DysonPureHotCoolLink", "DYSON_API_URL"]
+
 _LOGGER = logging.getLogger(__name__)
 
 DYSON_API_URL = "api.cp.dyson.com"
@@ -20,18 +23,20 @@ DYSON_API_URL = "api.cp.dyson.com"
 class DysonAccount:
     """Dyson account."""
 
-    def __init__(self, email, password, country):
+    def __init__(self, email, password, country, device_factory=None):
         """Create a new Dyson account.
 
         :param email: User email
         :param password: User password
         :param country: 2 characters language code
+        :param device_factory: Factory used to build devices (optional)
         """
         self._email = email
         self._password = password
         self._country = country
         self._logged = False
         self._auth = None
+        self._device_factory = device_factory or DeviceFactory()
 
     def login(self):
         """Login to dyson web services."""
@@ -58,17 +63,8 @@ class DysonAccount:
             device_response = requests.get(
                 "https://{0}/v1/provisioningservice/manifest".format(
                     DYSON_API_URL), verify=False, auth=self._auth)
-            devices = []
-            for device in device_response.json():
-                if is_360_eye_device(device):
-                    dyson_device = Dyson360Eye(device)
-                elif is_heating_device(device):
-                    dyson_device = DysonPureHotCoolLink(device)
-                else:
-                    dyson_device = DysonPureCoolLink(device)
-                devices.append(dyson_device)
-
-            return devices
+            return self._device_factory.create_devices(
+                device_response.json())
         else:
             _LOGGER.warning("Not logged to Dyson Web Services.")
             raise DysonNotLoggedException()
@@ -3,12 +3,11 @@
 import logging
 import json
 import time
-import datetime
-
-import paho.mqtt.client as mqtt
 
 from .dyson_device import DysonDevice, NetworkDevice, DEFAULT_PORT
-from .utils import printable_fields
+from .dyson_payload import serialize_command
+from . import dyson_metrics, dyson_tracing
+from .utils import printable_fields, parse_timestamp, epoch_to_datetime
 from .const import PowerMode, Dyson360EyeMode, Dyson360EyeCommand
 
 _LOGGER = logging.getLogger(__name__)
@@ -17,6 +16,14 @@ _LOGGER = logging.getLogger(__name__)
 class Dyson360Eye(DysonDevice):
     """Dyson 360 Eye device."""
 
+    def __init__(self, json_body):
+        """Create a new 360 Eye device.
+
+        :param json_body: JSON message returned by the HTTPS API
+        """
+        super().__init__(json_body)
+        self._callback_raw_message = []
+
     def connect(self, device_ip, device_port=DEFAULT_PORT):
         """Try to connect to device.
 
@@ -27,7 +34,7 @@ class Dyson360Eye(DysonDevice):
         self._network_device = NetworkDevice(self._name, device_ip,
                                              device_port)
 
-        self._mqtt = mqtt.Client(userdata=self, protocol=3)
+        self._mqtt = self._create_client(protocol=3)
         self._mqtt.username_pw_set(self._serial, self._credentials)
         self._mqtt.on_message = self.on_message
         self._mqtt.on_connect = self.on_connect
@@ -58,17 +65,11 @@ class Dyson360Eye(DysonDevice):
         :param command Command to send (const.Dyson360EyeCommand)
         :param data Data dictionary to send. Can be empty
         """
-        if data is None:
-            data = {}
         if self._connected:
-            payload = {
-                "msg": "{0}".format(command),
-                "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
-            }
-            payload.update(data)
-            _LOGGER.debug("Sending command to the device: %s",
-                          json.dumps(payload))
-            self._mqtt.publish(self.command_topic, json.dumps(payload), 1)
+            payload = serialize_command("{0}".format(command), data)
+            _LOGGER.debug("Sending command to the device: %s", payload)
+            self._count_command(command)
+            self._mqtt.publish(self._command_topic, payload, 1)
         else:
             _LOGGER.warning(
                 "Not connected, can not send commands: %s",
@@ -99,6 +100,24 @@ class Dyson360Eye(DysonDevice):
         """Abort cleaning."""
         self._send_command(Dyson360EyeCommand.ABORT.value)
 
+    @property
+    def callback_raw_message(self):
+        """Return callback functions when raw payloads are received."""
+        return self._callback_raw_message
+
+    def add_raw_message_listener(self, callback_raw_message):
+        """Add raw message listener.
+
+        The listener is called with the payload (str) of each message,
+        before it is parsed.
+        """
+        self._callback_raw_message.append(callback_raw_message)
+
+    def remove_raw_message_listener(self, callback_raw_message):
+        """Remove a raw message listener."""
+        if callback_raw_message in self._callback_raw_message:
+            self._callback_raw_message.remove(callback_raw_message)
+
     @staticmethod
     def call_callback_functions(functions, message):
         """Call callback functions."""
@@ -109,29 +128,72 @@ class Dyson360Eye(DysonDevice):
     def on_message(client, userdata, msg):
         # pylint: disable=unused-argument
         """Set function Callback when message received."""
+        metrics = dyson_metrics.METRICS
+        if metrics is not None:
+            started = time.perf_counter()
+        tracer = dyson_tracing.TRACER
+        trace = None if tracer is None else tracer.start_trace(
+            userdata.serial)
+        if trace is not None:
+            trace.stage(dyson_tracing.DECODE)
         payload = msg.payload.decode("utf-8")
-        device_msg = None
+        if trace is None:
+            for function in userdata.callback_raw_message:
+                function(payload)
+        else:
+            trace.stage(dyson_tracing.RAW_PUBLISH)
+            trace.call_listeners(userdata.callback_raw_message, payload)
+            trace.stage(dyson_tracing.CLASSIFY)
+        if metrics is not None:
+            # Raw listeners are accounted as callbacks
+            raw_callbacks = time.perf_counter()
         if Dyson360EyeState.is_state_message(payload):
-            device_msg = Dyson360EyeState(payload)
-            if not userdata.device_available:
-                userdata.state_data_available()
-            userdata.state = device_msg
+            message_class = Dyson360EyeState
         elif Dyson360EyeMapGlobal.is_map_global(payload):
-            device_msg = Dyson360EyeMapGlobal(payload)
+            message_class = Dyson360EyeMapGlobal
         elif Dyson360EyeTelemetryData.is_telemetry_data(payload):
-            device_msg = Dyson360EyeTelemetryData(payload)
+            message_class = Dyson360EyeTelemetryData
         elif Dyson360EyeMapGrid.is_map_grid(payload):
-            device_msg = Dyson360EyeMapGrid(payload)
+            message_class = Dyson360EyeMapGrid
         elif Dyson360EyeMapData.is_map_data(payload):
-            device_msg = Dyson360EyeMapData(payload)
+            message_class = Dyson360EyeMapData
         elif Dyson360Goodbye.is_goodbye_message(payload):
-            device_msg = Dyson360Goodbye(payload)
+            message_class = Dyson360Goodbye
         else:
+            message_class = None
             _LOGGER.warning(payload)
+        device_msg = None
+        if message_class is not None:
+            if trace is not None:
+                trace.stage(dyson_tracing.CONSTRUCT)
+            device_msg = message_class(payload)
+            if trace is not None:
+                trace.stage(dyson_tracing.PUBLISH)
+            if message_class is Dyson360EyeState:
+                if not userdata.device_available:
+                    userdata.state_data_available()
+                userdata.state = device_msg
+        if metrics is not None:
+            parsed = time.perf_counter()
+            metrics.messages.inc((userdata.product_type, "unknown" if
+                                  device_msg is None else
+                                  type(device_msg).__name__))
+            metrics.parse_seconds.observe(parsed - raw_callbacks,
+                                          (userdata.product_type,))
 
         if device_msg:
-            Dyson360Eye.call_callback_functions(userdata.callback_message,
-                                                device_msg)
+            if trace is None:
+                Dyson360Eye.call_callback_functions(userdata.callback_message,
+                                                    device_msg)
+            else:
+                trace.call_listeners(userdata.callback_message, device_msg)
+        if metrics is not None:
+            metrics.callback_seconds.observe(
+                raw_callbacks - started + time.perf_counter() - parsed,
+                (userdata.product_type,))
+        if trace is not None:
+            trace.finish("unknown" if message_class is None else
+                         message_class.__name__)
 
     def __repr__(self):
         """Return a String representation."""
@@ -231,8 +293,8 @@ class Dyson360EyeTelemetryData:
         self._field2 = data["field2"]
         self._field3 = data["field3"]
         self._field4 = data["field4"]
-        self._time = datetime.datetime.strptime(data["time"],
-                                                "%Y-%m-%dT%H:%M:%SZ")
+        self._epoch = parse_timestamp(data["time"])
+        self._time = None
 
     @property
     def telemetry_data_id(self):
@@ -261,9 +323,16 @@ class Dyson360EyeTelemetryData:
 
     @property
     def time(self):
-        """Return time."""
+        """Return time. The datetime is built on first access."""
+        if self._time is None:
+            self._time = epoch_to_datetime(self._epoch)
         return self._time
 
+    @property
+    def epoch(self):
+        """Return time in epoch seconds."""
+        return self._epoch
+
     def __repr__(self):
         """Return a String representation."""
         fields = [("telemetry_data_id", str(self.telemetry_data_id)),
@@ -293,8 +362,8 @@ class Dyson360EyeMapData:
         self._content_type = data["data"]["content-type"]
         self._content_encoding = data["data"]["content-encoding"]
         self._content = data["data"]["content"]
-        self._time = datetime.datetime.strptime(data["time"],
-                                                "%Y-%m-%dT%H:%M:%SZ")
+        self._epoch = parse_timestamp(data["time"])
+        self._time = None
 
     @property
     def grid_id(self):
@@ -323,9 +392,16 @@ class Dyson360EyeMapData:
 
     @property
     def time(self):
-        """Return time."""
+        """Return time. The datetime is built on first access."""
+        if self._time is None:
+            self._time = epoch_to_datetime(self._epoch)
         return self._time
 
+    @property
+    def epoch(self):
+        """Return time in epoch seconds."""
+        return self._epoch
+
     def __repr__(self):
         """Return a String representation."""
         fields = [("grid_id", str(self.grid_id)),
@@ -356,8 +432,8 @@ class Dyson360EyeMapGrid:
         self._clean_id = data["cleanId"]
         if "anchor" in data and len(data["anchor"]) == 2:
             self._anchor = (int(data["anchor"][0]), int(data["anchor"][1]))
-        self._time = datetime.datetime.strptime(data["time"],
-                                                "%Y-%m-%dT%H:%M:%SZ")
+        self._epoch = parse_timestamp(data["time"])
+        self._time = None
 
     @property
     def grid_id(self):
@@ -391,9 +467,16 @@ class Dyson360EyeMapGrid:
 
     @property
     def time(self):
-        """Return time."""
+        """Return time. The datetime is built on first access."""
+        if self._time is None:
+            self._time = epoch_to_datetime(self._epoch)
         return self._time
 
+    @property
+    def epoch(self):
+        """Return time in epoch seconds."""
+        return self._epoch
+
     def __repr__(self):
         """Return a String representation."""
         fields = [("grid_id", str(self.grid_id)),
@@ -423,8 +506,8 @@ class Dyson360EyeMapGlobal:
         self._y = data["y"]
         self._angle = data["angle"]
         self._clean_id = data["cleanId"]
-        self._time = datetime.datetime.strptime(data["time"],
-                                                "%Y-%m-%dT%H:%M:%SZ")
+        self._epoch = parse_timestamp(data["time"])
+        self._time = None
 
     @property
     def grid_id(self):
@@ -453,9 +536,16 @@ class Dyson360EyeMapGlobal:
 
     @property
     def time(self):
-        """Return time."""
+        """Return time. The datetime is built on first access."""
+        if self._time is None:
+            self._time = epoch_to_datetime(self._epoch)
         return self._time
 
+    @property
+    def epoch(self):
+        """Return time in epoch seconds."""
+        return self._epoch
+
     def __repr__(self):
         """Return a String representation."""
         fields = [("grid_id", str(self.grid_id)),
@@ -481,8 +571,8 @@ class Dyson360Goodbye:
         """Create a new Map Global."""
         data = json.loads(json_body)
         self._reason = data["reason"]
-        self._time = datetime.datetime.strptime(data["time"],
-                                                "%Y-%m-%dT%H:%M:%SZ")
+        self._epoch = parse_timestamp(data["time"])
+        self._time = None
 
     @property
     def reason(self):
@@ -491,9 +581,16 @@ class Dyson360Goodbye:
 
     @property
     def time(self):
-        """Return time."""
+        """Return time. The datetime is built on first access."""
+        if self._time is None:
+            self._time = epoch_to_datetime(self._epoch)
         return self._time
 
+    @property
+    def epoch(self):
+        """Return time in epoch seconds."""
+        return self._epoch
+
     def __repr__(self):
         """Return a String representation."""
         fields = [("reason", str(self.reason)),
@@ -0,0 +1,277 @@
+"""Dyson 360 Eye floor maps."""
+
+import base64
+import gzip
+import json
+import logging
+from collections import OrderedDict
+
+from .dyson_360_eye import Dyson360EyeMapGrid, Dyson360EyeMapData
+from .utils import printable_fields
+
+_LOGGER = logging.getLogger(__name__)
+
+MAX_PENDING_MAP_DATA = 64
+MAX_CLEANS = 16
+
+
+def decode_map_content(map_data):
+    """Decode MAP-DATA content.
+
+    Content is base64 encoded and, if content encoding is gzip,
+    compressed. Decoded JSON content is assumed to be a tile of the grid:
+    {"x": 0, "y": 0, "width": 2, "height": 1, "cells": [0, 255]}
+    with cells in row-major order. This layout is not documented by
+    Dyson: use another decoder (see Dyson360EyeMapEngine) if devices
+    send another format.
+
+    :param map_data: Dyson360EyeMapData message
+    :return: Tile dictionary
+    """
+    content = base64.b64decode(map_data.content)
+    if map_data.content_encoding == "gzip":
+        content = gzip.decompress(content)
+    return json.loads(content.decode("utf-8"))
+
+
+class Dyson360EyeMap:
+    """Occupancy raster of a 360 Eye map grid.
+
+    Cells are stored in a single bytearray (row-major, one byte per cell)
+    sized from the MAP-GRID message. MAP-DATA tiles are copied in place.
+    """
+
+    def __init__(self, map_grid):
+        """Create a new map.
+
+        :param map_grid: Dyson360EyeMapGrid message
+        """
+        self._grid_id = map_grid.grid_id
+        self._clean_id = map_grid.clean_id
+        self._width = map_grid.width
+        self._height = map_grid.height
+        self._resolution = map_grid.resolution
+        try:
+            self._anchor = map_grid.anchor
+        except AttributeError:
+            # No anchor in MAP-GRID message
+            self._anchor = None
+        self._cells = bytearray(self._width * self._height)
+        self._updates = 0
+
+    def apply_tile(self, tile_x, tile_y, tile_width, cells):
+        """Copy a tile of cells into the map.
+
+        Parts of the tile outside of the grid are ignored.
+
+        :param tile_x: Tile left column
+        :param tile_y: Tile top row
+        :param tile_width: Tile width
+        :param cells: Tile cells (row-major)
+        """
+        cells = bytes(cells)
+        tile_height = len(cells) // tile_width if tile_width else 0
+        first_column = max(tile_x, 0)
+        last_column = min(tile_x + tile_width, self._width)
+        if first_column >= last_column:
+            return
+        for row in range(max(tile_y, 0),
+                         min(tile_y + tile_height, self._height)):
+            source = (row - tile_y) * tile_width - tile_x
+            target = row * self._width
+            self._cells[target + first_column:target + last_column] = \
+                cells[source + first_column:source + last_column]
+        self._updates += 1
+
+    def apply(self, map_data, decoder=decode_map_content):
+        """Apply a MAP-DATA message.
+
+        :param map_data: Dyson360EyeMapData message
+        :param decoder: Function returning the tile dictionary of a
+                        MAP-DATA message
+        """
+        tile = decoder(map_data)
+        self.apply_tile(tile.get("x", 0), tile.get("y", 0),
+                        tile.get("width", self._width), tile["cells"])
+
+    def cell(self, position_x, position_y):
+        """Return cell value.
+
+        :param position_x: Column
+        :param position_y: Row
+        """
+        return self._cells[position_y * self._width + position_x]
+
+    def rows(self):
+        """Return map rows as memoryviews (no copy)."""
+        view = memoryview(self._cells)
+        return [view[row * self._width:(row + 1) * self._width]
+                for row in range(self._height)]
+
+    @property
+    def cells(self):
+        """Return all cells as a memoryview (no copy)."""
+        return memoryview(self._cells)
+
+    @property
+    def grid_id(self):
+        """Return grid id."""
+        return self._grid_id
+
+    @property
+    def clean_id(self):
+        """Return clean id."""
+        return self._clean_id
+
+    @property
+    def width(self):
+        """Return width."""
+        return self._width
+
+    @property
+    def height(self):
+        """Return height."""
+        return self._height
+
+    @property
+    def resolution(self):
+        """Return resolution."""
+        return self._resolution
+
+    @property
+    def anchor(self):
+        """Return anchor."""
+        return self._anchor
+
+    @property
+    def updates(self):
+        """Return number of applied tiles."""
+        return self._updates
+
+    def __repr__(self):
+        """Return a String representation."""
+        fields = [("grid_id", str(self.grid_id)),
+                  ("clean_id", str(self.clean_id)),
+                  ("width", str(self.width)),
+                  ("height", str(self.height)),
+                  ("updates", str(self.updates))]
+        return 'Dyson360EyeMap(' + ",".join(printable_fields(fields)) + ')'
+
+
+class Dyson360EyeMapEngine:
+    """Build 360 Eye maps from MAP-GRID and MAP-DATA messages.
+
+    Maps are keyed by (clean_id, grid_id). Maps of the oldest cleans are
+    removed first when too many cleans are kept. Use on_message as a
+    device message listener:
+
+        engine = Dyson360EyeMapEngine()
+        device.add_message_listener(engine.on_message)
+    """
+
+    def __init__(self, max_pending=MAX_PENDING_MAP_DATA,
+                 max_cleans=MAX_CLEANS, decoder=decode_map_content):
+        """Create a new map engine.
+
+        :param max_pending: Max MAP-DATA messages kept per grid, and max
+                            grids, while waiting for MAP-GRID messages
+        :param max_cleans: Number of cleans kept, oldest are removed first
+        :param decoder: Function returning the tile dictionary of a
+                        MAP-DATA message (see decode_map_content)
+        """
+        self._maps = {}
+        self._pending = OrderedDict()
+        self._cleans = OrderedDict()
+        self._max_pending = max_pending
+        self._max_cleans = max_cleans
+        self._decoder = decoder
+
+    def _add_clean(self, clean_id):
+        """Register a clean, remove the oldest cleans if needed."""
+        if clean_id in self._cleans:
+            self._cleans.move_to_end(clean_id)
+            return
+        self._cleans[clean_id] = True
+        while len(self._cleans) > self._max_cleans:
+            self.remove_clean(next(iter(self._cleans)))
+
+    def on_message(self, message):
+        """Handle a device message."""
+        if isinstance(message, Dyson360EyeMapGrid):
+            self.add_grid(message)
+        elif isinstance(message, Dyson360EyeMapData):
+            self.add_data(message)
+
+    def add_grid(self, map_grid):
+        """Create the map of a MAP-GRID message.
+
+        :param map_grid: Dyson360EyeMapGrid message
+        :return: Dyson360EyeMap
+        """
+        key = (map_grid.clean_id, map_grid.grid_id)
+        self._add_clean(map_grid.clean_id)
+        dyson_map = self._maps.get(key)
+        if dyson_map is None or dyson_map.width != map_grid.width or \
+                dyson_map.height != map_grid.height:
+            dyson_map = Dyson360EyeMap(map_grid)
+            self._maps[key] = dyson_map
+        for map_data in self._pending.pop(key, []):
+            self._apply(dyson_map, map_data)
+        return dyson_map
+
+    def add_data(self, map_data):
+        """Apply a MAP-DATA message to its map.
+
+        :param map_data: Dyson360EyeMapData message
+        """
+        key = (map_data.clean_id, map_data.grid_id)
+        self._add_clean(map_data.clean_id)
+        dyson_map = self._maps.get(key)
+        if dyson_map is not None:
+            self._apply(dyson_map, map_data)
+            return
+        if key not in self._pending and \
+                len(self._pending) >= self._max_pending:
+            _LOGGER.warning("Too many grids without MAP-GRID message")
+            self._pending.popitem(last=False)
+        pending = self._pending.setdefault(key, [])
+        if len(pending) >= self._max_pending:
+            _LOGGER.warning("Too many map data without grid %s for clean %s",
+                            map_data.grid_id, map_data.clean_id)
+            pending.pop(0)
+        pending.append(map_data)
+
+    def _apply(self, dyson_map, map_data):
+        """Apply a MAP-DATA message, log invalid content."""
+        try:
+            dyson_map.apply(map_data, self._decoder)
+        except (ValueError, KeyError, TypeError, OSError) as error:
+            _LOGGER.error("Invalid map data for grid %s: %s",
+                          map_data.grid_id, error)
+
+    def get_map(self, clean_id, grid_id):
+        """Return the map of a grid, None if unknown.
+
+        :param clean_id: Clean id
+        :param grid_id: Grid id
+        """
+        return self._maps.get((clean_id, grid_id))
+
+    def maps(self, clean_id=None):
+        """Return all maps, or maps of a clean.
+
+        :param clean_id: Clean id (optional)
+        """
+        return [dyson_map for key, dyson_map in self._maps.items()
+                if clean_id is None or key[0] == clean_id]
+
+    def remove_clean(self, clean_id):
+        """Remove maps of a clean.
+
+        :param clean_id: Clean id
+        """
+        for key in [key for key in self._maps if key[0] == clean_id]:
+            del self._maps[key]
+        for key in [key for key in self._pending if key[0] == clean_id]:
+            del self._pending[key]
+        self._cleans.pop(clean_id, None)
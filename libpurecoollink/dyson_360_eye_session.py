@@ -0,0 +1,240 @@
+"""Dyson 360 Eye clean sessions recording and replay.
+
+A session log is an append-only binary file: a header followed by one
+record per message (receive time as a double, payload length as an
+unsigned int, then the UTF-8 payload). A sidecar index file stores the
+offset and receive time of each record to seek without reading the log.
+"""
+
+import logging
+import os
+import re
+import struct
+import time
+
+from .dyson_360_eye import Dyson360Eye
+
+_LOGGER = logging.getLogger(__name__)
+
+LOG_HEADER = b"D360LOG1"
+LOG_EXTENSION = ".log"
+INDEX_EXTENSION = ".idx"
+_RECORD = struct.Struct("<dI")
+_INDEX = struct.Struct("<Qd")
+_CLEAN_ID = re.compile(r'"cleanId"\s*:\s*"([^"\\]*)"')
+
+
+def _session_name(clean_id):
+    """Return a file name safe session name."""
+    return re.sub(r"[^A-Za-z0-9_-]", "_", clean_id)
+
+
+class ReplayMessage:
+    """MQTT message replayed from a session log."""
+
+    def __init__(self, topic, payload):
+        """Create a new replayed message.
+
+        :param topic: MQTT topic
+        :param payload: Payload (bytes)
+        """
+        self.topic = topic
+        self.payload = payload
+
+
+class Dyson360EyeSessionRecorder:
+    """Record raw 360 Eye messages, one session log per clean.
+
+    Messages without clean id are appended to the current session.
+    Use on_raw_message as a device raw message listener:
+
+        recorder = Dyson360EyeSessionRecorder("/var/lib/dyson")
+        device.add_raw_message_listener(recorder.on_raw_message)
+    """
+
+    def __init__(self, directory):
+        """Create a new session recorder.
+
+        :param directory: Directory of session logs
+        """
+        self._directory = directory
+        self._clean_id = None
+        self._log_file = None
+        self._index_file = None
+
+    def session_path(self, clean_id):
+        """Return log path of a clean session.
+
+        :param clean_id: Clean id
+        """
+        return os.path.join(self._directory,
+                            _session_name(clean_id) + LOG_EXTENSION)
+
+    def on_raw_message(self, payload, received=None):
+        """Record a raw message.
+
+        :param payload: Message payload (str)
+        :param received: Receive time in epoch seconds (default: now)
+        """
+        # Scan for the clean id, the payload is parsed by the device
+        match = _CLEAN_ID.search(payload)
+        clean_id = match.group(1) if match else None
+        if clean_id and clean_id != self._clean_id:
+            self._open(clean_id)
+        if self._log_file is None:
+            _LOGGER.debug("No clean session, message not recorded")
+            return
+        data = payload.encode("utf-8")
+        offset = self._log_file.tell()
+        received = time.time() if received is None else received
+        self._log_file.write(_RECORD.pack(received, len(data)))
+        self._log_file.write(data)
+        self._index_file.write(_INDEX.pack(offset, received))
+
+    def _open(self, clean_id):
+        """Open the session log of a clean."""
+        self.close()
+        self._clean_id = clean_id
+        log_path = self.session_path(clean_id)
+        self._log_file = open(log_path, "ab")
+        if self._log_file.tell() == 0:
+            self._log_file.write(LOG_HEADER)
+        self._index_file = open(log_path[:-len(LOG_EXTENSION)] +
+                                INDEX_EXTENSION, "ab")
+        _LOGGER.debug("Recording clean session %s", clean_id)
+
+    def flush(self):
+        """Flush the current session log."""
+        if self._log_file is not None:
+            self._log_file.flush()
+            self._index_file.flush()
+
+    def close(self):
+        """Close the current session log."""
+        if self._log_file is not None:
+            self._log_file.close()
+            self._index_file.close()
+        self._log_file = None
+        self._index_file = None
+        self._clean_id = None
+
+    @property
+    def clean_id(self):
+        """Return clean id of the current session."""
+        return self._clean_id
+
+
+class Dyson360EyeSessionLog:
+    """Read a session log."""
+
+    def __init__(self, log_path):
+        """Open a session log.
+
+        The index is rebuilt from the log if the index file is missing.
+
+        :param log_path: Path of the session log
+        """
+        self._log_path = log_path
+        index_path = log_path[:-len(LOG_EXTENSION)] + INDEX_EXTENSION \
+            if log_path.endswith(LOG_EXTENSION) else None
+        if index_path and os.path.exists(index_path):
+            with open(index_path, "rb") as index_file:
+                index = index_file.read()
+            self._index = [entry for entry in _INDEX.iter_unpack(
+                index[:len(index) - len(index) % _INDEX.size])]
+        else:
+            self._index = self._build_index()
+
+    def _build_index(self):
+        """Build the index by reading the log."""
+        index = []
+        with open(self._log_path, "rb") as log_file:
+            if log_file.read(len(LOG_HEADER)) != LOG_HEADER:
+                raise ValueError("Invalid session log " + self._log_path)
+            offset = len(LOG_HEADER)
+            header = log_file.read(_RECORD.size)
+            while len(header) == _RECORD.size:
+                received, length = _RECORD.unpack(header)
+                index.append((offset, received))
+                offset += _RECORD.size + length
+                log_file.seek(offset)
+                header = log_file.read(_RECORD.size)
+        return index
+
+    def seek_time(self, received):
+        """Return index of the first record received at or after a time.
+
+        :param received: Epoch seconds
+        """
+        low, high = 0, len(self._index)
+        while low < high:
+            middle = (low + high) // 2
+            if self._index[middle][1] < received:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def records(self, start=0):
+        """Iterate over (receive time, payload) records.
+
+        :param start: Index of the first record
+        """
+        if start >= len(self._index):
+            return
+        with open(self._log_path, "rb") as log_file:
+            log_file.seek(self._index[start][0])
+            for _ in range(len(self._index) - start):
+                received, length = _RECORD.unpack(
+                    log_file.read(_RECORD.size))
+                yield received, log_file.read(length)
+
+    def __getitem__(self, index):
+        """Return (receive time, payload) of a record."""
+        if index < 0:
+            index += len(self._index)
+        if not 0 <= index < len(self._index):
+            raise IndexError("Session log index out of range")
+        return next(self.records(index))
+
+    def __len__(self):
+        """Return number of records."""
+        return len(self._index)
+
+
+class Dyson360EyeSessionReplayer:
+    """Replay a session log through Dyson360Eye.on_message."""
+
+    def __init__(self, session_log, device):
+        """Create a new replayer.
+
+        :param session_log: Dyson360EyeSessionLog
+        :param device: Dyson360Eye device receiving the messages
+        """
+        self._session_log = session_log
+        self._device = device
+
+    def replay(self, speed=1.0, start=0):
+        """Replay records.
+
+        :param speed: Replay speed (1.0 is real time, 2.0 twice faster).
+                      None replays as fast as possible.
+        :param start: Index of the first record
+        :return: Number of replayed messages
+        """
+        topic = self._device.status_topic
+        first_received = None
+        started = time.monotonic()
+        count = 0
+        for received, payload in self._session_log.records(start):
+            if speed:
+                if first_received is None:
+                    first_received = received
+                delay = (received - first_received) / speed - (
+                    time.monotonic() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            Dyson360Eye.on_message(None, self._device,
+                                   ReplayMessage(topic, payload))
+            count += 1
+        return count
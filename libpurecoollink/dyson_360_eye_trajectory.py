@@ -0,0 +1,179 @@
+"""Dyson 360 Eye trajectories."""
+
+import math
+from array import array
+from collections import OrderedDict
+
+from .dyson_360_eye import Dyson360EyeMapGlobal
+from .utils import printable_fields
+
+MAX_CLEANS = 16
+
+
+class Dyson360EyeTrajectory:
+    """Positions of a 360 Eye during a clean.
+
+    Positions are stored in typed arrays (x, y, angle and time in epoch
+    seconds) instead of Dyson360EyeMapGlobal objects.
+    """
+
+    def __init__(self, clean_id):
+        """Create a new trajectory.
+
+        :param clean_id: Clean id
+        """
+        self._clean_id = clean_id
+        self._x = array('d')
+        self._y = array('d')
+        self._angle = array('d')
+        self._epoch = array('q')
+
+    def append(self, position_x, position_y, angle, epoch):
+        """Append a position.
+
+        :param position_x: X position
+        :param position_y: Y position
+        :param angle: Angle
+        :param epoch: Time in epoch seconds
+        """
+        self._x.append(position_x)
+        self._y.append(position_y)
+        self._angle.append(angle)
+        self._epoch.append(epoch)
+
+    def add(self, map_global):
+        """Append the position of a MAP-GLOBAL message.
+
+        :param map_global: Dyson360EyeMapGlobal message
+        """
+        self.append(map_global.position_x, map_global.position_y,
+                    map_global.angle, map_global.epoch)
+
+    def _segments(self):
+        """Return length of each segment between two positions."""
+        return map(math.hypot,
+                   map(float.__sub__, self._x[1:], self._x[:-1]),
+                   map(float.__sub__, self._y[1:], self._y[:-1]))
+
+    def distance(self):
+        """Return distance travelled."""
+        return math.fsum(self._segments())
+
+    def coverage_area(self, cell_size=1):
+        """Return area of visited cells.
+
+        :param cell_size: Cell size, in position unit
+        """
+        cells = set(zip([int(value // cell_size) for value in self._x],
+                        [int(value // cell_size) for value in self._y]))
+        return len(cells) * cell_size * cell_size
+
+    def speed_profile(self):
+        """Return speed of each segment (position unit per second).
+
+        Segments without elapsed time have a speed of 0.
+        """
+        durations = map(int.__sub__, self._epoch[1:], self._epoch[:-1])
+        return array('d', [length / duration if duration else 0.0
+                           for length, duration in zip(self._segments(),
+                                                       durations)])
+
+    def downsample(self, step):
+        """Return a new trajectory with one position every step.
+
+        The last position is always kept.
+
+        :param step: Step
+        """
+        trajectory = Dyson360EyeTrajectory(self._clean_id)
+        if not self._x:
+            return trajectory
+        trajectory.extend(self._x[::step], self._y[::step],
+                          self._angle[::step], self._epoch[::step])
+        if (len(self._x) - 1) % step:
+            trajectory.append(self._x[-1], self._y[-1], self._angle[-1],
+                              self._epoch[-1])
+        return trajectory
+
+    def extend(self, positions_x, positions_y, angles, epochs):
+        """Append several positions.
+
+        :param positions_x: X positions
+        :param positions_y: Y positions
+        :param angles: Angles
+        :param epochs: Times in epoch seconds
+        """
+        self._x.extend(positions_x)
+        self._y.extend(positions_y)
+        self._angle.extend(angles)
+        self._epoch.extend(epochs)
+
+    def export(self):
+        """Return a copy of all positions as typed arrays."""
+        return {
+            "x": array('d', self._x),
+            "y": array('d', self._y),
+            "angle": array('d', self._angle),
+            "epoch": array('q', self._epoch)
+        }
+
+    @property
+    def clean_id(self):
+        """Return clean id."""
+        return self._clean_id
+
+    def __len__(self):
+        """Return number of positions."""
+        return len(self._x)
+
+    def __repr__(self):
+        """Return a String representation."""
+        fields = [("clean_id", str(self.clean_id)),
+                  ("positions", str(len(self)))]
+        return 'Dyson360EyeTrajectory(' + ",".join(
+            printable_fields(fields)) + ')'
+
+
+class Dyson360EyeTrajectoryStore:
+    """Trajectories of the last cleans.
+
+    Use on_message as a device message listener:
+
+        store = Dyson360EyeTrajectoryStore()
+        device.add_message_listener(store.on_message)
+    """
+
+    def __init__(self, max_cleans=MAX_CLEANS):
+        """Create a new trajectory store.
+
+        :param max_cleans: Number of cleans kept, oldest are removed first
+        """
+        self._trajectories = OrderedDict()
+        self._max_cleans = max_cleans
+
+    def on_message(self, message):
+        """Handle a device message."""
+        if isinstance(message, Dyson360EyeMapGlobal):
+            self._trajectory(message.clean_id).add(message)
+
+    def get(self, clean_id):
+        """Return the trajectory of a clean, None if unknown.
+
+        :param clean_id: Clean id
+        """
+        return self._trajectories.get(clean_id)
+
+    def _trajectory(self, clean_id):
+        """Return the trajectory of a clean, create it if needed."""
+        trajectory = self._trajectories.get(clean_id)
+        if trajectory is None:
+            trajectory = Dyson360EyeTrajectory(clean_id)
+            self._trajectories[clean_id] = trajectory
+            while len(self._trajectories) > self._max_cleans:
+                self._trajectories.popitem(last=False)
+        return trajectory
+
+    @property
+    def clean_ids(self):
+        """Return clean ids, oldest first."""
+        return list(self._trajectories)
@@ -0,0 +1,121 @@
+"""Dyson account for asyncio applications.
+
+This module requires Python 3.5.3+ and aiohttp (pip install
+libpurecoollink[async]).
+"""
+
+import logging
+
+import aiohttp
+
+from .device_factory import DeviceFactory
+from .dyson import DYSON_API_URL
+from .exceptions import DysonNotLoggedException
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 10
+DEFAULT_CONNECTION_LIMIT = 10
+
+
+class AsyncDysonAccount:
+    """Dyson account (asyncio).
+
+    HTTP requests are sent using a pooled aiohttp session. Coroutines can
+    be cancelled and raise asyncio.TimeoutError when the timeout expires.
+    """
+
+    def __init__(self, email, password, country, session=None,
+                 timeout=DEFAULT_TIMEOUT, device_factory=None,
+                 connection_limit=DEFAULT_CONNECTION_LIMIT):
+        # pylint: disable=too-many-arguments
+        """Create a new Dyson account.
+
+        :param email: User email
+        :param password: User password
+        :param country: 2 characters language code
+        :param session: aiohttp ClientSession to use (optional). The
+                        session is not closed by the account if given.
+        :param timeout: Total timeout of each request in seconds, also
+                        applied to requests sent with a given session
+        :param device_factory: Factory used to build devices (optional)
+        :param connection_limit: Max connections of the account session
+        """
+        self._email = email
+        self._password = password
+        self._country = country
+        self._logged = False
+        self._auth = None
+        self._session = session
+        self._owned_session = session is None
+        self._timeout = aiohttp.ClientTimeout(total=timeout)
+        self._connection_limit = connection_limit
+        self._device_factory = device_factory or DeviceFactory()
+
+    def _get_session(self):
+        """Return the HTTP session, create it if needed."""
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self._connection_limit),
+                timeout=self._timeout)
+        return self._session
+
+    async def login(self):
+        """Login to dyson web services."""
+        request_body = {
+            "Email": self._email,
+            "Password": self._password
+        }
+        async with self._get_session().post(
+                "https://{0}/v1/userregistration/authenticate?country={1}"
+                .format(DYSON_API_URL, self._country), data=request_body,
+                ssl=False, timeout=self._timeout) as login:
+            if login.status == 200:
+                json_response = await login.json()
+                self._auth = aiohttp.BasicAuth(json_response["Account"],
+                                               json_response["Password"])
+                self._logged = True
+            else:
+                self._logged = False
+        return self._logged
+
+    async def devices(self):
+        """Return all devices linked to the account.
+
+        :raise DysonNotLoggedException: if not logged or if the credentials
+                                        are rejected (HTTP 401)
+        :raise aiohttp.ClientResponseError: for other HTTP errors
+        """
+        if not self._logged:
+            _LOGGER.warning("Not logged to Dyson Web Services.")
+            raise DysonNotLoggedException()
+        async with self._get_session().get(
+                "https://{0}/v1/provisioningservice/manifest".format(
+                    DYSON_API_URL), auth=self._auth, ssl=False,
+                timeout=self._timeout) as response:
+            if response.status == 401:
+                _LOGGER.warning("Not logged to Dyson Web Services.")
+                self._logged = False
+                raise DysonNotLoggedException()
+            response.raise_for_status()
+            manifest = await response.json()
+        return self._device_factory.create_devices(manifest)
+
+    async def close(self):
+        """Close the HTTP session if it has been created by the account."""
+        if self._owned_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        """Enter the async context manager."""
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        """Close the account session."""
+        await self.close()
+
+    @property
+    def logged(self):
+        """Return True if user is logged, else False."""
+        return self._logged
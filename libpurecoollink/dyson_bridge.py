@@ -0,0 +1,382 @@
+"""Bridge republishing normalized device states to an upstream broker.
+
+States of all attached devices are normalized to one topic per device
+and state kind, and one JSON payload::
+
+    dyson/<serial>/environment
+    {"serial": "...", "product_type": "475", "time": 1500000000.0,
+     "humidity": 54, "volatil_organic_compounds": 5, "temperature": 296.7,
+     "dust": 4, "sleep_timer": 28}
+
+    dyson/<serial>/state
+    {"serial": "...", "product_type": "475", "time": 1500000000.0,
+     "fan_mode": "FAN", "speed": 4, "filter_life": 2087, ...}
+
+States with the same values as the previous one of the device are not
+republished. Messages are published by batch, from a bridge thread, over
+one upstream connection shared by all devices. While the upstream broker
+is not reachable, messages are kept in a bounded queue file, oldest
+messages first dropped when full, and published again in order once the
+connection is back.
+
+Messages accepted by the upstream client are never queued again: the
+client delivers them itself after a reconnection (QoS 1 and 2). They are
+tracked by message id until acknowledged.
+"""
+
+import json
+import logging
+import struct
+import time
+from itertools import islice
+from threading import Condition, Thread
+
+from .dyson_export import state_fields, ENVIRONMENTAL_MEASUREMENT, \
+    STATE_MEASUREMENT
+from .dyson_pure_history_file import DysonHistoryFile
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_PREFIX = "dyson"
+DEFAULT_QOS = 1
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_FLUSH_INTERVAL = 0.5
+DEFAULT_RETRY_INTERVAL = 1
+DEFAULT_MAX_PENDING = 10000
+DEFAULT_PUBLISH_TIMEOUT = 10
+DEFAULT_QUEUE_CAPACITY = 20000
+# Max size of topic and payload of a queued message
+DEFAULT_SLOT_SIZE = 512
+
+MQTT_SUCCESS = 0
+MQTT_ERR_NO_CONN = 4
+
+_TOPIC_KINDS = {ENVIRONMENTAL_MEASUREMENT: "environment",
+                STATE_MEASUREMENT: "state"}
+
+
+def _number(value):
+    """Return a numeric state value as int, others unchanged."""
+    return int(value) if value.isdigit() else value
+
+
+# Conversion of fan state values
+_NORMALIZERS = {
+    "speed": _number,
+    "filter_life": _number,
+    "quality_target": _number,
+    "heat_target": lambda value: int(value) / 10 if value.isdigit()
+    else value
+}
+
+
+def queue_record(slot_size=DEFAULT_SLOT_SIZE):
+    """Return the record of a queue file.
+
+    Fields: time, topic length, payload length, topic and payload.
+
+    :param slot_size: Max size of topic and payload
+    """
+    return struct.Struct("<dHH{0}s".format(slot_size))
+
+
+def _payload(serial, product_type, fields, values, timestamp):
+    """Return the normalized JSON payload of state values."""
+    document = {"serial": serial, "product_type": product_type,
+                "time": timestamp}
+    for field, value in zip(fields, values):
+        normalizer = _NORMALIZERS.get(field)
+        document[field] = value if normalizer is None else \
+            normalizer(value)
+    return json.dumps(document, separators=(",", ":")).encode("utf-8")
+
+
+def normalize(serial, product_type, state, timestamp):
+    """Return (topic kind, payload) of a state.
+
+    :param serial: Device serial
+    :param product_type: Device product type
+    :param state: Device message
+    :param timestamp: Epoch seconds
+    :return: None if the message is not a fan or environmental state
+    """
+    description = state_fields(state)
+    if description is None:
+        return None
+    measurement, fields, values = description
+    return (_TOPIC_KINDS[measurement],
+            _payload(serial, product_type, fields, values, timestamp))
+
+
+class DysonMqttBridge:
+    """Republish states of many devices to an upstream MQTT broker."""
+
+    def __init__(self, upstream, queue_path, prefix=DEFAULT_PREFIX,
+                 qos=DEFAULT_QOS, batch_size=DEFAULT_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 retry_interval=DEFAULT_RETRY_INTERVAL,
+                 max_pending=DEFAULT_MAX_PENDING,
+                 queue_capacity=DEFAULT_QUEUE_CAPACITY,
+                 slot_size=DEFAULT_SLOT_SIZE,
+                 publish_timeout=DEFAULT_PUBLISH_TIMEOUT):
+        # pylint: disable=too-many-arguments
+        """Create a new bridge and start its thread.
+
+        Messages left in the queue file by a previous bridge are published
+        first.
+
+        :param upstream: Upstream paho Client, configured and connected
+                         with its network loop started (loop_start)
+        :param queue_path: Queue file
+        :param prefix: Topics prefix
+        :param qos: Quality of service of published messages
+        :param batch_size: Messages published at once
+        :param flush_interval: Max seconds before pending messages are
+                               published
+        :param retry_interval: Seconds between attempts to publish
+                               queued messages
+        :param max_pending: Max messages waiting for the bridge thread,
+                            newer messages are dropped
+        :param queue_capacity: Max messages of a new queue file
+        :param slot_size: Max size of topic and payload of a new queue
+                          file
+        :param publish_timeout: Seconds to wait for a batch to be
+                                acknowledged
+        """
+        self._upstream = upstream
+        self._prefix = prefix
+        self._qos = qos
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._retry_interval = retry_interval
+        self._max_pending = max_pending
+        self._publish_timeout = publish_timeout
+        self._record = queue_record(slot_size)
+        self._slot_size = slot_size
+        self._queue = DysonHistoryFile(queue_path, self._record,
+                                       queue_capacity)
+        # Last published values, by topic
+        self._last_values = {}
+        # Messages accepted by the upstream client, not acknowledged yet,
+        # by message id
+        self._in_flight = {}
+        self._pending = []
+        self._oldest = None
+        self._closed = False
+        self._published = 0
+        self._deduplicated = 0
+        self._queued = 0
+        self._dropped = 0
+        self._condition = Condition()
+        self._thread = Thread(target=self._run, name="dyson-bridge")
+        self._thread.daemon = True
+        self._thread.start()
+
+    @property
+    def published(self):
+        """Return the number of published messages."""
+        return self._published
+
+    @property
+    def deduplicated(self):
+        """Return the number of states not published, without change."""
+        return self._deduplicated
+
+    @property
+    def in_flight(self):
+        """Return the number of messages waiting for acknowledgement."""
+        return len(self._in_flight)
+
+    @property
+    def queued(self):
+        """Return the number of messages written to the queue file."""
+        return self._queued
+
+    @property
+    def dropped(self):
+        """Return the number of dropped messages."""
+        return self._dropped
+
+    @property
+    def queue_size(self):
+        """Return the number of messages in the queue file."""
+        return len(self._queue)
+
+    def add(self, serial, product_type, state, timestamp=None):
+        """Republish a device state if its values changed.
+
+        :param serial: Device serial
+        :param product_type: Device product type
+        :param state: Device message, only fan and environmental states
+                      are republished
+        :param timestamp: Epoch seconds (default: now)
+        :return: True if the state will be published
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        description = state_fields(state)
+        if description is None:
+            return False
+        measurement, fields, values = description
+        topic = "{0}/{1}/{2}".format(self._prefix, serial,
+                                     _TOPIC_KINDS[measurement])
+        with self._condition:
+            if self._last_values.get(topic) == values:
+                self._deduplicated += 1
+                return False
+        payload = _payload(serial, product_type, fields, values, timestamp)
+        with self._condition:
+            if self._closed:
+                return False
+            if self._last_values.get(topic) == values:
+                self._deduplicated += 1
+                return False
+            if len(self._pending) >= self._max_pending:
+                self._dropped += 1
+                return False
+            self._last_values[topic] = values
+            if not self._pending:
+                self._oldest = time.monotonic()
+                self._condition.notify_all()
+            self._pending.append((timestamp, topic, payload))
+            if len(self._pending) >= self._batch_size:
+                self._condition.notify_all()
+        return True
+
+    def listener(self, device):
+        """Return a message listener republishing states of a device.
+
+        :param device: DysonPureCoolLink device
+        """
+        serial = device.serial
+        product_type = device.product_type
+
+        def add_state(message):
+            """Add a device message."""
+            self.add(serial, product_type, message)
+        return add_state
+
+    def attach(self, device):
+        """Republish states of a device.
+
+        :param device: DysonPureCoolLink device
+        """
+        device.add_message_listener(self.listener(device))
+
+    def _run(self):
+        """Publish messages until closed."""
+        while True:
+            with self._condition:
+                while not self._closed and \
+                        len(self._pending) < self._batch_size:
+                    if self._pending:
+                        remaining = self._oldest + self._flush_interval - \
+                            time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._condition.wait(remaining)
+                    elif len(self._queue) or self._in_flight:
+                        # Retry queued messages and check acknowledgements
+                        # periodically
+                        if not self._condition.wait(self._retry_interval):
+                            break
+                    else:
+                        self._condition.wait()
+                batch = self._pending
+                self._pending = []
+                closed = self._closed
+            self._forward(batch)
+            if closed:
+                return
+
+    def _connected(self):
+        """Return True if the upstream client is connected."""
+        return self._upstream.is_connected()
+
+    def _forward(self, batch):
+        """Publish queued messages then a batch, queue them if failed."""
+        self._acknowledge()
+        if self._connected():
+            self._publish_queue()
+        if batch and not len(self._queue) and self._connected():
+            batch = batch[self._publish(batch):]
+        for message in batch:
+            self._enqueue(*message)
+        self._queue.flush()
+
+    def _publish_queue(self):
+        """Publish queued messages, oldest first, until a failure."""
+        while len(self._queue):
+            batch = [(record[0], record[3][:record[1]].decode("utf-8"),
+                      record[3][record[1]:record[1] + record[2]])
+                     for record in islice(self._queue.records(),
+                                          self._batch_size)]
+            published = self._publish(batch)
+            self._queue.discard(published)
+            if published < len(batch):
+                return
+
+    def _accepted(self, info):
+        """Return True if the upstream client will deliver a message."""
+        # QoS 1 and 2 messages are kept by the client while disconnected
+        return info.rc == MQTT_SUCCESS or (
+            info.rc == MQTT_ERR_NO_CONN and self._qos > 0)
+
+    def _publish(self, batch):
+        """Publish messages, return the number accepted, in order.
+
+        Waits publish_timeout seconds at most for acknowledgements.
+        """
+        accepted = 0
+        for _, topic, payload in batch:
+            info = self._upstream.publish(topic, payload, self._qos)
+            if not self._accepted(info):
+                break
+            self._in_flight[info.mid] = info
+            accepted += 1
+        if accepted < len(batch):
+            _LOGGER.warning("Upstream broker unavailable, %s messages "
+                            "queued", len(batch) - accepted)
+        self._acknowledge(self._publish_timeout)
+        return accepted
+
+    def _acknowledge(self, timeout=0):
+        """Count acknowledged messages, wait for others up to timeout."""
+        deadline = time.monotonic() + timeout
+        for mid, info in list(self._in_flight.items()):
+            remaining = deadline - time.monotonic()
+            if not info.is_published() and remaining > 0 and \
+                    info.rc == MQTT_SUCCESS:
+                try:
+                    info.wait_for_publish(remaining)
+                except (RuntimeError, ValueError) as error:
+                    _LOGGER.debug("Publication %s not acknowledged: %s",
+                                  mid, error)
+            if info.is_published():
+                del self._in_flight[mid]
+                self._published += 1
+
+    def _enqueue(self, timestamp, topic, payload):
+        """Append a message to the queue file."""
+        topic = topic.encode("utf-8")
+        if len(topic) + len(payload) > self._slot_size:
+            _LOGGER.warning("Message of %s too long, not queued", topic)
+            self._dropped += 1
+            return
+        if len(self._queue) == self._queue.capacity:
+            # Oldest message overwritten
+            self._dropped += 1
+        self._queue.append(timestamp, len(topic), len(payload),
+                           topic + payload)
+        self._queued += 1
+
+    def close(self):
+        """Publish or queue pending messages and close the queue file.
+
+        The upstream client is not disconnected, it still delivers the
+        messages waiting for acknowledgement.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+        self._queue.close()
@@ -0,0 +1,250 @@
+"""Dyson devices commands pipeline."""
+
+import bisect
+import logging
+import time
+from concurrent.futures import Future
+from threading import Lock, Timer
+
+from .exceptions import DysonCommandTimeoutException
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_COALESCING_WINDOW = 0.05
+DEFAULT_ACK_TIMEOUT = 10
+DEFAULT_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+NO_CHANGE = "STET"
+
+
+class DysonCommandCoalescer:
+    """Merge configuration changes sent within a time window.
+
+    Changes submitted within the window are merged (last value wins) and
+    sent in one command. Fields already equal to the current device state
+    are not sent, unless a sent value of the field is not reported by the
+    device yet; nothing is sent if no field changes.
+    """
+
+    def __init__(self, send_function, current_values=None,
+                 window=DEFAULT_COALESCING_WINDOW,
+                 in_flight_timeout=DEFAULT_ACK_TIMEOUT):
+        """Create a new coalescer.
+
+        :param send_function: Function called with the merged data
+        :param current_values: Function returning current field values
+                               (dictionary), optional
+        :param window: Time window in seconds
+        :param in_flight_timeout: Time in seconds after which a sent value
+                                  not reported by the device is forgotten
+        """
+        self._send_function = send_function
+        self._current_values = current_values
+        self._window = window
+        self._in_flight_timeout = in_flight_timeout
+        self._pending = {}
+        self._in_flight = {}
+        self._timer = None
+        self._lock = Lock()
+
+    def submit(self, data):
+        """Merge fields to send.
+
+        :param data: Fields to send
+        """
+        with self._lock:
+            self._pending.update(data)
+            if self._timer is None:
+                self._timer = Timer(self._window, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """Send pending fields now."""
+        now = time.monotonic()
+        with self._lock:
+            data = self._pending
+            self._pending = {}
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._in_flight = {
+                field: (value, sent) for field, (value, sent)
+                in self._in_flight.items()
+                if now - sent < self._in_flight_timeout}
+            in_flight = set(self._in_flight)
+        current = self._current_values() if self._current_values else {}
+        data = {field: value for field, value in data.items()
+                if value != NO_CHANGE and (field in in_flight or
+                                           current.get(field) != value)}
+        if data:
+            with self._lock:
+                self._in_flight.update(
+                    (field, (value, now)) for field, value in data.items())
+            self._send_function(data)
+        else:
+            _LOGGER.debug("No configuration change to send")
+
+    def on_state(self, fields):
+        """Forget sent values reported by a new state.
+
+        :param fields: State fields (dictionary)
+        """
+        if not self._in_flight:
+            return
+        with self._lock:
+            for field in [field for field, (value, _) in
+                          self._in_flight.items()
+                          if fields.get(field) == value]:
+                del self._in_flight[field]
+
+    def close(self):
+        """Send pending fields and stop the coalescer."""
+        self.flush()
+
+    @property
+    def window(self):
+        """Return time window in seconds."""
+        return self._window
+
+    @property
+    def pending(self):
+        """Return a copy of pending fields."""
+        with self._lock:
+            return dict(self._pending)
+
+
+class LatencyHistogram:
+    """Histogram of latencies with fixed buckets (seconds)."""
+
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+        """Create a new histogram.
+
+        :param buckets: Sorted upper bounds of buckets, in seconds. An
+                        extra bucket holds values above the last bound.
+        """
+        self._bounds = tuple(buckets)
+        self._counts = [0] * (len(self._bounds) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = Lock()
+
+    def observe(self, value):
+        """Record a value.
+
+        :param value: Latency in seconds
+        """
+        index = bisect.bisect_left(self._bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    @property
+    def buckets(self):
+        """Return list of (upper bound, count), last bound is infinity."""
+        with self._lock:
+            return list(zip(self._bounds + (float("inf"),), self._counts))
+
+    @property
+    def count(self):
+        """Return number of values."""
+        return self._count
+
+    @property
+    def sum(self):
+        """Return sum of values."""
+        return self._sum
+
+    @property
+    def mean(self):
+        """Return mean value, None if empty."""
+        return self._sum / self._count if self._count else None
+
+
+class DysonCommandTracker:
+    """Track commands until the device state reflects them.
+
+    Each tracked command returns a concurrent.futures.Future resolved
+    with the command latency (seconds) when a state message contains the
+    expected fields, or failed with DysonCommandTimeoutException.
+    """
+
+    def __init__(self, serial, histogram=None):
+        """Create a new command tracker.
+
+        :param serial: Device serial
+        :param histogram: LatencyHistogram (optional, can be shared)
+        """
+        self._serial = serial
+        self._histogram = histogram or LatencyHistogram()
+        self._pending = []
+        self._lock = Lock()
+
+    def track(self, expected, current=None, timeout=DEFAULT_ACK_TIMEOUT):
+        """Track a command.
+
+        :param expected: Expected state fields (dictionary)
+        :param current: Current state fields (dictionary), optional
+        :param timeout: Timeout in seconds
+        :return: Future
+        """
+        future = Future()
+        future.set_running_or_notify_cancel()
+        if current is not None and all(current.get(field) == value
+                                       for field, value in expected.items()):
+            # Nothing to apply
+            future.set_result(0.0)
+            return future
+        entry = [expected, future, time.monotonic(), None]
+        entry[3] = Timer(timeout, self._expire, (entry, timeout))
+        entry[3].daemon = True
+        with self._lock:
+            self._pending.append(entry)
+        entry[3].start()
+        return future
+
+    def on_state(self, fields):
+        """Resolve commands reflected by a new state.
+
+        :param fields: State fields (dictionary)
+        """
+        if not self._pending:
+            return
+        now = time.monotonic()
+        with self._lock:
+            done = [entry for entry in self._pending
+                    if all(fields.get(field) == value
+                           for field, value in entry[0].items())]
+            for entry in done:
+                self._pending.remove(entry)
+        for expected, future, started, timer in done:
+            timer.cancel()
+            latency = now - started
+            self._histogram.observe(latency)
+            _LOGGER.debug("Device %s applied %s in %.3fs", self._serial,
+                          expected, latency)
+            future.set_result(latency)
+
+    def _expire(self, entry, timeout):
+        """Fail a command not acknowledged in time."""
+        with self._lock:
+            if entry not in self._pending:
+                return
+            self._pending.remove(entry)
+        entry[1].set_exception(
+            DysonCommandTimeoutException(self._serial, entry[0], timeout))
+
+    @property
+    def histogram(self):
+        """Return latency histogram."""
+        return self._histogram
+
+    @histogram.setter
+    def histogram(self, value):
+        """Set latency histogram, to share it between devices."""
+        self._histogram = value
+
+    @property
+    def pending(self):
+        """Return number of pending commands."""
+        return len(self._pending)
@@ -0,0 +1,173 @@
+"""Change-only emission of device states.
+
+A DysonDeadbandFilter compares each environmental sensor and fan state
+with the last emitted state of the same kind. A state is emitted when a
+field changed beyond its deadband, or when no state of this kind was
+emitted for heartbeat seconds. Fields without deadband are emitted on any
+change (fan mode, speed, ...).
+
+Values are compared with the last emitted values, not the last received
+ones: a slow drift is emitted once it exceeds the deadband.
+"""
+
+import time
+
+from .dyson_export import state_fields
+from .utils import printable_fields
+
+DEFAULT_HEARTBEAT = 600
+
+
+class Deadband:
+    """Change threshold of a numeric field.
+
+    A change is meaningful when it is greater than the absolute threshold
+    or greater than the relative threshold times the last emitted value.
+    """
+
+    def __init__(self, absolute=None, relative=None):
+        """Create a new deadband.
+
+        :param absolute: Absolute threshold, in field unit
+        :param relative: Relative threshold (0.05 for 5%)
+        """
+        self._absolute = absolute
+        self._relative = relative
+
+    @property
+    def absolute(self):
+        """Return absolute threshold."""
+        return self._absolute
+
+    @property
+    def relative(self):
+        """Return relative threshold."""
+        return self._relative
+
+    def exceeded(self, previous, value):
+        """Return True if a value is out of the deadband of the previous one.
+
+        :param previous: Last emitted value
+        :param value: New value
+        """
+        # Rounded: 296.7 - 296.5 is slightly greater than 0.2
+        change = round(abs(value - previous), 9)
+        if self._absolute is not None and change > self._absolute:
+            return True
+        return self._relative is not None and \
+            change > self._relative * abs(previous)
+
+    def __repr__(self):
+        """Return a String representation."""
+        fields = [("absolute", str(self.absolute)),
+                  ("relative", str(self.relative))]
+        return 'Deadband(' + ",".join(printable_fields(fields)) + ')'
+
+
+# Temperature in Kelvin, other environmental values are integers
+DEFAULT_DEADBANDS = {
+    "temperature": Deadband(absolute=0.2),
+    "humidity": Deadband(absolute=1),
+    "dust": Deadband(absolute=2),
+    "volatil_organic_compounds": Deadband(absolute=1)
+}
+
+
+def _number(value):
+    """Return a numeric state value, None if not numeric."""
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return None
+
+
+class DysonDeadbandFilter:
+    """Filter out device states without meaningful change."""
+
+    def __init__(self, deadbands=None, heartbeat=DEFAULT_HEARTBEAT):
+        """Create a new filter.
+
+        :param deadbands: Deadband by field name (default:
+                          DEFAULT_DEADBANDS), fields of environmental and
+                          fan states
+        :param heartbeat: Seconds after which a state is emitted even
+                          without change, None to disable
+        """
+        self._deadbands = DEFAULT_DEADBANDS if deadbands is None \
+            else deadbands
+        self._heartbeat = heartbeat
+        # (emission time, values) by measurement
+        self._last = {}
+        self._emitted = 0
+        self._suppressed = 0
+
+    @property
+    def deadbands(self):
+        """Return deadbands by field name."""
+        return self._deadbands
+
+    @property
+    def heartbeat(self):
+        """Return heartbeat in seconds."""
+        return self._heartbeat
+
+    @property
+    def emitted(self):
+        """Return the number of emitted states."""
+        return self._emitted
+
+    @property
+    def suppressed(self):
+        """Return the number of states without meaningful change."""
+        return self._suppressed
+
+    def accept(self, state, now=None):
+        """Return True if a state must be emitted, and record it if so.
+
+        Other messages are always emitted.
+
+        :param state: Device message
+        :param now: Monotonic time in seconds (default: now)
+        """
+        description = state_fields(state)
+        if description is None:
+            return True
+        now = time.monotonic() if now is None else now
+        measurement, fields, values = description
+        last = self._last.get(measurement)
+        if last is None or self._changed(fields, last[1], values) or (
+                self._heartbeat is not None and
+                now - last[0] >= self._heartbeat):
+            self._last[measurement] = (now, values)
+            self._emitted += 1
+            return True
+        self._suppressed += 1
+        return False
+
+    def _changed(self, fields, previous_values, values):
+        """Return True if a field changed beyond its deadband."""
+        for field, previous, value in zip(fields, previous_values, values):
+            if previous == value:
+                continue
+            deadband = self._deadbands.get(field)
+            if deadband is None:
+                return True
+            previous_number = _number(previous)
+            number = _number(value)
+            if previous_number is None or number is None or \
+                    deadband.exceeded(previous_number, number):
+                return True
+        return False
+
+    def reset(self):
+        """Forget emitted states, next states are emitted."""
+        self._last = {}
+
+    def __repr__(self):
+        """Return a String representation."""
+        fields = [("heartbeat", str(self.heartbeat)),
+                  ("emitted", str(self.emitted)),
+                  ("suppressed", str(self.suppressed))]
+        return 'DysonDeadbandFilter(' + ",".join(printable_fields(fields)) + \
+            ')'
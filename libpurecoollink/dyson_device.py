@@ -4,10 +4,12 @@
 
 from queue import Queue
 import logging
-import json
 import abc
-import time
 
+import paho.mqtt.client as mqtt
+
+from .dyson_payload import serialize_command, REQUEST_CURRENT_STATE
+from . import dyson_metrics
 from .utils import printable_fields
 from .utils import decrypt_password
 
@@ -23,6 +25,9 @@ MQTT_RETURN_CODES = {
 }
 
 DEFAULT_PORT = 1883
+DEFAULT_CONNECT_DEADLINE = 10
+# Connection phases, in order
+CONNECT_PHASES = ("tcp", "connack", "state", "sensor")
 
 
 class NetworkDevice:
@@ -61,6 +66,76 @@ class NetworkDevice:
         return 'NetworkDevice(' + ",".join(printable_fields(fields)) + ')'
 
 
+class DysonConnectResult:
+    """Result of a connection with deadline."""
+
+    def __init__(self, serial, timeout):
+        """Create a new connection result.
+
+        :param serial: Device serial
+        :param timeout: Connection deadline in seconds
+        """
+        self._serial = serial
+        self._timeout = timeout
+        self._timings = {}
+        self._failed_phase = None
+        self._error = None
+
+    def add_timing(self, phase, seconds):
+        """Record time spent in a completed phase."""
+        self._timings[phase] = seconds
+
+    def fail(self, phase, error):
+        """Record the failed phase."""
+        self._failed_phase = phase
+        self._error = error
+
+    @property
+    def serial(self):
+        """Device serial."""
+        return self._serial
+
+    @property
+    def timeout(self):
+        """Connection deadline in seconds."""
+        return self._timeout
+
+    @property
+    def connected(self):
+        """Return True if all phases completed."""
+        return self._failed_phase is None
+
+    @property
+    def timings(self):
+        """Return time spent in each completed phase, in seconds."""
+        return self._timings
+
+    @property
+    def elapsed(self):
+        """Return total time spent, in seconds."""
+        return sum(self._timings.values())
+
+    @property
+    def failed_phase(self):
+        """Return failed phase (see CONNECT_PHASES), None if connected."""
+        return self._failed_phase
+
+    @property
+    def error(self):
+        """Return failure reason, None if connected."""
+        return self._error
+
+    def __repr__(self):
+        """Return a String representation."""
+        fields = [("serial", self.serial), ("connected", str(self.connected)),
+                  ("failed_phase", str(self.failed_phase)),
+                  ("error", str(self.error))]
+        fields += [(phase, "{0:.3f}".format(self._timings[phase]))
+                   for phase in CONNECT_PHASES if phase in self._timings]
+        return 'DysonConnectResult(' + ",".join(
+            printable_fields(fields)) + ')'
+
+
 class DysonDevice:
     """Abstract Dyson device."""
 
@@ -68,6 +143,10 @@ class DysonDevice:
     def on_connect(client, userdata, flags, return_code):
         # pylint: disable=unused-argument
         """Set function callback when connected."""
+        metrics = dyson_metrics.METRICS
+        if metrics is not None:
+            metrics.connections.inc((userdata.product_type, "accepted"
+                                     if return_code == 0 else "refused"))
         if return_code == 0:
             _LOGGER.debug("Connected with result code: %s", return_code)
             client.subscribe(userdata.status_topic)
@@ -78,6 +157,15 @@ class DysonDevice:
                           MQTT_RETURN_CODES[return_code])
             userdata.connection_callback(False)
 
+    @staticmethod
+    def on_disconnect(client, userdata, return_code):
+        # pylint: disable=unused-argument
+        """Set function callback when disconnected."""
+        if return_code != 0:
+            _LOGGER.warning("Connection lost to device %s: %s",
+                            userdata.serial, return_code)
+            userdata.connection_lost()
+
     def __init__(self, json_body):
         """Create a new Dyson device.
 
@@ -91,9 +179,12 @@ class DysonDevice:
         self._auto_update = json_body['AutoUpdate']
         self._new_version_available = json_body['NewVersionAvailable']
         self._product_type = json_body['ProductType']
+        self._command_topic = "{0}/{1}/command".format(self._product_type,
+                                                       self._serial)
         self._network_device = None
         self._connected = False
         self._mqtt = None
+        self._client_factory = mqtt.Client
         self._callback_message = []
         self._device_available = False
         self._current_state = None
@@ -106,6 +197,11 @@ class DysonDevice:
         """Set function called when device is connected."""
         self._connection_queue.put_nowait(connected)
 
+    def connection_lost(self):
+        """Call when the connection is lost. Internal method."""
+        self._connected = False
+        self._device_available = False
+
     @abc.abstractmethod
     def connect(self, device_ip, device_port=DEFAULT_PORT):
         """Connect to the device using ip address.
@@ -122,19 +218,56 @@ class DysonDevice:
         """MQTT status topic."""
         return
 
+    @property
+    def client_factory(self):
+        """Return the MQTT client factory (paho Client by default)."""
+        return self._client_factory
+
+    @client_factory.setter
+    def client_factory(self, value):
+        """Set the MQTT client factory.
+
+        The factory is called like paho Client (userdata and protocol
+        keyword arguments) and must return a client with the same API, for
+        instance a simulated client (see dyson_simulator).
+        """
+        self._client_factory = value
+
+    def _create_client(self, **kwargs):
+        """Create a new MQTT client using the client factory."""
+        return self._client_factory(userdata=self, **kwargs)
+
     @property
     def command_topic(self):
         """MQTT command topic."""
-        return "{0}/{1}/command".format(self._product_type, self._serial)
+        return self._command_topic
+
+    def publish_command(self, payload, qos=0):
+        """Publish a serialized command on the command topic.
+
+        :param payload: Serialized payload (str or bytes)
+        :param qos: MQTT QoS
+        :return: MQTTMessageInfo, None if not connected
+        """
+        if not self._connected:
+            _LOGGER.warning(
+                "Unable to send commands because device %s is not connected",
+                self.serial)
+            return None
+        return self._mqtt.publish(self._command_topic, payload, qos)
+
+    def _count_command(self, command):
+        """Feed command metrics."""
+        metrics = dyson_metrics.METRICS
+        if metrics is not None:
+            metrics.commands.inc((self._product_type, command))
 
     def request_current_state(self):
         """Request new state message."""
         if self._connected:
-            payload = {
-                "msg": "REQUEST-CURRENT-STATE",
-                "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
-            }
-            self._mqtt.publish(self.command_topic, json.dumps(payload))
+            self._count_command(REQUEST_CURRENT_STATE)
+            self._mqtt.publish(self._command_topic,
+                               serialize_command(REQUEST_CURRENT_STATE))
         else:
             _LOGGER.warning(
                 "Unable to send commands because device %s is not connected",
@@ -0,0 +1,415 @@
+"""Streaming export of device states.
+
+A DysonStateExporter collects environmental sensor and fan states of many
+devices, and writes them by batch to a sink (file or socket) in InfluxDB
+line protocol or CSV::
+
+    exporter = DysonStateExporter(FileSink("/var/lib/dyson/states.txt"))
+    for device in devices:
+        exporter.attach(device)
+
+Values are serialized straight from state properties. Batches are written
+by a background thread when batch_size states are pending or after
+flush_interval seconds. When the sink is too slow and max_pending states
+are pending, listeners block (backpressure on the MQTT network threads)
+or new states are dropped.
+"""
+
+import csv
+import io
+import logging
+import os
+import socket
+import time
+from operator import attrgetter
+from threading import Condition, Lock, Thread
+
+from .dyson_pure_state import DysonEnvironmentalSensorState, \
+    DysonPureCoolState, DysonPureHotCoolState
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_FLUSH_INTERVAL = 1
+DEFAULT_MAX_PENDING = 10000
+DEFAULT_SOCKET_TIMEOUT = 10
+
+ENVIRONMENTAL_MEASUREMENT = "dyson_environment"
+STATE_MEASUREMENT = "dyson_state"
+ENVIRONMENTAL_FIELDS = ("humidity", "volatil_organic_compounds",
+                        "temperature", "dust", "sleep_timer")
+STATE_FIELDS = ("fan_mode", "fan_state", "night_mode", "speed",
+                "oscillation", "filter_life", "quality_target",
+                "standby_monitoring")
+HOT_STATE_FIELDS = STATE_FIELDS + ("tilt", "focus_mode", "heat_target",
+                                   "heat_mode", "heat_state")
+
+# Measurement, field names and field values getter, by state class
+_STATES = {
+    DysonEnvironmentalSensorState: (ENVIRONMENTAL_MEASUREMENT,
+                                    ENVIRONMENTAL_FIELDS,
+                                    attrgetter(*ENVIRONMENTAL_FIELDS)),
+    DysonPureCoolState: (STATE_MEASUREMENT, STATE_FIELDS,
+                         attrgetter(*STATE_FIELDS)),
+    DysonPureHotCoolState: (STATE_MEASUREMENT, HOT_STATE_FIELDS,
+                            attrgetter(*HOT_STATE_FIELDS))
+}
+
+
+def state_fields(state):
+    """Return (measurement, field names, field values) of a state.
+
+    :param state: DysonEnvironmentalSensorState, DysonPureCoolState or
+                  DysonPureHotCoolState
+    :return: None for other messages
+    """
+    description = _STATES.get(type(state))
+    if description is None:
+        return None
+    measurement, fields, values = description
+    return measurement, fields, values(state)
+
+
+def _escape_key(value):
+    """Escape a measurement name, tag key or value (line protocol)."""
+    return value.replace(",", "\\,").replace("=", "\\=").replace(" ", "\\ ")
+
+
+def _float_value(value):
+    """Return a float field value in line protocol."""
+    return repr(float(value))
+
+
+def _integer_value(value):
+    """Return an integer field value in line protocol."""
+    return "{0}i".format(int(value))
+
+
+def _string_value(value):
+    """Return a string field value in line protocol."""
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+# Line protocol type of numeric fields, other fields are strings. Types do
+# not depend on values: a field must keep its type in a series (sensor
+# values are 0 when the sensor is off).
+_LINE_PROTOCOL_TYPES = {
+    "humidity": _float_value,
+    "volatil_organic_compounds": _float_value,
+    "temperature": _float_value,
+    "dust": _float_value,
+    "sleep_timer": _integer_value
+}
+
+# Field names and value serializers, by state class
+_LINE_PROTOCOL_FIELDS = {
+    state_class: tuple((field, _LINE_PROTOCOL_TYPES.get(field,
+                                                        _string_value))
+                       for field in fields)
+    for state_class, (_, fields, _) in _STATES.items()
+}
+
+
+class LineProtocolFormat:
+    """InfluxDB line protocol, serial as tag, nanoseconds timestamps.
+
+    Environmental values are floats, except the sleep timer (integer).
+    Fan state values are strings.
+    """
+
+    def header(self):
+        """Return None, line protocol has no header."""
+        return None
+
+    def serialize(self, records):
+        """Return records in line protocol.
+
+        :param records: list of (timestamp, serial, state)
+        """
+        lines = []
+        for timestamp, serial, state in records:
+            measurement, _, values = _STATES[type(state)]
+            lines.append("{0},serial={1} {2} {3}\n".format(
+                measurement, _escape_key(serial), ",".join(
+                    field + "=" + serializer(value)
+                    for (field, serializer), value in zip(
+                        _LINE_PROTOCOL_FIELDS[type(state)], values(state))),
+                int(timestamp * 1000000000)))
+        return "".join(lines)
+
+
+class CsvFormat:
+    """CSV, one row per state.
+
+    Columns are time (epoch seconds), serial, measurement then the fields
+    of all states, empty when not available.
+    """
+
+    COLUMNS = ("time", "serial", "measurement") + ENVIRONMENTAL_FIELDS + \
+        HOT_STATE_FIELDS
+
+    def __init__(self, header=True):
+        """Create a new CSV format.
+
+        :param header: Write a header row before the first batch
+        """
+        self._header = header
+
+    def header(self):
+        """Return the header row, None if disabled."""
+        if not self._header:
+            return None
+        return ",".join(self.COLUMNS) + "\r\n"
+
+    def serialize(self, records):
+        """Return records as CSV rows.
+
+        :param records: list of (timestamp, serial, state)
+        """
+        output = io.StringIO()
+        writer = csv.writer(output)
+        for timestamp, serial, state in records:
+            measurement, fields, values = _STATES[type(state)]
+            if measurement == ENVIRONMENTAL_MEASUREMENT:
+                writer.writerow((timestamp, serial, measurement) +
+                                values(state) + ("",) * len(HOT_STATE_FIELDS))
+            else:
+                writer.writerow(
+                    (timestamp, serial, measurement) +
+                    ("",) * len(ENVIRONMENTAL_FIELDS) + values(state) +
+                    ("",) * (len(HOT_STATE_FIELDS) - len(fields)))
+        return output.getvalue()
+
+
+class FileSink:
+    """Append batches to a file."""
+
+    def __init__(self, path):
+        """Open a file in append mode.
+
+        :param path: File path
+        """
+        self._file = open(path, "ab")
+        self._empty = os.fstat(self._file.fileno()).st_size == 0
+
+    @property
+    def empty(self):
+        """Return True if the file was empty when opened."""
+        return self._empty
+
+    def write(self, data):
+        """Write a batch and flush it."""
+        self._file.write(data)
+        self._file.flush()
+
+    def close(self):
+        """Close the file."""
+        self._file.close()
+
+
+class SocketSink:
+    """Send batches over TCP (Telegraf socket listener, for instance).
+
+    The connection is opened on first write, and again after an error.
+    """
+
+    def __init__(self, host, port, timeout=DEFAULT_SOCKET_TIMEOUT):
+        """Create a new socket sink.
+
+        :param host: Host
+        :param port: Port
+        :param timeout: Connection and send timeout in seconds
+        """
+        self._address = (host, port)
+        self._timeout = timeout
+        self._socket = None
+
+    @property
+    def empty(self):
+        """Return True, the header is sent once per exporter."""
+        return True
+
+    def write(self, data):
+        """Send a batch.
+
+        :raise OSError: if the batch can not be sent
+        """
+        if self._socket is None:
+            self._socket = socket.create_connection(self._address,
+                                                    self._timeout)
+        try:
+            self._socket.sendall(data)
+        except OSError:
+            self.close()
+            raise
+
+    def close(self):
+        """Close the connection."""
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+
+class DysonStateExporter:
+    """Batch states of many devices to a sink."""
+
+    def __init__(self, sink, state_format=None,
+                 batch_size=DEFAULT_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 max_pending=DEFAULT_MAX_PENDING, block=True):
+        # pylint: disable=too-many-arguments
+        """Create a new exporter and start its writer thread.
+
+        :param sink: Sink (FileSink, SocketSink or any object with write
+                     and close methods). The header is not written to a
+                     sink whose empty attribute is False.
+        :param state_format: LineProtocolFormat (default) or CsvFormat
+        :param batch_size: States written at once
+        :param flush_interval: Max seconds before pending states are
+                               written
+        :param max_pending: Max states waiting to be written
+        :param block: Block listeners when max_pending states are pending,
+                      else drop new states
+        """
+        self._sink = sink
+        self._format = state_format or LineProtocolFormat()
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._max_pending = max_pending
+        self._block = block
+        self._pending = []
+        self._oldest = None
+        self._closed = False
+        self._header = self._format.header() if getattr(
+            sink, "empty", True) else None
+        self._exported = 0
+        self._dropped = 0
+        self._batches = 0
+        self._condition = Condition()
+        self._write_lock = Lock()
+        self._thread = Thread(target=self._run, name="dyson-exporter")
+        self._thread.daemon = True
+        self._thread.start()
+
+    @property
+    def exported(self):
+        """Return the number of written states."""
+        return self._exported
+
+    @property
+    def dropped(self):
+        """Return the number of dropped states (sink full or error)."""
+        return self._dropped
+
+    @property
+    def batches(self):
+        """Return the number of written batches."""
+        return self._batches
+
+    @property
+    def pending(self):
+        """Return the number of states waiting to be written."""
+        return len(self._pending)
+
+    def add(self, serial, state, timestamp=None):
+        """Add a state.
+
+        Other messages (Dyson 360 Eye messages, for instance) are ignored.
+
+        :param serial: Device serial
+        :param state: DysonEnvironmentalSensorState, DysonPureCoolState or
+                      DysonPureHotCoolState
+        :param timestamp: Epoch seconds (default: now)
+        :return: True if added, False if ignored or dropped
+        """
+        if type(state) not in _STATES:
+            return False
+        record = (time.time() if timestamp is None else timestamp, serial,
+                  state)
+        with self._condition:
+            while len(self._pending) >= self._max_pending and \
+                    not self._closed:
+                if not self._block:
+                    self._dropped += 1
+                    return False
+                self._condition.wait()
+            if self._closed:
+                return False
+            if not self._pending:
+                self._oldest = time.monotonic()
+                self._condition.notify_all()
+            self._pending.append(record)
+            if len(self._pending) >= self._batch_size:
+                self._condition.notify_all()
+        return True
+
+    def listener(self, serial):
+        """Return a message listener adding states of a device.
+
+        :param serial: Device serial
+        """
+        def add_state(message):
+            """Add a device message."""
+            self.add(serial, message)
+        return add_state
+
+    def attach(self, device):
+        """Export states of a device.
+
+        :param device: DysonPureCoolLink device
+        """
+        device.add_message_listener(self.listener(device.serial))
+
+    def _run(self):
+        """Write batches until closed."""
+        while True:
+            with self._condition:
+                while not self._closed and \
+                        len(self._pending) < self._batch_size:
+                    if not self._pending:
+                        self._condition.wait()
+                        continue
+                    remaining = self._oldest + self._flush_interval - \
+                        time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+
+    def flush(self):
+        """Write pending states now."""
+        with self._write_lock:
+            with self._condition:
+                batch = self._pending
+                self._pending = []
+                self._condition.notify_all()
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch):
+        """Write a batch to the sink."""
+        data = self._format.serialize(batch)
+        if self._header is not None:
+            data = self._header + data
+        try:
+            self._sink.write(data.encode("utf-8"))
+        except OSError as error:
+            _LOGGER.error("Unable to export %s states: %s", len(batch),
+                          error)
+            self._dropped += len(batch)
+            return
+        self._header = None
+        self._exported += len(batch)
+        self._batches += 1
+
+    def close(self):
+        """Write pending states, stop the writer thread and close the sink."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+        self.flush()
+        self._sink.close()
@@ -0,0 +1,163 @@
+"""Groups of Dyson Pure link devices."""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+
+from .dyson_command import LatencyHistogram
+from .dyson_device import DEFAULT_CONNECT_DEADLINE
+from .dyson_payload import serialize_command, STATE_SET, MODE_REASON_APP
+from .utils import printable_fields
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = 16
+DEFAULT_PUBLISH_TIMEOUT = 10
+
+
+class DysonFleetResult:
+    """Result of a fleet command."""
+
+    def __init__(self):
+        """Create a new fleet command result."""
+        self._succeeded = []
+        self._failed = {}
+        self._latency = LatencyHistogram()
+
+    def add_success(self, serial, latency):
+        """Record a published command."""
+        self._succeeded.append(serial)
+        self._latency.observe(latency)
+
+    def add_failure(self, serial, reason):
+        """Record a failed command."""
+        self._failed[serial] = reason
+
+    @property
+    def succeeded(self):
+        """Return serials of devices which received the command."""
+        return self._succeeded
+
+    @property
+    def failed(self):
+        """Return failure reason by serial."""
+        return self._failed
+
+    @property
+    def latency(self):
+        """Return publish latency histogram."""
+        return self._latency
+
+    def __repr__(self):
+        """Return a String representation."""
+        fields = [("succeeded", str(len(self.succeeded))),
+                  ("failed", str(len(self.failed))),
+                  ("mean_latency", str(self.latency.mean))]
+        return 'DysonFleetResult(' + ",".join(printable_fields(fields)) + ')'
+
+
+class DysonFleet:
+    """Group of Pure Cool Link and Pure Hot+Cool Link devices.
+
+    Commands are serialized once per device model and published
+    concurrently with a bounded number of workers.
+    """
+
+    def __init__(self, devices=None, max_workers=DEFAULT_MAX_WORKERS):
+        """Create a new fleet.
+
+        :param devices: Devices (optional)
+        :param max_workers: Max concurrent publications
+        """
+        self._devices = list(devices or [])
+        self._max_workers = max_workers
+
+    def add(self, device):
+        """Add a device to the fleet."""
+        self._devices.append(device)
+
+    def remove(self, device):
+        """Remove a device from the fleet."""
+        if device in self._devices:
+            self._devices.remove(device)
+
+    @property
+    def devices(self):
+        """Return devices of the fleet."""
+        return self._devices
+
+    @staticmethod
+    def _command_data(command_fields, **kwargs):
+        """Return STATE-SET fields of the given parameters."""
+        return {field: kwargs[argument].value
+                if isinstance(kwargs[argument], Enum) else kwargs[argument]
+                for argument, field in command_fields.items()
+                if kwargs.get(argument) is not None}
+
+    def _payloads(self, **kwargs):
+        """Return serialized STATE-SET payload by device class."""
+        payloads = {}
+        for device in self._devices:
+            device_class = type(device)
+            if device_class not in payloads:
+                payloads[device_class] = serialize_command(
+                    STATE_SET, {"data": self._command_data(
+                        device_class.COMMAND_FIELDS, **kwargs)},
+                    MODE_REASON_APP)
+        return payloads
+
+    def connect(self, addresses, timeout=DEFAULT_CONNECT_DEADLINE):
+        """Connect devices concurrently, each one within a deadline.
+
+        :param addresses: Device IP address by serial. Devices without
+                          address are not connected.
+        :param timeout: Deadline of each connection in seconds
+        :return: DysonConnectResult by serial
+        """
+        devices = [device for device in self._devices
+                   if device.serial in addresses]
+
+        def connect(device):
+            """Connect a device."""
+            return device.connect_with_deadline(addresses[device.serial],
+                                                timeout=timeout)
+
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            results = list(executor.map(connect, devices))
+        return {result.serial: result for result in results}
+
+    def set_configuration(self, timeout=DEFAULT_PUBLISH_TIMEOUT, **kwargs):
+        """Configure all devices.
+
+        Only the given parameters are sent; other settings of each device
+        are unchanged.
+
+        :param timeout: Max time to wait for each publication, in seconds
+        :param kwargs: Parameters (see DysonPureCoolLink.set_configuration)
+        :return: DysonFleetResult
+        """
+        payloads = self._payloads(**kwargs)
+        result = DysonFleetResult()
+
+        def publish(device):
+            """Publish the command to a device."""
+            started = time.monotonic()
+            try:
+                info = device.publish_command(payloads[type(device)], 1)
+                if info is None:
+                    result.add_failure(device.serial, "not connected")
+                    return
+                info.wait_for_publish(timeout)
+                if not info.is_published():
+                    result.add_failure(device.serial, "timeout")
+                    return
+            except (OSError, ValueError, RuntimeError) as error:
+                result.add_failure(device.serial, str(error))
+                return
+            result.add_success(device.serial, time.monotonic() - started)
+
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            list(executor.map(publish, self._devices))
+        _LOGGER.debug("Fleet command sent: %s", result)
+        return result
@@ -0,0 +1,288 @@
+"""Simulated mDNS advertisement of Dyson devices for discovery benchmarks.
+
+Simulated devices are advertised with Zeroconf.register_service, like real
+devices advertise their MQTT service. Use the loopback interface (default)
+or run the benchmark in a network namespace (``ip netns exec``) with the
+namespace address as interface.
+
+The benchmark discovers devices with DysonPureCoolLink.auto_connect, then
+connects them to the simulated devices through a SimulatedBroker.
+"""
+
+import logging
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from .const import DYSON_MQTT_SERVICE_TYPE
+from .device_factory import DeviceFactory
+from .dyson_device import DEFAULT_PORT
+from .dyson_simulator import SimulatedBroker, SimulatedPureCoolLink
+from .utils import printable_fields
+from .zeroconf import Zeroconf, ServiceInfo, _MAX_MSG_ABSOLUTE
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_INTERFACES = ("127.0.0.1",)
+DEFAULT_SERVICE_TTL = 120
+DEFAULT_EXPIRED_TTL = 10
+DEFAULT_WORKERS = 32
+DEFAULT_BENCHMARK_TIMEOUT = 120
+DEFAULT_SEARCH_TIMEOUT = 10
+
+
+def service_name(device):
+    """Return the mDNS service name of a device.
+
+    :param device: Simulated device
+    """
+    return "{0}_{1}.{2}".format(device.PRODUCT_TYPE, device.serial,
+                                DYSON_MQTT_SERVICE_TYPE)
+
+
+class CountingZeroconf(Zeroconf):
+    """Zeroconf counting sent packets."""
+
+    def __init__(self, interfaces=DEFAULT_INTERFACES):
+        """Create a new Zeroconf instance.
+
+        :param interfaces: Interface addresses (see Zeroconf)
+        """
+        self.packets_sent = 0
+        self.bytes_sent = 0
+        self.packets_dropped = 0
+        super().__init__(interfaces=list(interfaces))
+
+    def send(self, out, *args, **kwargs):
+        """Send and count an outgoing packet."""
+        size = len(out.packet())
+        if size > _MAX_MSG_ABSOLUTE:
+            self.packets_dropped += 1
+        else:
+            self.packets_sent += 1
+            self.bytes_sent += size
+        super().send(out, *args, **kwargs)
+
+
+class SimulatedResponder:
+    """Advertise simulated devices using mDNS."""
+
+    def __init__(self, interfaces=DEFAULT_INTERFACES, address="127.0.0.1",
+                 port=DEFAULT_PORT, workers=DEFAULT_WORKERS):
+        """Create a new responder.
+
+        Registering a service takes about a second (probes and
+        announcements), services are registered concurrently.
+
+        :param interfaces: Interface addresses
+        :param address: Advertised device address
+        :param port: Advertised device port
+        :param workers: Max services registered at once
+        """
+        self._zeroconf = CountingZeroconf(interfaces)
+        self._address = socket.inet_aton(address)
+        self._port = port
+        self._workers = workers
+        self._services = {}
+
+    @property
+    def zeroconf(self):
+        """Return the Zeroconf instance."""
+        return self._zeroconf
+
+    @property
+    def services(self):
+        """Return advertised service names."""
+        return list(self._services)
+
+    def _map(self, function, devices):
+        """Call a function for each device, concurrently."""
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            list(executor.map(function, devices))
+
+    def advertise(self, devices, ttl=DEFAULT_SERVICE_TTL):
+        """Register devices services.
+
+        :param devices: Simulated devices
+        :param ttl: Records TTL in seconds
+        """
+        def register(device):
+            """Register a device service."""
+            name = service_name(device)
+            info = ServiceInfo(DYSON_MQTT_SERVICE_TYPE, name,
+                               address=self._address, port=self._port,
+                               properties={},
+                               server="{0}.local.".format(device.serial))
+            self._zeroconf.register_service(info, ttl)
+            self._services[name] = info
+
+        self._map(register, devices)
+
+    def withdraw(self, devices):
+        """Unregister devices services, sending goodbye packets.
+
+        :param devices: Simulated devices
+        """
+        self._map(lambda device: self._zeroconf.unregister_service(
+            self._services.pop(service_name(device))), devices)
+
+    def expire(self, devices):
+        """Stop answering for devices without goodbye packets.
+
+        Browsers remove the services when their records TTL expires.
+
+        :param devices: Simulated devices
+        """
+        for device in devices:
+            info = self._services.pop(service_name(device))
+            del self._zeroconf.services[info.name.lower()]
+
+    def close(self):
+        """Withdraw all services and close the Zeroconf instance."""
+        self._services.clear()
+        self._zeroconf.close()
+
+
+class DiscoveryBenchmarkResult:
+    """Result of a discovery benchmark."""
+
+    def __init__(self, expected):
+        """Create a new result.
+
+        :param expected: Number of devices which should be connected
+        """
+        self.expected = expected
+        self.discovered = 0
+        self.elapsed = 0
+        self.cpu_time = 0
+        self.packets_sent = 0
+        self.bytes_sent = 0
+        self.packets_dropped = 0
+
+    @property
+    def complete(self):
+        """Return True if all devices have been discovered."""
+        return self.discovered == self.expected
+
+    def __repr__(self):
+        """Return a String representation."""
+        fields = [("expected", str(self.expected)),
+                  ("discovered", str(self.discovered)),
+                  ("elapsed", "{0:.3f}".format(self.elapsed)),
+                  ("cpu_time", "{0:.3f}".format(self.cpu_time)),
+                  ("packets_sent", str(self.packets_sent)),
+                  ("bytes_sent", str(self.bytes_sent)),
+                  ("packets_dropped", str(self.packets_dropped))]
+        return 'DiscoveryBenchmarkResult(' + ",".join(
+            printable_fields(fields)) + ')'
+
+
+class DiscoveryBenchmark:
+    """Measure auto_connect of many advertised devices.
+
+    Devices are advertised, then searched concurrently with
+    DysonPureCoolLink.auto_connect (one Zeroconf instance and browser per
+    search). While searching, `churn` devices are withdrawn and as many
+    new devices are advertised (and searched), and `expired` devices are
+    announced with a short TTL then silently stop answering. Withdrawn and
+    expired devices are not searched.
+
+    A device is discovered once auto_connect found it and connected to the
+    simulated device. CPU time is the process time, which includes the
+    responder.
+    """
+
+    def __init__(self, count, churn=0, expired=0,
+                 interfaces=DEFAULT_INTERFACES,
+                 timeout=DEFAULT_SEARCH_TIMEOUT,
+                 expired_ttl=DEFAULT_EXPIRED_TTL, workers=DEFAULT_WORKERS):
+        # pylint: disable=too-many-arguments
+        """Create a new benchmark.
+
+        :param count: Number of devices advertised at start
+        :param churn: Number of devices replaced while searching
+        :param expired: Number of devices disappearing without goodbye
+        :param interfaces: Interface addresses
+        :param timeout: Search timeout of each device in seconds
+        :param expired_ttl: Records TTL of expired devices in seconds
+        :param workers: Max devices searched at once
+        """
+        self._count = count
+        self._churn = churn
+        self._expired = expired
+        self._interfaces = interfaces
+        self._timeout = timeout
+        self._expired_ttl = expired_ttl
+        self._workers = workers
+
+    def run(self):
+        """Run the benchmark.
+
+        :return: DiscoveryBenchmarkResult
+        """
+        simulated = [SimulatedPureCoolLink("SIM-{0:05d}".format(index))
+                     for index in range(self._expired + self._count +
+                                        self._churn)]
+        expired = simulated[:self._expired]
+        withdrawn = simulated[self._expired:self._expired + self._churn]
+        advertised = simulated[self._expired:self._expired + self._count]
+        added = simulated[self._expired + self._count:]
+        searched = simulated[self._expired + self._churn:]
+        result = DiscoveryBenchmarkResult(len(searched))
+
+        zeroconfs = []
+        lock = Lock()
+
+        def zeroconf_factory():
+            """Create a counting Zeroconf instance for a search."""
+            zeroconf = CountingZeroconf(self._interfaces)
+            with lock:
+                zeroconfs.append(zeroconf)
+            return zeroconf
+
+        broker = SimulatedBroker()
+        factory = DeviceFactory()
+        devices = []
+        for device in searched:
+            broker.add_device(device)
+            dyson_device = factory.create(device.json_body())
+            dyson_device.client_factory = broker.client
+            dyson_device.zeroconf_factory = zeroconf_factory
+            devices.append(dyson_device)
+
+        responder = SimulatedResponder(self._interfaces)
+        try:
+            responder.advertise(advertised)
+            started = time.monotonic()
+            cpu_started = time.process_time()
+            packets = (responder.zeroconf.packets_sent,
+                       responder.zeroconf.bytes_sent,
+                       responder.zeroconf.packets_dropped)
+            with ThreadPoolExecutor(max_workers=self._workers) as executor:
+                searches = [executor.submit(device.auto_connect,
+                                            self._timeout, 1)
+                            for device in devices]
+                responder.advertise(expired, self._expired_ttl)
+                responder.expire(expired)
+                responder.withdraw(withdrawn)
+                responder.advertise(added)
+                result.discovered = sum(1 for search in searches
+                                        if search.result())
+            result.elapsed = time.monotonic() - started
+            result.cpu_time = time.process_time() - cpu_started
+            result.packets_sent = sum(
+                zeroconf.packets_sent for zeroconf in zeroconfs) + \
+                responder.zeroconf.packets_sent - packets[0]
+            result.bytes_sent = sum(
+                zeroconf.bytes_sent for zeroconf in zeroconfs) + \
+                responder.zeroconf.bytes_sent - packets[1]
+            result.packets_dropped = sum(
+                zeroconf.packets_dropped for zeroconf in zeroconfs) + \
+                responder.zeroconf.packets_dropped - packets[2]
+        finally:
+            for device in devices:
+                if device.connected:
+                    device.disconnect()
+            responder.close()
+        return result
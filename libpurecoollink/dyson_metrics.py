@@ -0,0 +1,300 @@
+"""Library metrics with Prometheus text exposition.
+
+Metrics are disabled by default: instrumented code only checks that the
+module METRICS attribute is None. Enable them with enable_metrics() and
+expose MetricsRegistry.render() to your scraper.
+"""
+
+from bisect import bisect_left
+from threading import Lock
+
+# Seconds, from 10 microseconds to 10 seconds
+DEFAULT_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01,
+                   0.05, 0.1, 0.5, 1, 5, 10)
+
+# Library metrics, None when disabled
+METRICS = None
+
+
+def _format_value(value):
+    """Return a sample value in the exposition format."""
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _format_labels(names, values):
+    """Return labels in the exposition format."""
+    if not names:
+        return ""
+    return "{" + ",".join('{0}="{1}"'.format(
+        name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace(
+            "\n", "\\n")) for name, value in zip(names, values)) + "}"
+
+
+class Metric:
+    """Abstract metric, with samples by label values."""
+
+    TYPE = None
+
+    def __init__(self, name, documentation, labels=()):
+        """Create a new metric.
+
+        :param name: Metric name
+        :param documentation: Help text
+        :param labels: Label names
+        """
+        self._name = name
+        self._documentation = documentation
+        self._labels = tuple(labels)
+        self._values = {}
+        self._lock = Lock()
+
+    @property
+    def name(self):
+        """Metric name."""
+        return self._name
+
+    @property
+    def labels(self):
+        """Label names."""
+        return self._labels
+
+    def value(self, labels=()):
+        """Return the value of a sample, None if not observed.
+
+        :param labels: Label values
+        """
+        return self._values.get(tuple(labels))
+
+    def samples(self):
+        """Return samples as (name, label names, label values, value)."""
+        with self._lock:
+            return [(self._name, self._labels, labels, value)
+                    for labels, value in sorted(self._values.items())]
+
+    def render(self):
+        """Return the metric in the text exposition format."""
+        lines = ["# HELP {0} {1}".format(self._name, self._documentation),
+                 "# TYPE {0} {1}".format(self._name, self.TYPE)]
+        lines += ["{0}{1} {2}".format(name, _format_labels(names, values),
+                                      _format_value(value))
+                  for name, names, values, value in self.samples()]
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """Monotonic counter."""
+
+    TYPE = "counter"
+
+    def inc(self, labels=(), amount=1):
+        """Increment the counter.
+
+        :param labels: Label values (tuple)
+        :param amount: Increment
+        """
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    """Value which can go up and down."""
+
+    TYPE = "gauge"
+
+    def set(self, value, labels=()):
+        """Set the gauge value.
+
+        :param value: New value
+        :param labels: Label values (tuple)
+        """
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(Metric):
+    """Distribution of observed values in cumulative buckets."""
+
+    TYPE = "histogram"
+
+    def __init__(self, name, documentation, labels=(),
+                 buckets=DEFAULT_BUCKETS):
+        """Create a new histogram.
+
+        :param name: Metric name
+        :param documentation: Help text
+        :param labels: Label names
+        :param buckets: Sorted bucket upper bounds
+        """
+        super().__init__(name, documentation, labels)
+        self._buckets = tuple(buckets)
+
+    def observe(self, value, labels=()):
+        """Observe a value.
+
+        :param value: Observed value
+        :param labels: Label values (tuple)
+        """
+        index = bisect_left(self._buckets, value)
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                # Bucket counts, then sum
+                counts = self._values[labels] = \
+                    [0] * (len(self._buckets) + 1) + [0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def value(self, labels=()):
+        """Return (count, sum) of a sample, None if not observed.
+
+        :param labels: Label values
+        """
+        counts = self._values.get(tuple(labels))
+        if counts is None:
+            return None
+        return sum(counts[:-1]), counts[-1]
+
+    def samples(self):
+        """Return samples as (name, label names, label values, value)."""
+        samples = []
+        names = self._labels + ("le",)
+        with self._lock:
+            values = sorted((labels, list(counts))
+                            for labels, counts in self._values.items())
+        for labels, counts in values:
+            cumulative = 0
+            for bound, count in zip(self._buckets + (float("inf"),),
+                                    counts):
+                cumulative += count
+                samples.append((self._name + "_bucket", names,
+                                labels + (_format_value(bound),),
+                                cumulative))
+            samples.append((self._name + "_sum", self._labels, labels,
+                            counts[-1]))
+            samples.append((self._name + "_count", self._labels, labels,
+                            cumulative))
+        return samples
+
+
+class MetricsRegistry:
+    """Collection of metrics."""
+
+    def __init__(self):
+        """Create a new registry."""
+        self._metrics = {}
+        self._lock = Lock()
+
+    def _get_or_create(self, metric_class, name, *args):
+        """Return a registered metric, register it if needed."""
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = metric_class(name, *args)
+            elif not isinstance(metric, metric_class):
+                raise ValueError("Metric {0} is a {1}".format(
+                    name, metric.TYPE))
+            return metric
+
+    def counter(self, name, documentation, labels=()):
+        """Return a counter, create it if needed."""
+        return self._get_or_create(Counter, name, documentation, labels)
+
+    def gauge(self, name, documentation, labels=()):
+        """Return a gauge, create it if needed."""
+        return self._get_or_create(Gauge, name, documentation, labels)
+
+    def histogram(self, name, documentation, labels=(),
+                  buckets=DEFAULT_BUCKETS):
+        """Return a histogram, create it if needed."""
+        return self._get_or_create(Histogram, name, documentation, labels,
+                                   buckets)
+
+    def get(self, name):
+        """Return a metric by name, None if not registered."""
+        return self._metrics.get(name)
+
+    @property
+    def metrics(self):
+        """Return registered metrics."""
+        return list(self._metrics.values())
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format."""
+        return "".join(metric.render() + "\n" for metric in self.metrics)
+
+
+class LibraryMetrics:
+    """Metrics fed by the library."""
+
+    def __init__(self, registry):
+        """Register library metrics.
+
+        :param registry: MetricsRegistry
+        """
+        self.registry = registry
+        self.messages = registry.counter(
+            "dyson_messages_total", "Messages received from devices.",
+            ("product_type", "type"))
+        self.parse_seconds = registry.histogram(
+            "dyson_message_parse_seconds",
+            "Time spent decoding and parsing a message.", ("product_type",))
+        self.callback_seconds = registry.histogram(
+            "dyson_message_callback_seconds",
+            "Time spent in message listeners.", ("product_type",))
+        self.commands = registry.counter(
+            "dyson_commands_total", "Commands sent to devices.",
+            ("product_type", "command"))
+        self.connections = registry.counter(
+            "dyson_connections_total", "MQTT connection acknowledgements.",
+            ("product_type", "result"))
+        self.connect_phase_seconds = registry.histogram(
+            "dyson_connect_phase_seconds", "Time spent in connection phases.",
+            ("phase",))
+        self.connect_failures = registry.counter(
+            "dyson_connect_failures_total", "Connection failures by phase.",
+            ("phase",))
+        self.reconnects = registry.counter(
+            "dyson_reconnects_total", "Automatic reconnection attempts.",
+            ("product_type",))
+        self.discovery_seconds = registry.histogram(
+            "dyson_discovery_seconds", "Time spent searching devices (mDNS).",
+            ("result",))
+        self.mdns_packets_sent = registry.counter(
+            "dyson_mdns_packets_sent_total", "mDNS packets sent.")
+        self.mdns_bytes_sent = registry.counter(
+            "dyson_mdns_sent_bytes_total", "mDNS bytes sent.")
+        self.mdns_responses = registry.counter(
+            "dyson_mdns_responses_total", "mDNS responses handled.")
+        self.mdns_cache_size = registry.gauge(
+            "dyson_mdns_cache_records", "Records in the mDNS cache.")
+
+    def connect_result(self, result):
+        """Record the phases of a connection.
+
+        :param result: DysonConnectResult
+        """
+        for phase, seconds in result.timings.items():
+            self.connect_phase_seconds.observe(seconds, (phase,))
+        if not result.connected:
+            self.connect_failures.inc((result.failed_phase,))
+
+
+def enable_metrics(registry=None):
+    """Enable library metrics.
+
+    :param registry: MetricsRegistry (optional, a new one by default)
+    :return: MetricsRegistry
+    """
+    global METRICS  # pylint: disable=global-statement
+    METRICS = LibraryMetrics(registry or MetricsRegistry())
+    return METRICS.registry
+
+
+def disable_metrics():
+    """Disable library metrics."""
+    global METRICS  # pylint: disable=global-statement
+    METRICS = None
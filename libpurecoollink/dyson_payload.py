@@ -0,0 +1,66 @@
+"""Dyson devices command payloads serialization.
+
+Payloads are built from pre-encoded byte templates (one per message
+type): only the timestamp, cached per second, and the data fields are
+encoded for each message.
+"""
+
+import json
+import time
+
+from .utils import TIMESTAMP_FORMAT
+
+REQUEST_CURRENT_STATE = "REQUEST-CURRENT-STATE"
+REQUEST_ENVIRONMENTAL_STATE = \
+    "REQUEST-PRODUCT-ENVIRONMENT-CURRENT-SENSOR-DATA"
+STATE_SET = "STATE-SET"
+MODE_REASON_APP = "LAPP"
+
+_TEMPLATES = {}
+# (epoch second, encoded timestamp), replaced atomically
+_TIMESTAMP = (None, b"")
+
+
+def encoded_timestamp():
+    """Return current UTC timestamp as bytes, computed once per second."""
+    global _TIMESTAMP  # pylint: disable=global-statement
+    now = int(time.time())
+    second, timestamp = _TIMESTAMP
+    if second != now:
+        timestamp = time.strftime(TIMESTAMP_FORMAT,
+                                  time.gmtime(now)).encode("ascii")
+        _TIMESTAMP = (now, timestamp)
+    return timestamp
+
+
+def _template(msg, mode_reason):
+    """Return (prefix, suffix) around the timestamp of a message type."""
+    key = (msg, mode_reason)
+    template = _TEMPLATES.get(key)
+    if template is None:
+        suffix = b'"'
+        if mode_reason is not None:
+            suffix += b', "mode-reason": ' + json.dumps(mode_reason).encode(
+                "utf-8")
+        template = (b'{"msg": ' + json.dumps(msg).encode("utf-8") +
+                    b', "time": "', suffix)
+        _TEMPLATES[key] = template
+    return template
+
+
+def serialize_command(msg, fields=None, mode_reason=None):
+    """Return a serialized command payload.
+
+    Same content as json.dumps of {"msg": msg, "time": <now>,
+    "mode-reason": mode_reason, **fields}.
+
+    :param msg: Message type
+    :param fields: Other top level fields (dictionary), optional
+    :param mode_reason: Mode reason, optional
+    :return: UTF-8 encoded JSON
+    """
+    prefix, suffix = _template(msg, mode_reason)
+    if not fields:
+        return b"".join((prefix, encoded_timestamp(), suffix, b"}"))
+    return b"".join((prefix, encoded_timestamp(), suffix, b", ",
+                     json.dumps(fields)[1:].encode("utf-8")))
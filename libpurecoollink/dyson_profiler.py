@@ -0,0 +1,190 @@
+"""Sampling profiler of the library threads.
+
+The profiler periodically samples the stacks of the MQTT network threads
+(paho), the environmental sensor and reconnection threads, and the mDNS
+threads (Engine, Reaper, ServiceBrowser). Other threads are not sampled.
+
+Stacks are dumped in the collapsed format (one "frame;frame;frame count"
+line per stack), which can be rendered by flame graph tools.
+"""
+
+import logging
+import sys
+import threading
+import time
+from queue import Queue, Empty
+
+import paho.mqtt.client as mqtt
+
+from .dyson_pure_cool_link import EnvironmentalSensorThread
+from .dyson_reconnect import ReconnectThread
+from .zeroconf import Engine, Reaper, ServiceBrowser
+
+_LOGGER = logging.getLogger(__name__)
+
+# 100 samples per second
+DEFAULT_SAMPLE_INTERVAL = 0.01
+DEFAULT_DUMP_INTERVAL = 60
+DEFAULT_MAX_DEPTH = 64
+
+LIBRARY_MODULES = ("libpurecoollink", "paho")
+
+_LIBRARY_THREAD_CLASSES = (EnvironmentalSensorThread, ReconnectThread,
+                           Engine, Reaper, ServiceBrowser)
+
+
+def thread_kind(thread):
+    """Return the kind of a library thread, None if not a library thread.
+
+    :param thread: Thread
+    """
+    if isinstance(thread, _LIBRARY_THREAD_CLASSES):
+        return type(thread).__name__
+    # Network loop of a paho Client (loop_start), threads are not named
+    # before paho 2.0
+    target = getattr(thread, "_target", None)
+    if isinstance(getattr(target, "__self__", None), mqtt.Client):
+        return "paho"
+    return None
+
+
+class SamplingProfiler(threading.Thread):
+    """Statistical profiler of the library threads."""
+
+    def __init__(self, interval=DEFAULT_SAMPLE_INTERVAL, dump_path=None,
+                 dump_interval=DEFAULT_DUMP_INTERVAL,
+                 max_depth=DEFAULT_MAX_DEPTH):
+        """Create a new profiler, call start() to start sampling.
+
+        :param interval: Seconds between samples
+        :param dump_path: File where collapsed stacks are dumped
+                          periodically and when stopped (optional)
+        :param dump_interval: Seconds between dumps
+        :param max_depth: Max frames of a stack, from the innermost frame
+        """
+        threading.Thread.__init__(self, name="dyson-profiler")
+        self.daemon = True
+        self._interval = interval
+        self._dump_path = dump_path
+        self._dump_interval = dump_interval
+        self._max_depth = max_depth
+        self._stop_queue = Queue()
+        self._lock = threading.Lock()
+        self._stacks = {}
+        self._samples = 0
+        # Thread kinds by ident
+        self._threads = {}
+        # Frame labels by code object
+        self._labels = {}
+
+    def stop(self):
+        """Stop sampling."""
+        self._stop_queue.put_nowait(True)
+
+    def run(self):
+        """Sample stacks until stopped."""
+        dumped = time.monotonic()
+        stopped = False
+        while not stopped:
+            try:
+                stopped = self._stop_queue.get(timeout=self._interval)
+            except Empty:
+                self.sample()
+                if self._dump_path is not None and \
+                        time.monotonic() - dumped >= self._dump_interval:
+                    dumped = time.monotonic()
+                    self.dump()
+        if self._dump_path is not None:
+            self.dump()
+
+    def _thread_kinds(self, idents):
+        """Return kinds of library threads, by ident."""
+        if idents != self._threads.keys():
+            threads = {thread.ident: thread
+                       for thread in threading.enumerate()}
+            self._threads = {ident: thread_kind(threads[ident])
+                             if ident in threads else None
+                             for ident in idents}
+        return self._threads
+
+    def _label(self, frame):
+        """Return the label of a frame: module.function."""
+        code = frame.f_code
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = "{0}.{1}".format(
+                frame.f_globals.get("__name__", code.co_filename),
+                code.co_name)
+        return label
+
+    def sample(self):
+        """Sample stacks of library threads once."""
+        # pylint: disable=protected-access
+        frames = sys._current_frames()
+        kinds = self._thread_kinds(frames.keys())
+        stacks = []
+        for ident, frame in frames.items():
+            kind = kinds.get(ident)
+            if kind is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self._max_depth:
+                stack.append(self._label(frame))
+                frame = frame.f_back
+            stack.append(kind)
+            stack.reverse()
+            stacks.append(tuple(stack))
+        with self._lock:
+            self._samples += 1
+            for stack in stacks:
+                self._stacks[stack] = self._stacks.get(stack, 0) + 1
+
+    @property
+    def samples(self):
+        """Return the number of samples."""
+        return self._samples
+
+    @property
+    def stacks(self):
+        """Return counts of sampled stacks, thread kind first."""
+        with self._lock:
+            return dict(self._stacks)
+
+    def reset(self):
+        """Forget sampled stacks."""
+        with self._lock:
+            self._stacks = {}
+            self._samples = 0
+
+    def functions(self):
+        """Return library functions sorted by samples, most sampled first.
+
+        :return: list of (function, self samples, total samples), self
+                 samples are samples where the function is the innermost
+                 frame, total samples where it is in the stack
+        """
+        own = {}
+        total = {}
+        for stack, count in self.stacks.items():
+            for label in set(stack[1:]):
+                total[label] = total.get(label, 0) + count
+            own[stack[-1]] = own.get(stack[-1], 0) + count
+        return sorted(((label, own.get(label, 0), count)
+                       for label, count in total.items()
+                       if label.startswith(LIBRARY_MODULES)),
+                      key=lambda function: (-function[2], function[0]))
+
+    def collapsed(self):
+        """Return sampled stacks in the collapsed format."""
+        return "".join("{0} {1}\n".format(";".join(stack), count)
+                       for stack, count in sorted(self.stacks.items()))
+
+    def dump(self, path=None):
+        """Write sampled stacks in the collapsed format.
+
+        :param path: File (dump_path by default)
+        """
+        path = path or self._dump_path
+        with open(path, "w", encoding="utf-8") as dump_file:
+            dump_file.write(self.collapsed())
+        _LOGGER.debug("%s samples dumped to %s", self._samples, path)
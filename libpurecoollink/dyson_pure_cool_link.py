@@ -2,21 +2,31 @@
 
 # pylint: disable=too-many-locals
 
-import json
 import logging
 import time
 import socket
 from threading import Thread
 from queue import Queue, Empty
 
-
-import paho.mqtt.client as mqtt
-
-from .dyson_device import DysonDevice, NetworkDevice, DEFAULT_PORT
+from .dyson_command import DysonCommandCoalescer, DysonCommandTracker, \
+    DEFAULT_COALESCING_WINDOW, DEFAULT_ACK_TIMEOUT, NO_CHANGE
+from .dyson_device import DysonDevice, NetworkDevice, DysonConnectResult, \
+    DEFAULT_PORT, DEFAULT_CONNECT_DEADLINE
+from .dyson_payload import serialize_command, REQUEST_ENVIRONMENTAL_STATE, \
+    STATE_SET, MODE_REASON_APP
 from .utils import printable_fields, support_heating
+from .dyson_reconnect import ReconnectThread, DEFAULT_MIN_DELAY, \
+    DEFAULT_MAX_DELAY, DEFAULT_REDISCOVER_AFTER
+from .exceptions import DysonCommandNotTrackableException
 from .dyson_pure_state import DysonPureHotCoolState, DysonPureCoolState, \
     DysonEnvironmentalSensorState
+from .dyson_pure_history import DysonEnvironmentalSensorHistory, \
+    DysonEnvironmentalSensorRollup, DEFAULT_RETENTION, DEFAULT_INTERVAL, \
+    DEFAULT_ROLLUP_TIERS
+from .dyson_deadband import DysonDeadbandFilter, DEFAULT_HEARTBEAT
 from .zeroconf import ServiceBrowser, Zeroconf
+from .const import DYSON_MQTT_SERVICE_TYPE
+from . import dyson_metrics, dyson_tracing
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -24,6 +34,18 @@ _LOGGER = logging.getLogger(__name__)
 class DysonPureCoolLink(DysonDevice):
     """Dyson device (fan)."""
 
+    # set_configuration arguments and their STATE-SET field
+    COMMAND_FIELDS = {
+        "fan_mode": "fmod",
+        "fan_speed": "fnsp",
+        "oscillation": "oson",
+        "sleep_timer": "sltm",
+        "standby_monitoring": "rhtm",
+        "reset_filter": "rstf",
+        "quality_target": "qtar",
+        "night_mode": "nmod"
+    }
+
     class DysonDeviceListener(object):
         """Message listener."""
 
@@ -67,7 +89,32 @@ class DysonPureCoolLink(DysonDevice):
 
         self._sensor_data_available = Queue()
         self._environmental_state = None
+        self._environmental_history = None
+        self._environmental_rollup = None
+        self._deadband_filter = None
+        self._command_coalescer = None
+        self._command_tracker = DysonCommandTracker(self._serial)
         self._request_thread = None
+        self._reconnect_settings = None
+        self._reconnect_timeout = DEFAULT_CONNECT_DEADLINE
+        self._reconnect_thread = None
+        self._reconnects = 0
+        self._zeroconf_factory = Zeroconf
+
+    @property
+    def zeroconf_factory(self):
+        """Return the mDNS factory used by auto_connect (Zeroconf)."""
+        return self._zeroconf_factory
+
+    @zeroconf_factory.setter
+    def zeroconf_factory(self, value):
+        """Set the mDNS factory used by auto_connect.
+
+        The factory is called without arguments and must return a Zeroconf
+        instance, for instance bound to given interfaces (see
+        dyson_mdns_simulator).
+        """
+        self._zeroconf_factory = value
 
     @property
     def status_topic(self):
@@ -79,27 +126,64 @@ class DysonPureCoolLink(DysonDevice):
     def on_message(client, userdata, msg):
         # pylint: disable=unused-argument
         """Set function Callback when message received."""
+        metrics = dyson_metrics.METRICS
+        if metrics is not None:
+            started = time.perf_counter()
+        tracer = dyson_tracing.TRACER
+        trace = None if tracer is None else tracer.start_trace(
+            userdata.serial)
+        if trace is not None:
+            trace.stage(dyson_tracing.DECODE)
         payload = msg.payload.decode("utf-8")
+        if trace is not None:
+            trace.stage(dyson_tracing.CLASSIFY)
         if DysonPureCoolState.is_state_message(payload):
             if support_heating(userdata.product_type):
-                device_msg = DysonPureHotCoolState(payload)
+                message_class = DysonPureHotCoolState
             else:
-                device_msg = DysonPureCoolState(payload)
-            if not userdata.device_available:
-                userdata.state_data_available()
-            userdata.state = device_msg
-            for function in userdata.callback_message:
-                function(device_msg)
+                message_class = DysonPureCoolState
         elif DysonEnvironmentalSensorState.is_environmental_state_message(
                 payload):
-            device_msg = DysonEnvironmentalSensorState(payload)
-            if not userdata.device_available:
-                userdata.sensor_data_available()
-            userdata.environmental_state = device_msg
-            for function in userdata.callback_message:
-                function(device_msg)
+            message_class = DysonEnvironmentalSensorState
         else:
+            message_class = None
             _LOGGER.warning("Unknown message: %s", payload)
+        device_msg = None
+        if message_class is not None:
+            if trace is not None:
+                trace.stage(dyson_tracing.CONSTRUCT)
+            device_msg = message_class(payload)
+            if trace is not None:
+                trace.stage(dyson_tracing.PUBLISH)
+            if message_class is DysonEnvironmentalSensorState:
+                if not userdata.device_available:
+                    userdata.sensor_data_available()
+                userdata.environmental_state = device_msg
+            else:
+                if not userdata.device_available:
+                    userdata.state_data_available()
+                userdata.state = device_msg
+        if metrics is not None:
+            parsed = time.perf_counter()
+            metrics.messages.inc((userdata.product_type, "unknown" if
+                                  device_msg is None else
+                                  type(device_msg).__name__))
+            metrics.parse_seconds.observe(parsed - started,
+                                          (userdata.product_type,))
+        deadband_filter = userdata.deadband_filter
+        if device_msg is not None and (deadband_filter is None or
+                                       deadband_filter.accept(device_msg)):
+            if trace is None:
+                for function in userdata.callback_message:
+                    function(device_msg)
+            else:
+                trace.call_listeners(userdata.callback_message, device_msg)
+            if metrics is not None:
+                metrics.callback_seconds.observe(
+                    time.perf_counter() - parsed, (userdata.product_type,))
+        if trace is not None:
+            trace.finish("unknown" if message_class is None else
+                         message_class.__name__)
 
     def auto_connect(self, timeout=5, retry=15):
         """Try to connect to device using mDNS.
@@ -109,24 +193,40 @@ class DysonPureCoolLink(DysonDevice):
         :return: True if connected, else False
         """
         for i in range(retry):
-            zeroconf = Zeroconf()
-            listener = self.DysonDeviceListener(self._serial,
-                                                self._add_network_device)
-            ServiceBrowser(zeroconf, "_dyson_mqtt._tcp.local.", listener)
-            try:
-                self._network_device = self._search_device_queue.get(
-                    timeout=timeout)
-            except Empty:
-                # Unable to find device
-                _LOGGER.warning("Unable to find device %s, try %s",
-                                self._serial, i)
-                zeroconf.close()
-            else:
+            network_device = self._find_network_device(timeout)
+            if network_device is not None:
+                self._network_device = network_device
                 break
+            # Unable to find device
+            _LOGGER.warning("Unable to find device %s, try %s",
+                            self._serial, i)
         if self._network_device is None:
             _LOGGER.error("Unable to connect to device %s", self._serial)
             return False
-        return self._mqtt_connect()
+        return self._mqtt_connect().connected
+
+    def _find_network_device(self, timeout):
+        """Search the device using mDNS.
+
+        :param timeout: Timeout
+        :return: NetworkDevice, None if not found
+        """
+        started = time.monotonic()
+        zeroconf = self._zeroconf_factory()
+        listener = self.DysonDeviceListener(self._serial,
+                                            self._add_network_device)
+        ServiceBrowser(zeroconf, DYSON_MQTT_SERVICE_TYPE, listener)
+        try:
+            network_device = self._search_device_queue.get(timeout=timeout)
+        except Empty:
+            zeroconf.close()
+            network_device = None
+        metrics = dyson_metrics.METRICS
+        if metrics is not None:
+            metrics.discovery_seconds.observe(
+                time.monotonic() - started,
+                ("not_found" if network_device is None else "found",))
+        return network_device
 
     def connect(self, device_ip, device_port=DEFAULT_PORT):
         """Connect to the device using ip address.
@@ -138,19 +238,71 @@ class DysonPureCoolLink(DysonDevice):
         self._network_device = NetworkDevice(self._name, device_ip,
                                              device_port)
 
-        return self._mqtt_connect()
+        return self._mqtt_connect().connected
 
-    def _mqtt_connect(self):
-        """Connect to the MQTT broker."""
-        self._mqtt = mqtt.Client(userdata=self)
+    def connect_with_deadline(self, device_ip, device_port=DEFAULT_PORT,
+                              timeout=DEFAULT_CONNECT_DEADLINE):
+        """Connect to the device using ip address, within a deadline.
+
+        The deadline covers the TCP connection, the MQTT connection
+        acknowledgement and the first state and sensor data. The device is
+        disconnected if the deadline is reached.
+
+        :param device_ip: Device IP address
+        :param device_port: Device Port (default: 1883)
+        :param timeout: Deadline in seconds
+        :return: DysonConnectResult
+        """
+        self._network_device = NetworkDevice(self._name, device_ip,
+                                             device_port)
+
+        return self._mqtt_connect(timeout)
+
+    def _mqtt_connect(self, timeout=None):
+        """Connect to the MQTT broker.
+
+        Without deadline, wait 10 seconds for the connection and forever
+        for the first data. With a deadline, notifications left over from
+        a previous connection are discarded first.
+
+        :param timeout: Deadline in seconds (optional)
+        :return: DysonConnectResult
+        """
+        result = DysonConnectResult(self._serial, timeout)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if deadline is not None:
+            self._clear_connection_queues()
+
+        def remaining(default=None):
+            """Return time left before the deadline."""
+            if deadline is None:
+                return default
+            return max(deadline - time.monotonic(), 0)
+
+        self._mqtt = self._create_client()
         self._mqtt.on_message = self.on_message
         self._mqtt.on_connect = self.on_connect
+        self._mqtt.on_disconnect = self.on_disconnect
         self._mqtt.username_pw_set(self._serial, self._credentials)
-        self._mqtt.connect(self._network_device.address,
-                           self._network_device.port)
-        self._mqtt.loop_start()
-        self._connected = self._connection_queue.get(timeout=10)
-        if self._connected:
+        started = time.monotonic()
+        phase = "tcp"
+        try:
+            if deadline is not None:
+                self._mqtt.connect_timeout = max(remaining(), 0.001)
+            self._mqtt.connect(self._network_device.address,
+                               self._network_device.port)
+            self._mqtt.loop_start()
+            started = self._end_phase(result, phase, started)
+            phase = "connack"
+            self._connected = self._connection_queue.get(
+                timeout=remaining(10))
+            if not self._connected:
+                self._mqtt.loop_stop()
+                result.add_timing(phase, time.monotonic() - started)
+                result.fail(phase, "Connection refused")
+                self._record_connect(result)
+                return result
+            started = self._end_phase(result, phase, started)
             self.request_current_state()
             # Start Environmental thread
             self._request_thread = EnvironmentalSensorThread(
@@ -158,12 +310,57 @@ class DysonPureCoolLink(DysonDevice):
             self._request_thread.start()
 
             # Wait for first data
-            self._state_data_available.get()
-            self._sensor_data_available.get()
+            phase = "state"
+            self._state_data_available.get(timeout=remaining())
+            started = self._end_phase(result, phase, started)
+            phase = "sensor"
+            self._sensor_data_available.get(timeout=remaining())
+            self._end_phase(result, phase, started)
             self._device_available = True
-        else:
-            self._mqtt.loop_stop()
-        return self._connected
+        except (Empty, OSError) as error:
+            if deadline is None:
+                raise
+            reason = str(error) or "timeout"
+            _LOGGER.warning("Unable to connect to device %s (%s phase): %s",
+                            self._serial, phase, reason)
+            result.add_timing(phase, time.monotonic() - started)
+            result.fail(phase, reason)
+            self._abort_connection()
+        self._record_connect(result)
+        return result
+
+    @staticmethod
+    def _record_connect(result):
+        """Feed connection metrics."""
+        metrics = dyson_metrics.METRICS
+        if metrics is not None:
+            metrics.connect_result(result)
+
+    @staticmethod
+    def _end_phase(result, phase, started):
+        """Record time spent in a phase, return its end time."""
+        now = time.monotonic()
+        result.add_timing(phase, now - started)
+        return now
+
+    def _abort_connection(self):
+        """Stop a connection which did not complete."""
+        if self._request_thread is not None:
+            self._request_thread.stop()
+        self._mqtt.loop_stop()
+        self._mqtt.disconnect()
+        self._connected = False
+        self._clear_connection_queues()
+
+    def _clear_connection_queues(self):
+        """Discard pending connection and first data notifications."""
+        for queue in (self._connection_queue, self._state_data_available,
+                      self._sensor_data_available):
+            try:
+                while True:
+                    queue.get_nowait()
+            except Empty:
+                pass
 
     def sensor_data_available(self):
         """Call when first sensor data are available. Internal method."""
@@ -172,19 +369,88 @@ class DysonPureCoolLink(DysonDevice):
 
     def disconnect(self):
         """Disconnect from the device."""
+        self.disable_auto_reconnect()
         self._request_thread.stop()
         self._connected = False
 
+    def enable_auto_reconnect(self, min_delay=DEFAULT_MIN_DELAY,
+                              max_delay=DEFAULT_MAX_DELAY, rate_limiter=None,
+                              rediscover_after=DEFAULT_REDISCOVER_AFTER,
+                              timeout=DEFAULT_CONNECT_DEADLINE):
+        # pylint: disable=too-many-arguments
+        """Reconnect automatically when the connection is lost.
+
+        Attempts are spaced by an exponential backoff with jitter. Each
+        attempt resubscribes to the status topic and requests the current
+        state and environmental data again.
+
+        :param min_delay: Max delay of the first attempt in seconds
+        :param max_delay: Max delay between attempts in seconds
+        :param rate_limiter: ReconnectRateLimiter shared by devices
+                             (optional)
+        :param rediscover_after: Search the device address using mDNS
+                                 after this number of failed attempts,
+                                 0 to disable
+        :param timeout: Deadline of each attempt in seconds
+        """
+        self._reconnect_settings = {
+            "min_delay": min_delay, "max_delay": max_delay,
+            "rate_limiter": rate_limiter,
+            "rediscover_after": rediscover_after}
+        self._reconnect_timeout = timeout
+
+    def disable_auto_reconnect(self):
+        """Stop reconnecting automatically."""
+        self._reconnect_settings = None
+        if self._reconnect_thread is not None:
+            self._reconnect_thread.stop()
+            self._reconnect_thread = None
+
+    def connection_lost(self):
+        """Call when the connection is lost. Internal method."""
+        super().connection_lost()
+        if self._request_thread is not None:
+            self._request_thread.stop()
+        if self._reconnect_settings is None:
+            return
+        if self._reconnect_thread is not None and \
+                self._reconnect_thread.is_alive():
+            return
+        self._reconnect_thread = ReconnectThread(
+            self, **self._reconnect_settings)
+        self._reconnect_thread.start()
+
+    def reconnect(self):
+        """Connect again to the last known address. Internal method.
+
+        :return: DysonConnectResult
+        """
+        self._reconnects += 1
+        metrics = dyson_metrics.METRICS
+        if metrics is not None:
+            metrics.reconnects.inc((self._product_type,))
+        self._mqtt.loop_stop()
+        return self._mqtt_connect(self._reconnect_timeout)
+
+    def rediscover(self):
+        """Search the device address using mDNS. Internal method."""
+        network_device = self._find_network_device(self._reconnect_timeout)
+        if network_device is not None:
+            _LOGGER.info("Device %s found at %s", self._serial,
+                         network_device.address)
+            self._network_device = network_device
+
+    @property
+    def reconnects(self):
+        """Return number of reconnection attempts."""
+        return self._reconnects
+
     def request_environmental_state(self):
         """Request new state message."""
         if self._connected:
-            payload = {
-                "msg": "REQUEST-PRODUCT-ENVIRONMENT-CURRENT-SENSOR-DATA",
-                "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
-            }
-            self._mqtt.publish(
-                self._product_type + "/" + self._serial + "/command",
-                json.dumps(payload))
+            self._count_command(REQUEST_ENVIRONMENTAL_STATE)
+            self._mqtt.publish(self._command_topic, serialize_command(
+                REQUEST_ENVIRONMENTAL_STATE))
         else:
             _LOGGER.warning(
                 "Unable to send commands because device %s is not connected",
@@ -197,13 +463,9 @@ class DysonPureCoolLink(DysonDevice):
         :param data: Data to send
         """
         if self._connected:
-            payload = {
-                "msg": "STATE-SET",
-                "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
-                "mode-reason": "LAPP",
-                "data": data
-            }
-            self._mqtt.publish(self.command_topic, json.dumps(payload), 1)
+            self._count_command(STATE_SET)
+            self._mqtt.publish(self._command_topic, serialize_command(
+                STATE_SET, {"data": data}, MODE_REASON_APP), 1)
         else:
             _LOGGER.warning("Not connected, can not set configuration: %s",
                             self.serial)
@@ -252,13 +514,95 @@ class DysonPureCoolLink(DysonDevice):
             "nmod": f_night_mode
         }
 
+    def _current_fields(self):
+        """Return current state values by STATE-SET field."""
+        if self._current_state is None:
+            return {}
+        return {
+            "fmod": self._current_state.fan_mode,
+            "fnsp": self._current_state.speed,
+            "oson": self._current_state.oscillation,
+            "rhtm": self._current_state.standby_monitoring,
+            "qtar": self._current_state.quality_target,
+            "nmod": self._current_state.night_mode
+        }
+
     def set_configuration(self, **kwargs):
         """Configure fan.
 
+        If command coalescing is enabled, only the given parameters are
+        merged with pending changes and sent at the end of the window.
+
         :param kwargs: Parameters
         """
         data = self._parse_command_args(**kwargs)
-        self.set_fan_configuration(data)
+        if self._command_coalescer is None:
+            self.set_fan_configuration(data)
+        else:
+            self._command_coalescer.submit(
+                self._requested_fields(data, **kwargs))
+
+    def _requested_fields(self, data, **kwargs):
+        """Return STATE-SET fields of the given parameters only."""
+        return {field: data[field]
+                for argument, field in self.COMMAND_FIELDS.items()
+                if kwargs.get(argument) is not None}
+
+    def set_configuration_with_ack(self, timeout=DEFAULT_ACK_TIMEOUT,
+                                   **kwargs):
+        """Configure fan and track when the device applies it.
+
+        :param timeout: Timeout in seconds
+        :param kwargs: Parameters (see set_configuration)
+        :return: concurrent.futures.Future resolved with the latency in
+                 seconds when a state message reflects the requested
+                 values, or failed with DysonCommandTimeoutException
+        :raise DysonCommandNotTrackableException: Requested fields are not
+               reported by the device state (sleep timer, reset filter)
+        """
+        current = self._current_fields()
+        expected = {field: value for field, value in
+                    self._requested_fields(
+                        self._parse_command_args(**kwargs), **kwargs).items()
+                    if value != NO_CHANGE}
+        untracked = sorted(set(expected) - set(current))
+        if untracked:
+            raise DysonCommandNotTrackableException(self._serial, untracked)
+        future = self._command_tracker.track(expected, current, timeout)
+        self.set_configuration(**kwargs)
+        return future
+
+    @property
+    def command_tracker(self):
+        """Return acknowledged commands tracker (latency histogram)."""
+        return self._command_tracker
+
+    @DysonDevice.state.setter
+    def state(self, value):
+        """Set current state."""
+        self._current_state = value
+        fields = self._current_fields()
+        self._command_tracker.on_state(fields)
+        if self._command_coalescer is not None:
+            self._command_coalescer.on_state(fields)
+
+    def enable_command_coalescing(self, window=DEFAULT_COALESCING_WINDOW):
+        """Merge configuration changes sent within a time window.
+
+        Changes are sent in one STATE-SET message, without the fields
+        already equal to the current state.
+
+        :param window: Time window in seconds
+        """
+        self.disable_command_coalescing()
+        self._command_coalescer = DysonCommandCoalescer(
+            self.set_fan_configuration, self._current_fields, window)
+
+    def disable_command_coalescing(self):
+        """Send pending changes and stop merging configuration changes."""
+        if self._command_coalescer is not None:
+            self._command_coalescer.close()
+        self._command_coalescer = None
 
     @property
     def environmental_state(self):
@@ -269,6 +613,74 @@ class DysonPureCoolLink(DysonDevice):
     def environmental_state(self, value):
         """Set Environmental Device state."""
         self._environmental_state = value
+        if self._environmental_history is not None:
+            self._environmental_history.add(value)
+        if self._environmental_rollup is not None:
+            self._environmental_rollup.add(value)
+
+    def enable_environmental_history(self, retention=DEFAULT_RETENTION,
+                                     interval=DEFAULT_INTERVAL):
+        """Keep history of environmental states.
+
+        :param retention: Retention in seconds
+        :param interval: Expected interval between samples in seconds
+        :return: DysonEnvironmentalSensorHistory
+        """
+        self._environmental_history = DysonEnvironmentalSensorHistory(
+            retention, interval)
+        return self._environmental_history
+
+    def disable_environmental_history(self):
+        """Stop keeping history of environmental states."""
+        self._environmental_history = None
+
+    @property
+    def environmental_history(self):
+        """Environmental states history, None if not enabled."""
+        return self._environmental_history
+
+    def enable_environmental_rollup(self, tiers=DEFAULT_ROLLUP_TIERS):
+        """Keep multi-resolution aggregates of environmental states.
+
+        :param tiers: Iterable of (resolution in seconds, number of buckets)
+        :return: DysonEnvironmentalSensorRollup
+        """
+        self._environmental_rollup = DysonEnvironmentalSensorRollup(tiers)
+        return self._environmental_rollup
+
+    def disable_environmental_rollup(self):
+        """Stop keeping aggregates of environmental states."""
+        self._environmental_rollup = None
+
+    @property
+    def environmental_rollup(self):
+        """Environmental states aggregates, None if not enabled."""
+        return self._environmental_rollup
+
+    def enable_deadband_filter(self, deadbands=None,
+                               heartbeat=DEFAULT_HEARTBEAT):
+        """Notify message listeners of meaningful changes only.
+
+        Device state and environmental state are still updated with every
+        message.
+
+        :param deadbands: Deadband by field name (default:
+                          dyson_deadband.DEFAULT_DEADBANDS)
+        :param heartbeat: Seconds after which a state is notified even
+                          without change, None to disable
+        :return: DysonDeadbandFilter
+        """
+        self._deadband_filter = DysonDeadbandFilter(deadbands, heartbeat)
+        return self._deadband_filter
+
+    def disable_deadband_filter(self):
+        """Notify message listeners of every message."""
+        self._deadband_filter = None
+
+    @property
+    def deadband_filter(self):
+        """Listeners deadband filter, None if not enabled."""
+        return self._deadband_filter
 
     @property
     def connected(self):
@@ -0,0 +1,324 @@
+"""Dyson Pure link devices sensor history."""
+
+import math
+import time
+from array import array
+
+from .dyson_pure_state import DysonEnvironmentalSensorState
+from .utils import printable_fields
+
+ENVIRONMENTAL_FIELDS = ("humidity", "volatil_organic_compounds",
+                        "temperature", "dust", "sleep_timer")
+DEFAULT_RETENTION = 24 * 3600
+DEFAULT_INTERVAL = 30
+# (resolution in seconds, number of buckets)
+DEFAULT_ROLLUP_TIERS = ((60, 24 * 60), (15 * 60, 7 * 24 * 4),
+                        (3600, 90 * 24))
+
+
+def percentile(sorted_values, percent):
+    """Return percentile of sorted values (linear interpolation).
+
+    :param sorted_values: Sorted values
+    :param percent: Percentile, between 0 and 100
+    """
+    if not sorted_values:
+        return None
+    rank = (len(sorted_values) - 1) * percent / 100.0
+    lower = int(math.floor(rank))
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (
+        sorted_values[upper] - sorted_values[lower]) * (rank - lower)
+
+
+class DysonEnvironmentalSensorHistory:
+    """Fixed-memory history of environmental sensor states.
+
+    Samples are stored in a ring buffer of typed arrays, one array per
+    field. Oldest samples are overwritten once the buffer is full.
+    """
+
+    def __init__(self, retention=DEFAULT_RETENTION,
+                 interval=DEFAULT_INTERVAL):
+        """Create a new history.
+
+        :param retention: Retention in seconds
+        :param interval: Expected interval between samples in seconds,
+                         used to size the buffer
+        """
+        self._retention = retention
+        self._capacity = int(math.ceil(retention / interval)) + 1
+        self._timestamps = array('d', [0.0]) * self._capacity
+        self._columns = {field: array('d', [0.0]) * self._capacity
+                         for field in ENVIRONMENTAL_FIELDS}
+        self._head = 0
+        self._size = 0
+
+    def on_message(self, message):
+        """Handle a device message."""
+        if isinstance(message, DysonEnvironmentalSensorState):
+            self.add(message)
+
+    def add(self, state, timestamp=None):
+        """Add an environmental sensor state.
+
+        :param state: DysonEnvironmentalSensorState
+        :param timestamp: Epoch seconds (default: now)
+        """
+        position = self._head
+        self._timestamps[position] = time.time() if timestamp is None \
+            else timestamp
+        columns = self._columns
+        columns["humidity"][position] = state.humidity
+        columns["volatil_organic_compounds"][position] = \
+            state.volatil_organic_compounds
+        columns["temperature"][position] = state.temperature
+        columns["dust"][position] = state.dust
+        columns["sleep_timer"][position] = state.sleep_timer
+        self._head = (position + 1) % self._capacity
+        if self._size < self._capacity:
+            self._size += 1
+
+    def _timestamp(self, index):
+        """Return timestamp of a sample, oldest sample is index 0."""
+        return self._timestamps[
+            (self._head - self._size + index) % self._capacity]
+
+    def _index(self, value, after=False):
+        """Return index of the first sample at (or after) a time."""
+        low, high = 0, self._size
+        while low < high:
+            middle = (low + high) // 2
+            timestamp = self._timestamp(middle)
+            if timestamp < value or (after and timestamp == value):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _slice(self, column, seconds, now):
+        """Return values of a column in a time window, oldest first."""
+        if now is None:
+            now = time.time()
+        window = self._retention if seconds is None \
+            else min(seconds, self._retention)
+        first = self._index(now - window)
+        start = (self._head - self._size + first) % self._capacity
+        count = max(self._index(now, True) - first, 0)
+        if start + count <= self._capacity:
+            return column[start:start + count]
+        return column[start:] + column[:start + count - self._capacity]
+
+    def timestamps(self, seconds=None, now=None):
+        """Return sample timestamps of a time window.
+
+        :param seconds: Window length in seconds (default: retention)
+        :param now: End of the window in epoch seconds (default: now)
+        """
+        return self._slice(self._timestamps, seconds, now)
+
+    def values(self, field, seconds=None, now=None):
+        """Return values of a field in a time window, oldest first.
+
+        :param field: Field name (see ENVIRONMENTAL_FIELDS)
+        :param seconds: Window length in seconds (default: retention)
+        :param now: End of the window in epoch seconds (default: now)
+        """
+        return self._slice(self._columns[field], seconds, now)
+
+    def stats(self, field, seconds=None, percentiles=(50, 90, 99),
+              now=None):
+        """Return min/max/mean/count and percentiles of a time window.
+
+        :param field: Field name (see ENVIRONMENTAL_FIELDS)
+        :param seconds: Window length in seconds (default: retention)
+        :param percentiles: Percentiles to compute
+        :param now: End of the window in epoch seconds (default: now)
+        :return: Dictionary, None values if the window is empty
+        """
+        values = self.values(field, seconds, now)
+        result = {"count": len(values)}
+        if values:
+            result["min"] = min(values)
+            result["max"] = max(values)
+            result["mean"] = math.fsum(values) / len(values)
+        else:
+            result["min"] = result["max"] = result["mean"] = None
+        if percentiles:
+            sorted_values = sorted(values)
+            for percent in percentiles:
+                result["p{0}".format(percent)] = percentile(sorted_values,
+                                                            percent)
+        return result
+
+    @property
+    def capacity(self):
+        """Return max number of samples."""
+        return self._capacity
+
+    @property
+    def retention(self):
+        """Return retention in seconds."""
+        return self._retention
+
+    def __len__(self):
+        """Return number of samples."""
+        return self._size
+
+    def __repr__(self):
+        """Return a String representation."""
+        fields = [("retention", str(self.retention)),
+                  ("capacity", str(self.capacity)),
+                  ("size", str(len(self)))]
+        return 'DysonEnvironmentalSensorHistory(' + ",".join(
+            printable_fields(fields)) + ')'
+
+
+class DysonEnvironmentalSensorRollup:
+    """Multi-resolution aggregates of environmental sensor states.
+
+    Each tier keeps a fixed number of buckets of min/max/sum/count per
+    field, updated on insert. Memory does not grow with time: a bucket
+    is reset when its slot is reused by a newer bucket.
+
+    Samples may be added out of order (clock step, replayed capture):
+    each sample is merged into the bucket of its timestamp. Samples older
+    than the retention of a tier are ignored by this tier.
+    """
+
+    def __init__(self, tiers=DEFAULT_ROLLUP_TIERS):
+        """Create a new rollup.
+
+        :param tiers: Iterable of (resolution in seconds, number of
+                      buckets)
+        """
+        self._tiers = [_RollupTier(resolution, capacity)
+                       for resolution, capacity in sorted(tiers)]
+
+    def on_message(self, message):
+        """Handle a device message."""
+        if isinstance(message, DysonEnvironmentalSensorState):
+            self.add(message)
+
+    def add(self, state, timestamp=None):
+        """Add an environmental sensor state.
+
+        :param state: DysonEnvironmentalSensorState
+        :param timestamp: Epoch seconds (default: now)
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        values = (state.humidity, state.volatil_organic_compounds,
+                  state.temperature, state.dust, state.sleep_timer)
+        for tier in self._tiers:
+            tier.add(timestamp, values)
+
+    def tier(self, resolution=None, seconds=None):
+        """Return the tier of a resolution and a time window.
+
+        Among tiers covering the window, the coarsest tier with a
+        resolution finer or equal is selected, else the finest one.
+
+        :param resolution: Requested resolution in seconds (default:
+                           finest tier)
+        :param seconds: Window length in seconds (default: any)
+        :raise ValueError: No tier covers the window
+        """
+        tiers = [tier for tier in self._tiers
+                 if seconds is None or tier.retention >= seconds]
+        if not tiers:
+            raise ValueError("No rollup tier covers {0} seconds (max {1})"
+                             .format(seconds, self._tiers[-1].retention))
+        selected = tiers[0]
+        if resolution is not None:
+            for tier in tiers:
+                if tier.resolution <= resolution:
+                    selected = tier
+        return selected
+
+    def query(self, field, seconds, resolution=None, now=None):
+        """Return aggregates of a field in a time window, oldest first.
+
+        Buckets overlapping the window are returned. The resolution is
+        coarser than requested if finer tiers do not cover the window.
+
+        :param field: Field name (see ENVIRONMENTAL_FIELDS)
+        :param seconds: Window length in seconds
+        :param resolution: Requested resolution in seconds
+        :param now: End of the window in epoch seconds (default: now)
+        :return: List of (bucket start, min, max, mean, count)
+        :raise ValueError: No tier covers the window
+        """
+        if now is None:
+            now = time.time()
+        return self.tier(resolution, seconds).query(
+            ENVIRONMENTAL_FIELDS.index(field), now - seconds, now)
+
+    @property
+    def resolutions(self):
+        """Return resolution of each tier, finest first."""
+        return [tier.resolution for tier in self._tiers]
+
+
+class _RollupTier:
+    """Rollup tier."""
+
+    def __init__(self, resolution, capacity):
+        """Create a new tier.
+
+        :param resolution: Bucket length in seconds
+        :param capacity: Number of buckets
+        """
+        self.resolution = resolution
+        self.retention = resolution * capacity
+        self._capacity = capacity
+        self._buckets = array('q', [-1]) * capacity
+        self._counts = array('L', [0]) * capacity
+        self._minimums = [array('d', [0.0]) * capacity
+                          for _ in ENVIRONMENTAL_FIELDS]
+        self._maximums = [array('d', [0.0]) * capacity
+                          for _ in ENVIRONMENTAL_FIELDS]
+        self._sums = [array('d', [0.0]) * capacity
+                      for _ in ENVIRONMENTAL_FIELDS]
+
+    def add(self, timestamp, values):
+        """Add values to their bucket.
+
+        :return: False if the bucket slot is used by a newer bucket
+        """
+        bucket = int(timestamp // self.resolution)
+        slot = bucket % self._capacity
+        if self._buckets[slot] > bucket:
+            # Older than the tier retention
+            return False
+        if self._buckets[slot] != bucket:
+            self._buckets[slot] = bucket
+            self._counts[slot] = 1
+            for field, value in enumerate(values):
+                self._minimums[field][slot] = value
+                self._maximums[field][slot] = value
+                self._sums[field][slot] = value
+            return True
+        self._counts[slot] += 1
+        for field, value in enumerate(values):
+            if value < self._minimums[field][slot]:
+                self._minimums[field][slot] = value
+            if value > self._maximums[field][slot]:
+                self._maximums[field][slot] = value
+            self._sums[field][slot] += value
+        return True
+
+    def query(self, field, start, end):
+        """Return aggregates of buckets between start and end."""
+        result = []
+        first = int(start // self.resolution)
+        last = int(end // self.resolution)
+        for bucket in range(max(first, last - self._capacity + 1), last + 1):
+            slot = bucket % self._capacity
+            if self._buckets[slot] == bucket and self._counts[slot]:
+                count = self._counts[slot]
+                result.append((bucket * self.resolution,
+                               self._minimums[field][slot],
+                               self._maximums[field][slot],
+                               self._sums[field][slot] / count, count))
+        return result
@@ -0,0 +1,272 @@
+"""Dyson Pure link devices persistent history.
+
+History files are fixed-size ring buffers of fixed-size records, read
+and written through mmap. A file starts with a header (magic, record
+size, capacity, next write index, number of records) followed by the
+records. The first field of each record is the time in epoch seconds.
+"""
+
+import logging
+import mmap
+import os
+import struct
+import time
+
+from .dyson_pure_state import DysonEnvironmentalSensorState, \
+    DysonPureCoolState, DysonPureHotCoolState
+from .utils import printable_fields
+
+_LOGGER = logging.getLogger(__name__)
+
+HISTORY_MAGIC = b"DYSHIST1"
+DEFAULT_CAPACITY = 7 * 24 * 120
+_HEADER = struct.Struct("<8sIIQQ")
+# time, humidity, volatil organic compounds, temperature, dust, sleep timer
+ENVIRONMENTAL_RECORD = struct.Struct("<6d")
+# time, fmod, fnst, nmod, fnsp, oson, filf, qtar, rhtm, tilt, ffoc, hmax,
+# hmod, hsta (empty for Pure Cool Link devices)
+STATE_FIELD_SIZE = 8
+STATE_RECORD = struct.Struct("<d" + "{0}s".format(STATE_FIELD_SIZE) * 13)
+STATE_FIELDS = ("fmod", "fnst", "nmod", "fnsp", "oson", "filf", "qtar",
+                "rhtm", "tilt", "ffoc", "hmax", "hmod", "hsta")
+
+
+class DysonHistoryFile:
+    """Memory-mapped ring buffer of fixed-size records."""
+
+    def __init__(self, path, record, capacity=DEFAULT_CAPACITY):
+        """Open or create a history file.
+
+        An existing file keeps its capacity.
+
+        :param path: File path
+        :param record: struct.Struct of a record, first field is the time
+        :param capacity: Max number of records of a new file
+        """
+        self._path = path
+        self._record = record
+        if not os.path.exists(path):
+            with open(path, "wb") as history_file:
+                history_file.write(_HEADER.pack(HISTORY_MAGIC, record.size,
+                                                capacity, 0, 0))
+                history_file.truncate(_HEADER.size + capacity * record.size)
+        self._file = open(path, "r+b")
+        self._mmap = mmap.mmap(self._file.fileno(), 0)
+        magic, record_size, self._capacity, self._head, self._size = \
+            _HEADER.unpack_from(self._mmap, 0)
+        if magic != HISTORY_MAGIC or record_size != record.size:
+            self.close()
+            raise ValueError("Invalid history file " + path)
+
+    def append(self, *values):
+        """Append a record.
+
+        :param values: Record values, time first
+        """
+        self._record.pack_into(
+            self._mmap, _HEADER.size + self._head * self._record.size,
+            *values)
+        self._head = (self._head + 1) % self._capacity
+        if self._size < self._capacity:
+            self._size += 1
+        _HEADER.pack_into(self._mmap, 0, HISTORY_MAGIC, self._record.size,
+                          self._capacity, self._head, self._size)
+
+    def _time(self, index):
+        """Return time of a record, oldest record is index 0."""
+        return struct.unpack_from("<d", self._mmap, _HEADER.size + (
+            (self._head - self._size + index) % self._capacity) *
+            self._record.size)[0]
+
+    def _index(self, value, after=False):
+        """Return index of the first record at (or after) a time."""
+        low, high = 0, self._size
+        while low < high:
+            middle = (low + high) // 2
+            record_time = self._time(middle)
+            if record_time < value or (after and record_time == value):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def views(self, seconds=None, now=None):
+        """Return memoryviews of records of a time window, oldest first.
+
+        Records are not copied. At most two views are returned (the ring
+        buffer may wrap). Views must be released before closing the file.
+
+        :param seconds: Window length in seconds (default: all records)
+        :param now: End of the window in epoch seconds (default: no limit
+                    without window length, else now)
+        """
+        first = 0
+        last = self._size
+        if seconds is not None or now is not None:
+            if now is None:
+                now = time.time()
+            last = self._index(now, True)
+            if seconds is not None:
+                first = self._index(now - seconds)
+        start = (self._head - self._size + first) % self._capacity
+        count = max(last - first, 0)
+        view = memoryview(self._mmap)[_HEADER.size:]
+        size = self._record.size
+        if count == 0:
+            return []
+        if start + count <= self._capacity:
+            return [view[start * size:(start + count) * size]]
+        return [view[start * size:],
+                view[:(start + count - self._capacity) * size]]
+
+    def records(self, seconds=None, now=None):
+        """Iterate over records of a time window, oldest first.
+
+        :param seconds: Window length in seconds (default: all records)
+        :param now: End of the window in epoch seconds (default: no limit
+                    without window length, else now)
+        """
+        for view in self.views(seconds, now):
+            for record in self._record.iter_unpack(view):
+                yield record
+            view.release()
+
+    def discard(self, count):
+        """Remove the oldest records.
+
+        :param count: Number of records to remove
+        """
+        self._size -= min(count, self._size)
+        _HEADER.pack_into(self._mmap, 0, HISTORY_MAGIC, self._record.size,
+                          self._capacity, self._head, self._size)
+
+    def flush(self):
+        """Flush changes to disk."""
+        self._mmap.flush()
+
+    def close(self):
+        """Close the file."""
+        self._mmap.close()
+        self._file.close()
+
+    @property
+    def path(self):
+        """Return file path."""
+        return self._path
+
+    @property
+    def capacity(self):
+        """Return max number of records."""
+        return self._capacity
+
+    def __len__(self):
+        """Return number of records."""
+        return self._size
+
+    def __repr__(self):
+        """Return a String representation."""
+        fields = [("path", self.path), ("capacity", str(self.capacity)),
+                  ("size", str(len(self)))]
+        return 'DysonHistoryFile(' + ",".join(printable_fields(fields)) + ')'
+
+
+def _encode(value):
+    """Encode a state value to a record field, empty if too long."""
+    if not value:
+        return b""
+    encoded = value.encode("ascii")
+    if len(encoded) > STATE_FIELD_SIZE:
+        _LOGGER.warning("State value %s too long, not recorded", value)
+        return b""
+    return encoded
+
+
+def decode_state_record(record):
+    """Return (time, {field: value}) of a fan state record.
+
+    Empty fields (Hot+Cool fields of a Pure Cool Link) are None.
+
+    :param record: Record tuple read from a state history file
+    """
+    return record[0], {
+        field: value.rstrip(b"\x00").decode("ascii") or None
+        for field, value in zip(STATE_FIELDS, record[1:])}
+
+
+class DysonHistoryFileStore:
+    """Persist states of a device to history files.
+
+    Use on_message as a device message listener:
+
+        store = DysonHistoryFileStore("/var/lib/dyson", device.serial)
+        device.add_message_listener(store.on_message)
+    """
+
+    def __init__(self, directory, serial, capacity=DEFAULT_CAPACITY):
+        """Open or create history files of a device.
+
+        :param directory: Directory of history files
+        :param serial: Device serial
+        :param capacity: Max number of records of each new file
+        """
+        self._environmental = DysonHistoryFile(
+            os.path.join(directory, serial + "-environmental.hist"),
+            ENVIRONMENTAL_RECORD, capacity)
+        self._state = DysonHistoryFile(
+            os.path.join(directory, serial + "-state.hist"), STATE_RECORD,
+            capacity)
+
+    def on_message(self, message):
+        """Handle a device message."""
+        if isinstance(message, DysonEnvironmentalSensorState):
+            self.add_environmental_state(message)
+        elif isinstance(message, DysonPureCoolState):
+            self.add_state(message)
+
+    def add_environmental_state(self, state, timestamp=None):
+        """Append an environmental sensor state.
+
+        :param state: DysonEnvironmentalSensorState
+        :param timestamp: Epoch seconds (default: now)
+        """
+        self._environmental.append(
+            time.time() if timestamp is None else timestamp,
+            state.humidity, state.volatil_organic_compounds,
+            state.temperature, state.dust, state.sleep_timer)
+
+    def add_state(self, state, timestamp=None):
+        """Append a fan state.
+
+        :param state: DysonPureCoolState or DysonPureHotCoolState
+        :param timestamp: Epoch seconds (default: now)
+        """
+        values = [state.fan_mode, state.fan_state, state.night_mode,
+                  state.speed, state.oscillation, state.filter_life,
+                  state.quality_target, state.standby_monitoring]
+        if isinstance(state, DysonPureHotCoolState):
+            values += [state.tilt, state.focus_mode, state.heat_target,
+                       state.heat_mode, state.heat_state]
+        else:
+            values += [None] * 5
+        self._state.append(time.time() if timestamp is None else timestamp,
+                           *[_encode(value) for value in values])
+
+    @property
+    def environmental(self):
+        """Return environmental states history file."""
+        return self._environmental
+
+    @property
+    def state(self):
+        """Return fan states history file."""
+        return self._state
+
+    def flush(self):
+        """Flush history files to disk."""
+        self._environmental.flush()
+        self._state.flush()
+
+    def close(self):
+        """Close history files."""
+        self._environmental.close()
+        self._state.close()
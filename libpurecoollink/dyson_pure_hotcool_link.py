@@ -11,6 +11,10 @@ _LOGGER = logging.getLogger(__name__)
 class DysonPureHotCoolLink(DysonPureCoolLink):
     """Dyson Pure Hot+Cool device."""
 
+    COMMAND_FIELDS = dict(DysonPureCoolLink.COMMAND_FIELDS,
+                          heat_mode="hmod", heat_target="hmax",
+                          focus_mode="ffoc")
+
     def _parse_command_args(self, **kwargs):
         """Parse command arguments.
 
@@ -32,13 +36,14 @@ class DysonPureHotCoolLink(DysonPureCoolLink):
         data["hmax"] = f_heat_target
         return data
 
-    def set_configuration(self, **kwargs):
-        """Configure fan.
-
-        :param kwargs: Parameters
-        """
-        data = self._parse_command_args(**kwargs)
-        self.set_fan_configuration(data)
+    def _current_fields(self):
+        """Return current state values by STATE-SET field."""
+        fields = super()._current_fields()
+        if self._current_state is not None:
+            fields["hmod"] = self._current_state.heat_mode
+            fields["hmax"] = self._current_state.heat_target
+            fields["ffoc"] = self._current_state.focus_mode
+        return fields
 
     def __repr__(self):
         """Return a String representation."""
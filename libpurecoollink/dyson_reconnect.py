@@ -0,0 +1,150 @@
+"""Dyson devices automatic reconnection."""
+
+import logging
+import random
+import time
+from queue import Queue, Empty
+from threading import Lock, Thread
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_MIN_DELAY = 1
+DEFAULT_MAX_DELAY = 300
+DEFAULT_REDISCOVER_AFTER = 3
+DEFAULT_RECONNECT_RATE = 5
+DEFAULT_RECONNECT_BURST = 10
+
+
+def backoff_delay(attempt, min_delay=DEFAULT_MIN_DELAY,
+                  max_delay=DEFAULT_MAX_DELAY):
+    """Return delay before a reconnection attempt.
+
+    Exponential backoff with full jitter: a random delay between 0 and
+    min(max_delay, min_delay * 2 ** attempt).
+
+    :param attempt: Number of failed attempts
+    :param min_delay: Max delay of the first attempt in seconds
+    :param max_delay: Max delay in seconds
+    """
+    return random.uniform(0, min(max_delay, min_delay * 2 ** attempt))
+
+
+class ReconnectRateLimiter:
+    """Limit reconnection attempts of many devices (token bucket).
+
+    Share one limiter between devices of a fleet to avoid reconnection
+    storms when the network comes back.
+    """
+
+    def __init__(self, rate=DEFAULT_RECONNECT_RATE,
+                 burst=DEFAULT_RECONNECT_BURST):
+        """Create a new rate limiter.
+
+        :param rate: Attempts per second
+        :param burst: Max attempts at once
+        """
+        self._rate = rate
+        self._burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = Lock()
+
+    def try_acquire(self):
+        """Take a token if available.
+
+        :return: 0 if acquired, else seconds until a token is available
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._burst, self._tokens +
+                               (now - self._updated) * self._rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self._rate
+
+    def acquire(self, stop_queue=None):
+        """Wait for a token.
+
+        :param stop_queue: Queue interrupting the wait (optional)
+        :return: True if acquired, False if interrupted
+        """
+        wait = self.try_acquire()
+        while wait:
+            if stop_queue is None:
+                time.sleep(wait)
+            else:
+                try:
+                    stop_queue.get(timeout=wait)
+                    return False
+                except Empty:
+                    pass
+            wait = self.try_acquire()
+        return True
+
+    @property
+    def rate(self):
+        """Return attempts per second."""
+        return self._rate
+
+    @property
+    def burst(self):
+        """Return max attempts at once."""
+        return self._burst
+
+
+class ReconnectThread(Thread):
+    """Reconnect a device until it is available again."""
+
+    def __init__(self, device, min_delay=DEFAULT_MIN_DELAY,
+                 max_delay=DEFAULT_MAX_DELAY, rate_limiter=None,
+                 rediscover_after=DEFAULT_REDISCOVER_AFTER):
+        # pylint: disable=too-many-arguments
+        """Create a new reconnection thread.
+
+        :param device: Device to reconnect
+        :param min_delay: Max delay of the first attempt in seconds
+        :param max_delay: Max delay between attempts in seconds
+        :param rate_limiter: ReconnectRateLimiter (optional, shared)
+        :param rediscover_after: Search the device address using mDNS
+                                 after this number of failed attempts,
+                                 0 to disable
+        """
+        Thread.__init__(self)
+        self.daemon = True
+        self._device = device
+        self._min_delay = min_delay
+        self._max_delay = max_delay
+        self._rate_limiter = rate_limiter
+        self._rediscover_after = rediscover_after
+        self._stop_queue = Queue()
+
+    def stop(self):
+        """Stop the thread."""
+        self._stop_queue.put_nowait(True)
+
+    def _wait(self, delay):
+        """Wait before next attempt, return True if stopped."""
+        try:
+            return self._stop_queue.get(timeout=delay)
+        except Empty:
+            return False
+
+    def run(self):
+        """Reconnect the device."""
+        attempt = 0
+        while not self._wait(backoff_delay(attempt, self._min_delay,
+                                           self._max_delay)):
+            if self._rate_limiter is not None and \
+                    not self._rate_limiter.acquire(self._stop_queue):
+                return
+            if self._rediscover_after and attempt and \
+                    attempt % self._rediscover_after == 0:
+                self._device.rediscover()
+            result = self._device.reconnect()
+            if result.connected:
+                _LOGGER.info("Device %s reconnected after %s attempts",
+                             self._device.serial, attempt + 1)
+                return
+            attempt += 1
@@ -0,0 +1,296 @@
+"""Record and replay of MQTT traffic.
+
+A capture is a text file of JSON lines, one message per line, with the
+reception time ("timestamp", seconds since epoch), the "topic" and the
+"payload" (text).
+
+TrafficRecorder writes captures. ReplayTransport replays them to real
+devices (DysonPureCoolLink, Dyson360Eye) when used as MQTT client
+factory, without network::
+
+    transport = ReplayTransport("capture.jsonl")
+    device.client_factory = transport.client
+    device.connect("127.0.0.1")
+    transport.wait()
+
+Messages are replayed at maximum speed by default, or paced by their
+timestamps.
+"""
+
+import json
+import logging
+import time
+from threading import Event, Lock, Thread, current_thread
+from queue import Queue
+
+from paho.mqtt.client import topic_matches_sub
+
+from .dyson_simulator import SimulatedMessage, SimulatedMessageInfo, \
+    MQTT_SUCCESS
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def read_capture(path):
+    """Read a capture file.
+
+    :param path: Capture file
+    :return: Iterator of (timestamp, topic, payload bytes)
+    """
+    with open(path, "r", encoding="utf-8") as capture:
+        for line in capture:
+            if line.strip():
+                record = json.loads(line)
+                yield (record["timestamp"], record["topic"],
+                       record["payload"].encode("utf-8"))
+
+
+class TrafficRecorder:
+    """Write MQTT messages to a capture file."""
+
+    def __init__(self, path):
+        """Create a new recorder, appending to a capture file.
+
+        :param path: Capture file
+        """
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = Lock()
+        self._recorded = 0
+
+    @property
+    def recorded(self):
+        """Return the number of recorded messages."""
+        return self._recorded
+
+    def record(self, topic, payload, timestamp=None):
+        """Record a message.
+
+        :param topic: Topic
+        :param payload: Payload (bytes or str)
+        :param timestamp: Reception time (time.time() by default)
+        """
+        if isinstance(payload, bytes):
+            payload = payload.decode("utf-8")
+        line = json.dumps({"timestamp": time.time() if timestamp is None
+                           else timestamp,
+                           "topic": topic, "payload": payload})
+        with self._lock:
+            self._file.write(line + "\n")
+            self._recorded += 1
+
+    def on_message(self, client, userdata, msg):
+        # pylint: disable=unused-argument
+        """Record a message, usable as paho on_message callback."""
+        self.record(msg.topic, msg.payload)
+
+    def close(self):
+        """Close the capture file."""
+        with self._lock:
+            self._file.close()
+
+
+class ReplayClient:
+    """MQTT client replaying a capture.
+
+    Implements the subset of the paho Client API used by devices.
+    Callbacks are called from the client thread (loop_start), like paho.
+    Once subscribed, captured messages matching the subscriptions are
+    delivered, then the client stays idle. Published messages are
+    counted and dropped.
+    """
+
+    def __init__(self, transport, userdata=None, protocol=None):
+        """Create a new replay client.
+
+        :param transport: ReplayTransport
+        :param userdata: User data given to callbacks
+        :param protocol: MQTT protocol (ignored)
+        """
+        self._transport = transport
+        self._userdata = userdata
+        self._protocol = protocol
+        self._subscriptions = []
+        self._queue = Queue()
+        self._thread = None
+        self._stopped = False
+        self._finished = Event()
+        self._delivered = 0
+        self._published = 0
+        self._elapsed = None
+        self.connect_timeout = 5
+        self.on_connect = None
+        self.on_message = None
+        self.on_disconnect = None
+
+    @property
+    def delivered(self):
+        """Return the number of replayed messages."""
+        return self._delivered
+
+    @property
+    def published(self):
+        """Return the number of messages published by the device."""
+        return self._published
+
+    @property
+    def elapsed(self):
+        """Return replay duration in seconds, None if not finished."""
+        return self._elapsed
+
+    @property
+    def finished(self):
+        """Return True if the replay is finished or stopped."""
+        return self._finished.is_set()
+
+    def wait(self, timeout=None):
+        """Wait for the end of the replay.
+
+        :param timeout: Timeout in seconds (optional)
+        :return: True if finished
+        """
+        return self._finished.wait(timeout)
+
+    def username_pw_set(self, username, password=None):
+        """Set credentials (ignored)."""
+
+    def connect(self, host, port=1883, keepalive=60):
+        """Connect, always accepted."""
+        # pylint: disable=unused-argument
+        self._queue.put_nowait(True)
+        return MQTT_SUCCESS
+
+    def loop_start(self):
+        """Start the client thread."""
+        if self._thread is None:
+            self._thread = Thread(target=self._loop)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def loop_stop(self):
+        """Stop the client thread."""
+        thread = self._thread
+        if thread is not None:
+            self._thread = None
+            self._stopped = True
+            self._queue.put_nowait(False)
+            if thread is not current_thread():
+                thread.join()
+
+    def _loop(self):
+        """Connect then replay the capture."""
+        try:
+            if not self._queue.get():
+                return
+            if self.on_connect is not None:
+                self.on_connect(self, self._userdata, {}, MQTT_SUCCESS)
+            if self._subscriptions:
+                self._replay()
+        finally:
+            self._finished.set()
+
+    def _replay(self):
+        """Deliver captured messages matching the subscriptions."""
+        started = time.monotonic()
+        speed = self._transport.speed
+        first = None
+        for timestamp, topic, payload in self._transport.records():
+            if self._stopped:
+                return
+            if topic not in self._subscriptions and not any(
+                    topic_matches_sub(subscription, topic)
+                    for subscription in self._subscriptions):
+                continue
+            if speed is not None:
+                if first is None:
+                    first = timestamp
+                delay = started + (timestamp - first) / speed - \
+                    time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            self._delivered += 1
+            if self.on_message is not None:
+                try:
+                    self.on_message(self, self._userdata,
+                                    SimulatedMessage(topic, payload))
+                except Exception:  # pylint: disable=broad-except
+                    _LOGGER.exception("Error in replayed message callback")
+        self._elapsed = time.monotonic() - started
+
+    def subscribe(self, topic, qos=0):
+        """Subscribe to a topic."""
+        # pylint: disable=unused-argument
+        self._subscriptions.append(topic)
+        return MQTT_SUCCESS, None
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        """Count and drop a message."""
+        # pylint: disable=unused-argument
+        self._published += 1
+        return SimulatedMessageInfo(self._published)
+
+    def disconnect(self):
+        """Disconnect, stopping the replay."""
+        self._stopped = True
+        if self.on_disconnect is not None:
+            self.on_disconnect(self, self._userdata, MQTT_SUCCESS)
+        return MQTT_SUCCESS
+
+
+class ReplayTransport:
+    """Replay captured MQTT traffic to devices."""
+
+    def __init__(self, source, speed=None):
+        """Create a new replay transport.
+
+        :param source: Capture file, or list of (timestamp, topic,
+                       payload bytes)
+        :param speed: Replay speed relative to the capture timestamps
+                      (2 replays twice faster), None for maximum speed
+        """
+        self._source = source
+        self._speed = speed
+        self._clients = []
+        self._lock = Lock()
+
+    @property
+    def speed(self):
+        """Return replay speed, None for maximum speed."""
+        return self._speed
+
+    @property
+    def clients(self):
+        """Return created clients."""
+        with self._lock:
+            return list(self._clients)
+
+    @property
+    def delivered(self):
+        """Return the number of replayed messages, all clients included."""
+        return sum(client.delivered for client in self.clients)
+
+    def records(self):
+        """Return an iterator of captured (timestamp, topic, payload)."""
+        if isinstance(self._source, str):
+            return read_capture(self._source)
+        return iter(self._source)
+
+    def client(self, userdata=None, protocol=None):
+        """Create a client, usable as device MQTT client factory."""
+        client = ReplayClient(self, userdata, protocol)
+        with self._lock:
+            self._clients.append(client)
+        return client
+
+    def wait(self, timeout=None):
+        """Wait for the end of the replay of all clients.
+
+        :param timeout: Timeout in seconds (optional)
+        :return: True if all replays are finished
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for client in self.clients:
+            remaining = None if deadline is None else \
+                max(deadline - time.monotonic(), 0)
+            if not client.wait(remaining):
+                return False
+        return True
@@ -0,0 +1,675 @@
+"""Simulated Dyson devices for load testing.
+
+Simulated devices run in-process behind a SimulatedBroker, which emulates
+the MQTT transport. Real devices (DysonPureCoolLink, Dyson360Eye) connect
+to them when the broker is used as MQTT client factory::
+
+    broker = SimulatedBroker()
+    simulated = broker.add_devices(SimulatedPureCoolLink, 1000,
+                                   sensor_interval=1)
+    devices = DeviceFactory().create_devices(
+        device.json_body() for device in simulated)
+    for device in devices:
+        device.client_factory = broker.client
+        device.connect("127.0.0.1")
+    broker.start()
+"""
+
+# pylint: disable=too-many-instance-attributes
+
+import abc
+import json
+import logging
+import random
+import time
+import uuid
+from queue import Queue, Empty
+from threading import Lock, Thread, current_thread
+
+from .const import DYSON_PURE_COOL_LINK_TOUR, \
+    DYSON_PURE_HOT_COOL_LINK_TOUR, DYSON_360_EYE, Dyson360EyeMode, \
+    Dyson360EyeCommand
+from .dyson_payload import REQUEST_CURRENT_STATE, \
+    REQUEST_ENVIRONMENTAL_STATE, STATE_SET
+from .utils import encrypt_password
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_PASSWORD = "password"
+DEFAULT_TICK = 0.1
+
+MQTT_SUCCESS = 0
+MQTT_BAD_CREDENTIALS = 4
+MQTT_CONNECTION_LOST = 7
+
+
+def _timestamp():
+    """Return current time formatted like device messages."""
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+
+class SimulatedMessage:
+    """MQTT message delivered to simulated clients."""
+
+    def __init__(self, topic, payload):
+        """Create a new message.
+
+        :param topic: Topic
+        :param payload: Payload (bytes)
+        """
+        self.topic = topic
+        self.payload = payload
+        self.qos = 0
+        self.retain = False
+
+
+class SimulatedMessageInfo:
+    """Result of a publication (paho MQTTMessageInfo API)."""
+
+    def __init__(self, mid):
+        """Create a new message info.
+
+        :param mid: Message id
+        """
+        self.mid = mid
+        self.rc = MQTT_SUCCESS  # pylint: disable=invalid-name
+
+    def is_published(self):
+        """Return True, messages are published synchronously."""
+        return True
+
+    def wait_for_publish(self, timeout=None):
+        """Return immediately, messages are published synchronously."""
+
+
+class SimulatedClient:
+    """MQTT client connected to a SimulatedBroker.
+
+    Implements the subset of the paho Client API used by devices.
+    Callbacks are called from the client thread (loop_start).
+    """
+
+    def __init__(self, broker, userdata=None, protocol=None):
+        """Create a new simulated client.
+
+        :param broker: SimulatedBroker
+        :param userdata: User data given to callbacks
+        :param protocol: MQTT protocol (ignored)
+        """
+        self._broker = broker
+        self._userdata = userdata
+        self._protocol = protocol
+        self._username = None
+        self._password = None
+        self._queue = Queue()
+        self._thread = None
+        self._mid = 0
+        self.connect_timeout = 5
+        self.on_connect = None
+        self.on_message = None
+        self.on_disconnect = None
+
+    def username_pw_set(self, username, password=None):
+        """Set credentials."""
+        self._username = username
+        self._password = password
+
+    def connect(self, host, port=1883, keepalive=60):
+        """Connect to the simulated device.
+
+        :raise ConnectionRefusedError: if the device is offline
+        """
+        # pylint: disable=unused-argument
+        return_code = self._broker.authenticate(self._username,
+                                                self._password)
+        self._queue.put_nowait((self._on_connect, return_code))
+        return MQTT_SUCCESS
+
+    def _on_connect(self, return_code):
+        """Call the connect callback."""
+        if self.on_connect is not None:
+            self.on_connect(self, self._userdata, {}, return_code)
+
+    def _on_disconnect(self, return_code):
+        """Call the disconnect callback."""
+        if self.on_disconnect is not None:
+            self.on_disconnect(self, self._userdata, return_code)
+
+    def _on_message(self, message):
+        """Call the message callback."""
+        if self.on_message is not None:
+            self.on_message(self, self._userdata, message)
+
+    def loop_start(self):
+        """Start the client thread."""
+        if self._thread is None:
+            self._thread = Thread(target=self._loop)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def loop_stop(self):
+        """Stop the client thread."""
+        thread = self._thread
+        if thread is not None:
+            self._thread = None
+            self._queue.put_nowait(None)
+            if thread.ident is not None and thread is not \
+                    current_thread():
+                thread.join()
+
+    def _loop(self):
+        """Call callbacks until stopped."""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            function, argument = item
+            try:
+                function(argument)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Error in simulated client callback")
+
+    def subscribe(self, topic, qos=0):
+        """Subscribe to a topic."""
+        # pylint: disable=unused-argument
+        self._broker.subscribe(self, topic)
+        return MQTT_SUCCESS, None
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        """Publish a message."""
+        # pylint: disable=unused-argument
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        self._mid += 1
+        self._broker.publish(topic, payload)
+        return SimulatedMessageInfo(self._mid)
+
+    def disconnect(self):
+        """Disconnect from the simulated device."""
+        self._broker.unsubscribe(self)
+        self._queue.put_nowait((self._on_disconnect, MQTT_SUCCESS))
+        return MQTT_SUCCESS
+
+    def connection_lost(self):
+        """Simulate a connection loss."""
+        self._broker.unsubscribe(self)
+        self._queue.put_nowait((self._on_disconnect, MQTT_CONNECTION_LOST))
+
+    def deliver(self, topic, payload):
+        """Queue a message for this client. Internal method."""
+        self._queue.put_nowait((self._on_message,
+                                SimulatedMessage(topic, payload)))
+
+
+class SimulatedBroker:
+    """In-process MQTT transport between clients and simulated devices."""
+
+    def __init__(self, tick=DEFAULT_TICK):
+        """Create a new simulated broker.
+
+        :param tick: Interval between two stream updates in seconds
+        """
+        self._tick = tick
+        self._devices = {}
+        self._command_topics = {}
+        self._subscriptions = {}
+        self._lock = Lock()
+        self._published = 0
+        self._delivered = 0
+        self._thread = None
+        self._stop_queue = Queue()
+
+    def add_device(self, device):
+        """Add a simulated device.
+
+        :param device: SimulatedDevice
+        """
+        device.attach(self)
+        self._devices[device.serial] = device
+        self._command_topics[device.command_topic] = device
+        return device
+
+    def add_devices(self, device_class, count, prefix="SIM", **kwargs):
+        """Create and add simulated devices.
+
+        :param device_class: Simulated device class
+        :param count: Number of devices
+        :param prefix: Serial prefix
+        :param kwargs: Device arguments (intervals, password, seed)
+        :return: List of simulated devices
+        """
+        start = len(self._devices)
+        return [self.add_device(device_class(
+            "{0}-{1}-{2:05d}".format(prefix, device_class.PRODUCT_TYPE,
+                                     start + index), **kwargs))
+                for index in range(count)]
+
+    @property
+    def devices(self):
+        """Return simulated devices."""
+        return list(self._devices.values())
+
+    def device(self, serial):
+        """Return a simulated device."""
+        return self._devices[serial]
+
+    def client(self, userdata=None, protocol=None):
+        """Create a client, usable as device MQTT client factory."""
+        return SimulatedClient(self, userdata, protocol)
+
+    def authenticate(self, username, password):
+        """Return MQTT connection return code.
+
+        :raise ConnectionRefusedError: if the device is offline
+        """
+        device = self._devices.get(username)
+        if device is None or device.password != password:
+            return MQTT_BAD_CREDENTIALS
+        if not device.online:
+            raise ConnectionRefusedError(
+                "Simulated device {0} is offline".format(username))
+        return MQTT_SUCCESS
+
+    def subscribe(self, client, topic):
+        """Subscribe a client to a topic."""
+        with self._lock:
+            self._subscriptions.setdefault(topic, []).append(client)
+
+    def unsubscribe(self, client):
+        """Remove all subscriptions of a client."""
+        with self._lock:
+            for clients in self._subscriptions.values():
+                if client in clients:
+                    clients.remove(client)
+
+    def publish(self, topic, payload):
+        """Publish a message.
+
+        Commands are handled by the simulated device in the calling thread.
+        """
+        with self._lock:
+            self._published += 1
+            clients = list(self._subscriptions.get(topic, ()))
+            self._delivered += len(clients)
+        for client in clients:
+            client.deliver(topic, payload)
+        device = self._command_topics.get(topic)
+        if device is not None:
+            device.handle_command(payload)
+
+    def disconnect_clients(self, device):
+        """Simulate a connection loss of all clients of a device."""
+        with self._lock:
+            clients = list(self._subscriptions.get(device.status_topic, ()))
+        for client in clients:
+            client.connection_lost()
+
+    @property
+    def published(self):
+        """Return number of published messages."""
+        return self._published
+
+    @property
+    def delivered(self):
+        """Return number of messages delivered to clients."""
+        return self._delivered
+
+    def update(self, now=None):
+        """Emit stream messages of all devices which are due."""
+        now = time.monotonic() if now is None else now
+        for device in list(self._devices.values()):
+            device.update(now)
+
+    def start(self):
+        """Start streaming device messages."""
+        if self._thread is None:
+            self._thread = Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        """Stop streaming device messages."""
+        if self._thread is not None:
+            self._stop_queue.put_nowait(True)
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        """Update devices until stopped."""
+        while True:
+            self.update()
+            try:
+                if self._stop_queue.get(timeout=self._tick):
+                    return
+            except Empty:
+                pass
+
+
+class SimulatedDevice(metaclass=abc.ABCMeta):
+    """Abstract simulated Dyson device."""
+
+    PRODUCT_TYPE = None
+
+    def __init__(self, serial, name=None, password=DEFAULT_PASSWORD,
+                 seed=None):
+        """Create a new simulated device.
+
+        :param serial: Device serial
+        :param name: Device name (default: serial)
+        :param password: MQTT password
+        :param seed: Random seed of generated values (optional)
+        """
+        self._serial = serial
+        self._name = name or serial
+        self._password = password
+        self._random = random.Random(seed)
+        self._broker = None
+        self._online = True
+        self._streams = []
+        self._lock = Lock()
+        self._commands = 0
+
+    @property
+    def serial(self):
+        """Device serial."""
+        return self._serial
+
+    @property
+    def password(self):
+        """MQTT password."""
+        return self._password
+
+    @property
+    def online(self):
+        """Return False if connections are refused."""
+        return self._online
+
+    @online.setter
+    def online(self, value):
+        """Accept or refuse connections."""
+        self._online = value
+
+    @property
+    def commands(self):
+        """Return number of handled commands."""
+        return self._commands
+
+    @property
+    def command_topic(self):
+        """MQTT command topic."""
+        return "{0}/{1}/command".format(self.PRODUCT_TYPE, self._serial)
+
+    @property
+    def status_topic(self):
+        """MQTT status topic."""
+        return "{0}/{1}/status".format(self.PRODUCT_TYPE, self._serial)
+
+    def json_body(self):
+        """Return the manifest entry of this device."""
+        return {
+            "Active": True,
+            "Serial": self._serial,
+            "Name": self._name,
+            "ScaleUnit": "SU01",
+            "Version": "21.03.08",
+            "LocalCredentials": encrypt_password(self._password),
+            "AutoUpdate": True,
+            "NewVersionAvailable": False,
+            "ProductType": self.PRODUCT_TYPE
+        }
+
+    def attach(self, broker):
+        """Attach the device to a broker. Internal method."""
+        self._broker = broker
+
+    def add_stream(self, interval, function):
+        """Call a function periodically (see SimulatedBroker.start).
+
+        :param interval: Interval in seconds, None or 0 to disable
+        :param function: Function returning the message to emit or None
+        """
+        if interval:
+            self._streams.append([interval, 0, function])
+
+    def update(self, now):
+        """Emit stream messages which are due. Internal method."""
+        for stream in self._streams:
+            if now >= stream[1]:
+                stream[1] = now + stream[0]
+                with self._lock:
+                    message = stream[2]()
+                if message is not None:
+                    self.emit(message)
+
+    def emit(self, message):
+        """Publish a message on the status topic."""
+        if self._broker is not None:
+            self._broker.publish(self.status_topic,
+                                 json.dumps(message).encode("utf-8"))
+
+    def disconnect_clients(self):
+        """Simulate a connection loss of connected clients."""
+        self._broker.disconnect_clients(self)
+
+    def handle_command(self, payload):
+        """Handle a command received on the command topic."""
+        try:
+            command = json.loads(payload.decode("utf-8"))
+        except ValueError:
+            _LOGGER.warning("Invalid command for device %s: %s",
+                            self._serial, payload)
+            return
+        with self._lock:
+            self._commands += 1
+            message = self._handle(command)
+        if message is not None:
+            self.emit(message)
+
+    @abc.abstractmethod
+    def _handle(self, command):
+        """Return the answer to a command, None if none."""
+        return
+
+
+class SimulatedPureCoolLink(SimulatedDevice):
+    """Simulated Dyson Pure Cool Link device."""
+
+    PRODUCT_TYPE = DYSON_PURE_COOL_LINK_TOUR
+    DEFAULT_STATE = {
+        "fmod": "AUTO", "fnst": "FAN", "fnsp": "AUTO", "qtar": "0004",
+        "oson": "OFF", "rhtm": "ON", "filf": "2087", "ercd": "02C0",
+        "nmod": "ON", "wacd": "NONE"
+    }
+
+    def __init__(self, serial, name=None, password=DEFAULT_PASSWORD,
+                 seed=None, state_interval=None, sensor_interval=None):
+        # pylint: disable=too-many-arguments
+        """Create a new simulated device.
+
+        :param serial: Device serial
+        :param name: Device name (default: serial)
+        :param password: MQTT password
+        :param seed: Random seed of generated values (optional)
+        :param state_interval: STATE-CHANGE stream interval in seconds
+        :param sensor_interval: Sensor data stream interval in seconds
+        """
+        super().__init__(serial, name, password, seed)
+        self._state = dict(self.DEFAULT_STATE)
+        self._sensor = {"tact": 2967, "hact": 54, "pact": 4, "vact": 5,
+                        "sltm": "OFF"}
+        self.add_stream(state_interval, self._state_stream)
+        self.add_stream(sensor_interval, self._sensor_stream)
+
+    @property
+    def status_topic(self):
+        """MQTT status topic."""
+        return "{0}/{1}/status/current".format(self.PRODUCT_TYPE,
+                                               self._serial)
+
+    @property
+    def product_state(self):
+        """Return current product state."""
+        return dict(self._state)
+
+    def current_state(self):
+        """Return a CURRENT-STATE message."""
+        return {"msg": "CURRENT-STATE", "time": _timestamp(),
+                "mode-reason": "LAPP", "state-reason": "ENV", "dial": "OFF",
+                "rssi": "-55", "product-state": dict(self._state)}
+
+    def sensor_data(self):
+        """Return an ENVIRONMENTAL-CURRENT-SENSOR-DATA message."""
+        data = {field: "{0:04d}".format(value) if isinstance(value, int)
+                else value for field, value in self._sensor.items()}
+        return {"msg": "ENVIRONMENTAL-CURRENT-SENSOR-DATA",
+                "time": _timestamp(), "data": data}
+
+    def _state_change(self, changes):
+        """Apply changes, return a STATE-CHANGE message."""
+        old_state = dict(self._state)
+        self._state.update((field, value) for field, value in changes.items()
+                           if field in self._state and value != "STET")
+        product_state = {field: [old_state[field], value]
+                         for field, value in self._state.items()}
+        return {"msg": "STATE-CHANGE", "time": _timestamp(),
+                "mode-reason": "LAPP", "state-reason": "MODE",
+                "product-state": product_state}
+
+    def _state_stream(self):
+        """Return filter life update."""
+        return self._state_change({"filf": "{0:04d}".format(
+            max(int(self._state["filf"]) - 1, 0))})
+
+    def _sensor_stream(self):
+        """Return new sensor values."""
+        self._sensor["tact"] += self._random.randint(-5, 5)
+        self._sensor["hact"] = min(max(
+            self._sensor["hact"] + self._random.randint(-1, 1), 0), 100)
+        self._sensor["pact"] = min(max(
+            self._sensor["pact"] + self._random.randint(-1, 1), 0), 9)
+        self._sensor["vact"] = min(max(
+            self._sensor["vact"] + self._random.randint(-1, 1), 0), 9)
+        return self.sensor_data()
+
+    def _handle(self, command):
+        """Return the answer to a command, None if none."""
+        msg = command.get("msg")
+        if msg == REQUEST_CURRENT_STATE:
+            return self.current_state()
+        if msg == REQUEST_ENVIRONMENTAL_STATE:
+            return self.sensor_data()
+        if msg == STATE_SET:
+            return self._state_change(command.get("data", {}))
+        _LOGGER.warning("Unknown command for device %s: %s", self._serial,
+                        msg)
+        return None
+
+
+class SimulatedPureHotCoolLink(SimulatedPureCoolLink):
+    """Simulated Dyson Pure Hot+Cool Link device."""
+
+    PRODUCT_TYPE = DYSON_PURE_HOT_COOL_LINK_TOUR
+    DEFAULT_STATE = dict(SimulatedPureCoolLink.DEFAULT_STATE, **{
+        "tilt": "OK", "ffoc": "ON", "hmax": "2950", "hmod": "HEAT",
+        "hsta": "HEAT"
+    })
+
+
+class Simulated360Eye(SimulatedDevice):
+    """Simulated Dyson 360 Eye robot vacuum."""
+
+    PRODUCT_TYPE = DYSON_360_EYE
+    RUNNING = {Dyson360EyeMode.FULL_CLEAN_INITIATED.value,
+               Dyson360EyeMode.FULL_CLEAN_RUNNING.value}
+
+    def __init__(self, serial, name=None, password=DEFAULT_PASSWORD,
+                 seed=None, state_interval=None, map_interval=None):
+        # pylint: disable=too-many-arguments
+        """Create a new simulated robot vacuum.
+
+        :param serial: Device serial
+        :param name: Device name (default: serial)
+        :param password: MQTT password
+        :param seed: Random seed of generated values (optional)
+        :param state_interval: STATE-CHANGE stream interval in seconds,
+                               while cleaning
+        :param map_interval: MAP-GLOBAL stream interval in seconds, while
+                             cleaning
+        """
+        super().__init__(serial, name, password, seed)
+        self._state = {
+            "state": Dyson360EyeMode.INACTIVE_CHARGED.value,
+            "fullCleanType": "",
+            "cleanId": "",
+            "currentVacuumPowerMode": "halfPower",
+            "defaultVacuumPowerMode": "halfPower",
+            "globalPosition": [0, 0],
+            "batteryChargeLevel": 100
+        }
+        self.add_stream(state_interval, self._state_stream)
+        self.add_stream(map_interval, self._map_stream)
+
+    @property
+    def state(self):
+        """Return cleaning mode, a Dyson360EyeMode value."""
+        return self._state["state"]
+
+    def current_state(self):
+        """Return a CURRENT-STATE message."""
+        return dict(self._state, msg="CURRENT-STATE", time=_timestamp())
+
+    def _state_change(self, new_state, **changes):
+        """Apply changes, return a STATE-CHANGE message."""
+        old_state = self._state["state"]
+        self._state.update(changes, state=new_state)
+        message = dict(self._state, msg="STATE-CHANGE", oldstate=old_state,
+                       newstate=new_state, time=_timestamp())
+        del message["state"]
+        return message
+
+    def _state_stream(self):
+        """Return battery level update while cleaning."""
+        if self._state["state"] not in self.RUNNING:
+            return None
+        return self._state_change(
+            Dyson360EyeMode.FULL_CLEAN_RUNNING.value,
+            batteryChargeLevel=max(self._state["batteryChargeLevel"] - 1, 0))
+
+    def _map_stream(self):
+        """Return new position while cleaning."""
+        if self._state["state"] not in self.RUNNING:
+            return None
+        position = [coordinate + self._random.randint(-10, 10)
+                    for coordinate in self._state["globalPosition"]]
+        self._state["globalPosition"] = position
+        return {"msg": "MAP-GLOBAL", "gridID": "1", "x": position[0],
+                "y": position[1], "angle": self._random.randint(-180, 180),
+                "cleanId": self._state["cleanId"], "time": _timestamp()}
+
+    def _handle(self, command):
+        """Return the answer to a command, None if none."""
+        msg = command.get("msg")
+        if msg == REQUEST_CURRENT_STATE:
+            return self.current_state()
+        if msg == Dyson360EyeCommand.START.value:
+            return self._state_change(
+                Dyson360EyeMode.FULL_CLEAN_INITIATED.value,
+                fullCleanType=command.get("fullCleanType", "immediate"),
+                cleanId=str(uuid.UUID(int=self._random.getrandbits(128))))
+        if msg == Dyson360EyeCommand.PAUSE.value:
+            return self._state_change(
+                Dyson360EyeMode.FULL_CLEAN_PAUSED.value)
+        if msg == Dyson360EyeCommand.RESUME.value:
+            return self._state_change(
+                Dyson360EyeMode.FULL_CLEAN_RUNNING.value)
+        if msg == Dyson360EyeCommand.ABORT.value:
+            return self._state_change(
+                Dyson360EyeMode.FULL_CLEAN_ABORTED.value)
+        if msg == STATE_SET:
+            data = command.get("data", {})
+            return self._state_change(self._state["state"], **{
+                field: value for field, value in data.items()
+                if field in self._state})
+        _LOGGER.warning("Unknown command for device %s: %s", self._serial,
+                        msg)
+        return None
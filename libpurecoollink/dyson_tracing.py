@@ -0,0 +1,274 @@
+"""Tracing hooks of the message pipeline.
+
+Tracing is disabled by default: instrumented code only checks that the
+module TRACER attribute is None. Register a Tracer with enable_tracing()
+to receive timing spans of sampled messages.
+
+Spans of a message:
+
+- receive: whole handling of the message
+- decode: payload decoding
+- classify: message type detection
+- construct: state object construction
+- publish: device state update and listeners calls
+- listener: one listener call (child of publish, or of raw_publish for
+  Dyson 360 Eye raw listeners)
+"""
+
+import time
+from collections import deque
+from itertools import count
+
+from .utils import printable_fields
+
+RECEIVE = "receive"
+DECODE = "decode"
+CLASSIFY = "classify"
+CONSTRUCT = "construct"
+PUBLISH = "publish"
+RAW_PUBLISH = "raw_publish"
+LISTENER = "listener"
+
+# One message out of DEFAULT_SAMPLE_INTERVAL is traced by default
+DEFAULT_SAMPLE_INTERVAL = 100
+DEFAULT_MAX_SPANS = 10000
+
+# Tracer receiving spans, None when disabled
+TRACER = None
+
+
+class Span:
+    """Timing of a pipeline step."""
+
+    def __init__(self, name, serial, parent=None, listener=None):
+        """Start a new span.
+
+        :param name: Step name
+        :param serial: Device serial
+        :param parent: Parent span
+        :param listener: Listener name (listener spans)
+        """
+        self._name = name
+        self._serial = serial
+        self._parent = parent
+        self._listener = listener
+        self._message_type = None
+        self._start = time.perf_counter()
+        self._end = None
+
+    def finish(self):
+        """Finish the span."""
+        self._end = time.perf_counter()
+
+    @property
+    def name(self):
+        """Step name."""
+        return self._name
+
+    @property
+    def serial(self):
+        """Device serial."""
+        return self._serial
+
+    @property
+    def parent(self):
+        """Parent span, None for the receive span."""
+        return self._parent
+
+    @property
+    def listener(self):
+        """Listener name, None if not a listener span."""
+        return self._listener
+
+    @property
+    def message_type(self):
+        """Message type (state class name), unknown if not recognized."""
+        return self._message_type
+
+    @message_type.setter
+    def message_type(self, value):
+        """Set message type."""
+        self._message_type = value
+
+    @property
+    def start(self):
+        """Start time (time.perf_counter)."""
+        return self._start
+
+    @property
+    def end(self):
+        """End time (time.perf_counter), None if not finished."""
+        return self._end
+
+    @property
+    def duration(self):
+        """Duration in seconds, None if not finished."""
+        if self._end is None:
+            return None
+        return self._end - self._start
+
+    def __repr__(self):
+        """Return a String representation."""
+        fields = [("name", self._name), ("serial", str(self._serial)),
+                  ("message_type", str(self._message_type)),
+                  ("listener", str(self._listener)),
+                  ("duration", str(self.duration))]
+        return 'Span(' + ",".join(printable_fields(fields)) + ')'
+
+
+class Trace:
+    """Spans of one message, reported to the tracer when finished."""
+
+    def __init__(self, tracer, serial):
+        """Start a new trace.
+
+        :param tracer: Tracer
+        :param serial: Device serial
+        """
+        self._tracer = tracer
+        self._serial = serial
+        self._root = Span(RECEIVE, serial)
+        self._stage = None
+        self._spans = []
+
+    def _finish_stage(self):
+        if self._stage is not None:
+            self._stage.finish()
+            self._spans.append(self._stage)
+            self._stage = None
+
+    def stage(self, name):
+        """Finish the current step and start the next one.
+
+        :param name: Step name
+        """
+        self._finish_stage()
+        self._stage = Span(name, self._serial, self._root)
+
+    def call_listeners(self, functions, message):
+        """Call listeners in the current step, a span for each.
+
+        :param functions: Listeners
+        :param message: Listener argument
+        """
+        parent = self._stage or self._root
+        for function in functions:
+            span = Span(LISTENER, self._serial, parent,
+                        getattr(function, "__qualname__", repr(function)))
+            function(message)
+            span.finish()
+            self._spans.append(span)
+
+    def finish(self, message_type):
+        """Finish the trace and report its spans to the tracer.
+
+        :param message_type: Message type
+        """
+        self._finish_stage()
+        self._root.finish()
+        self._spans.append(self._root)
+        for span in self._spans:
+            span.message_type = message_type
+            self._tracer.on_span(span)
+
+
+class RateSampler:
+    """Sample one message out of interval.
+
+    Sampling is a counter increment, without lock nor random number.
+    """
+
+    def __init__(self, interval=DEFAULT_SAMPLE_INTERVAL):
+        """Create a new sampler.
+
+        :param interval: Messages per sampled message, 1 to trace all
+        """
+        if interval < 1:
+            raise ValueError("Sample interval must be at least 1")
+        self._interval = interval
+        self._counter = count()
+
+    @property
+    def interval(self):
+        """Messages per sampled message."""
+        return self._interval
+
+    def sample(self):
+        """Return True if the next message must be traced."""
+        return next(self._counter) % self._interval == 0
+
+
+class Tracer:
+    """Base tracer, override on_span to handle spans."""
+
+    def __init__(self, sampler=None):
+        """Create a new tracer.
+
+        :param sampler: Sampler (RateSampler by default)
+        """
+        self._sampler = sampler or RateSampler()
+
+    @property
+    def sampler(self):
+        """Sampler."""
+        return self._sampler
+
+    def start_trace(self, serial):
+        """Return a new Trace if the message is sampled, else None.
+
+        :param serial: Device serial
+        """
+        if self._sampler.sample():
+            return Trace(self, serial)
+        return None
+
+    def on_span(self, span):
+        """Handle a finished span.
+
+        Called in the MQTT network thread: must be fast.
+
+        :param span: Span
+        """
+
+
+class RecordingTracer(Tracer):
+    """Tracer keeping the last spans in memory."""
+
+    def __init__(self, sampler=None, max_spans=DEFAULT_MAX_SPANS):
+        """Create a new recording tracer.
+
+        :param sampler: Sampler (RateSampler by default)
+        :param max_spans: Spans kept
+        """
+        super().__init__(sampler)
+        self._spans = deque(maxlen=max_spans)
+
+    @property
+    def spans(self):
+        """Return recorded spans, oldest first."""
+        return list(self._spans)
+
+    def clear(self):
+        """Remove recorded spans."""
+        self._spans.clear()
+
+    def on_span(self, span):
+        """Record a span."""
+        self._spans.append(span)
+
+
+def enable_tracing(tracer):
+    """Register the tracer of the message pipeline.
+
+    :param tracer: Tracer
+    :return: Tracer
+    """
+    global TRACER  # pylint: disable=global-statement
+    TRACER = tracer
+    return tracer
+
+
+def disable_tracing():
+    """Disable tracing."""
+    global TRACER  # pylint: disable=global-statement
+    TRACER = None
@@ -45,3 +45,68 @@ class DysonNotLoggedException(Exception):
     def __init__(self):
         """Dyson Not Logged Exception."""
         super(DysonNotLoggedException, self).__init__()
+
+
+class DysonCommandTimeoutException(Exception):
+    """Command not acknowledged by the device in time Exception."""
+
+    def __init__(self, serial, expected, timeout):
+        """Dyson command timeout Exception.
+
+        :param serial: Device serial
+        :param expected: Expected state fields
+        :param timeout: Timeout in seconds
+        """
+        super(DysonCommandTimeoutException, self).__init__()
+        self._serial = serial
+        self._expected = expected
+        self._timeout = timeout
+
+    @property
+    def serial(self):
+        """Return device serial."""
+        return self._serial
+
+    @property
+    def expected(self):
+        """Return expected state fields."""
+        return self._expected
+
+    @property
+    def timeout(self):
+        """Return timeout in seconds."""
+        return self._timeout
+
+    def __repr__(self):
+        """Return a String representation."""
+        return "Device {0} did not apply {1} within {2} seconds".format(
+            self._serial, self._expected, self._timeout)
+
+
+class DysonCommandNotTrackableException(Exception):
+    """Requested fields are not reported by the device state."""
+
+    def __init__(self, serial, fields):
+        """Dyson command not trackable Exception.
+
+        :param serial: Device serial
+        :param fields: STATE-SET fields which can not be tracked
+        """
+        super(DysonCommandNotTrackableException, self).__init__()
+        self._serial = serial
+        self._fields = fields
+
+    @property
+    def serial(self):
+        """Return device serial."""
+        return self._serial
+
+    @property
+    def fields(self):
+        """Return STATE-SET fields which can not be tracked."""
+        return self._fields
+
+    def __repr__(self):
+        """Return a String representation."""
+        return "Device {0} does not report {1}, command can not be " \
+               "acknowledged".format(self._serial, self._fields)
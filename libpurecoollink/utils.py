@@ -1,9 +1,19 @@
 """Utilities for Dyson Pure Hot+Cool link devices."""
 import json
 import base64
+import calendar
+import datetime
 from Crypto.Cipher import AES
 from .const import DYSON_PURE_HOT_COOL_LINK_TOUR, DYSON_360_EYE
 
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+TIMESTAMP_CACHE_SIZE = 64
+_EPOCH = datetime.datetime(1970, 1, 1)
+_TIMESTAMP_CACHE = {}
+_DIGITS = frozenset("0123456789")
+_CREDENTIALS_KEY = bytes(range(1, 32)) + b' '
+_CREDENTIALS_IV = b'\x00' * 16
+
 
 def support_heating(product_type):
     """Return True if device_model support heating mode, else False.
@@ -31,6 +41,12 @@ def printable_fields(fields):
         yield field[0]+"="+field[1]
 
 
+def pad(string):
+    """Pad string."""
+    length = 16 - len(string) % 16
+    return string + chr(length) * length
+
+
 def unpad(string):
     """Un pad string."""
     return string[:-ord(string[len(string) - 1:])]
@@ -41,18 +57,66 @@ def decrypt_password(encrypted_password):
 
     :param encrypted_password: Encrypted password
     """
-    key = b'\x01\x02\x03\x04\x05\x06\x07\x08\t\n\x0b\x0c\r\x0e\x0f\x10' \
-          b'\x11\x12\x13\x14\x15\x16\x17\x18\x19\x1a\x1b\x1c\x1d\x1e\x1f '
-    init_vector = b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00' \
-                  b'\x00\x00\x00\x00'
-    cipher = AES.new(key, AES.MODE_CBC, init_vector)
+    cipher = AES.new(_CREDENTIALS_KEY, AES.MODE_CBC, _CREDENTIALS_IV)
     json_password = json.loads(unpad(
         cipher.decrypt(base64.b64decode(encrypted_password)).decode('utf-8')))
     return json_password["apPasswordHash"]
 
 
+def encrypt_password(password):
+    """Encrypt password, as returned by the HTTPS API.
+
+    :param password: Password
+    """
+    cipher = AES.new(_CREDENTIALS_KEY, AES.MODE_CBC, _CREDENTIALS_IV)
+    return base64.b64encode(cipher.encrypt(pad(json.dumps(
+        {"apPasswordHash": password})).encode('utf-8'))).decode('utf-8')
+
+
 def is_360_eye_device(json_payload):
     """Return true if this json payload is a Dyson 360 Eye device."""
     if json_payload['ProductType'] == DYSON_360_EYE:
         return True
     return False
+
+
+def parse_timestamp(timestamp):
+    """Return epoch seconds of a timestamp ("2017-07-16T07:34:31Z").
+
+    Fixed-format parser, much faster than datetime.strptime. Last parsed
+    timestamps are cached.
+
+    :param timestamp: UTC timestamp
+    """
+    epoch = _TIMESTAMP_CACHE.get(timestamp)
+    if epoch is not None:
+        return epoch
+    if len(timestamp) == 20 and timestamp[19] == "Z" and \
+            timestamp[4] == timestamp[7] == "-" and timestamp[10] == "T" \
+            and timestamp[13] == timestamp[16] == ":":
+        fields = (timestamp[0:4], timestamp[5:7], timestamp[8:10],
+                  timestamp[11:13], timestamp[14:16], timestamp[17:19])
+        if all(_DIGITS.issuperset(field) for field in fields):
+            year, month, day, hour, minute, second = map(int, fields)
+            if 1 <= month <= 12 and \
+                    1 <= day <= calendar.monthrange(year, month)[1] and \
+                    hour <= 23 and minute <= 59 and second <= 59:
+                epoch = calendar.timegm((year, month, day, hour, minute,
+                                         second, 0, 0, 0))
+    if epoch is None:
+        # Unexpected format or invalid value, raise the same error as
+        # strptime
+        epoch = calendar.timegm(datetime.datetime.strptime(
+            timestamp, TIMESTAMP_FORMAT).utctimetuple())
+    if len(_TIMESTAMP_CACHE) >= TIMESTAMP_CACHE_SIZE:
+        _TIMESTAMP_CACHE.clear()
+    _TIMESTAMP_CACHE[timestamp] = epoch
+    return epoch
+
+
+def epoch_to_datetime(epoch):
+    """Return naive UTC datetime of epoch seconds.
+
+    :param epoch: Epoch seconds
+    """
+    return _EPOCH + datetime.timedelta(seconds=epoch)
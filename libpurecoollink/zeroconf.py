@@ -39,6 +39,8 @@ import netifaces
 from six import binary_type, indexbytes, int2byte, iteritems, text_type
 from six.moves import xrange
 
+from . import dyson_metrics
+
 __author__ = 'Paul Scott-Murphy, William McBrine'
 __maintainer__ = 'Jakub Stasiak <jakub@stasiak.at>'
 __version__ = '0.18.0'
@@ -1011,16 +1013,19 @@ class DNSCache(object):
 
     def __init__(self):
         self.cache = {}
+        self.size = 0
 
     def add(self, entry):
         """Adds an entry"""
         self.cache.setdefault(entry.key, []).append(entry)
+        self.size += 1
 
     def remove(self, entry):
         """Removes an entry"""
         try:
             list_ = self.cache[entry.key]
             list_.remove(entry)
+            self.size -= 1
         except (KeyError, ValueError):
             pass
 
@@ -1937,6 +1942,11 @@ class Zeroconf(QuietLogger):
         for record in msg.answers:
             self.update_record(now, record)
 
+        metrics = dyson_metrics.METRICS
+        if metrics is not None:
+            metrics.mdns_responses.inc()
+            metrics.mdns_cache_size.set(self.cache.size)
+
     def handle_query(self, msg, addr, port):
         """Deal with incoming query packets.  Provides a response if
         possible."""
@@ -2011,6 +2021,10 @@ class Zeroconf(QuietLogger):
                                   out, len(packet), packet)
             return
         log.debug('Sending %r (%d bytes) as %r...', out, len(packet), packet)
+        metrics = dyson_metrics.METRICS
+        if metrics is not None:
+            metrics.mdns_packets_sent.inc()
+            metrics.mdns_bytes_sent.inc(amount=len(packet))
         for s in self._respond_sockets:
             if self._GLOBAL_DONE:
                 return
@@ -36,6 +36,8 @@ setup(
     zip_safe=True,
     platforms='any',
     install_requires=REQUIRES,
+    extras_require={
+        'async': ['aiohttp>=3; python_version >= "3.5.3"']},
     test_suite='tests',
     keywords=['dyson', 'purecoollink', 'eye360', 'purehotcoollink'],
     classifiers=PROJECT_CLASSIFIERS,
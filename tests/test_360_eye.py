@@ -60,6 +60,8 @@ class TestDysonEye360Device(unittest.TestCase):
         device._add_network_device(network_device)
         device.state_data_available()
         connected = device.connect('192.168.1.1')
+        # Connection mocked, stop the paho network loop
+        self.addCleanup(device._mqtt.loop_stop)
         self.assertTrue(connected)
         self.assertEqual(mocked_connect.call_count, 1)
         mocked_connect.assert_called_with('192.168.1.1', 1883)
@@ -419,6 +421,7 @@ class TestDysonEye360Device(unittest.TestCase):
         self.assertEqual(self.message.reason, "UNKNOWN")
         self.assertEqual(self.message.time.strftime("%Y-%m-%dT%H:%M:%SZ"),
                          "2017-07-30T16:00:13Z")
+        self.assertEqual(self.message.epoch, 1501430413)
         self.assertEqual(self.message.__repr__(),
                          "Dyson360EyeGoodbye(reason=UNKNOWN,"
                          "time=2017-07-30 16:00:13)")
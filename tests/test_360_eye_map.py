@@ -0,0 +1,120 @@
+import base64
+import gzip
+import json
+import unittest
+
+from libpurecoollink.dyson_360_eye import Dyson360EyeMapGrid, \
+    Dyson360EyeMapData
+from libpurecoollink.dyson_360_eye_map import Dyson360EyeMapEngine, \
+    decode_map_content
+
+CLEAN_ID = "0e000000-4a47-3845-5548-454131323334"
+
+
+def _map_grid(width=4, height=3, grid_id="1", clean_id=CLEAN_ID):
+    return Dyson360EyeMapGrid(json.dumps({
+        "msg": "MAP-GRID",
+        "gridID": grid_id,
+        "resolution": 43,
+        "width": width,
+        "height": height,
+        "cleanId": clean_id,
+        "anchor": [1, 2],
+        "time": "2017-07-16T07:34:31Z"
+    }))
+
+
+def _map_data(tile, encoding="gzip", grid_id="1", clean_id=CLEAN_ID):
+    content = json.dumps(tile).encode("utf-8")
+    if encoding == "gzip":
+        content = gzip.compress(content)
+    return Dyson360EyeMapData(json.dumps({
+        "msg": "MAP-DATA",
+        "gridID": grid_id,
+        "cleanId": clean_id,
+        "data": {
+            "content-type": "application/json",
+            "content-encoding": encoding,
+            "content": base64.b64encode(content).decode("ascii")
+        },
+        "time": "2017-07-16T07:34:00Z"
+    }))
+
+
+class TestDyson360EyeMap(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_decode_map_content(self):
+        tile = {"x": 0, "y": 0, "width": 1, "cells": [3]}
+        self.assertEqual(decode_map_content(_map_data(tile)), tile)
+        self.assertEqual(decode_map_content(_map_data(tile, "identity")),
+                         tile)
+
+    def test_apply_map_data(self):
+        engine = Dyson360EyeMapEngine()
+        engine.on_message(_map_grid())
+        dyson_map = engine.get_map(CLEAN_ID, "1")
+        self.assertEqual(len(dyson_map.cells), 12)
+        self.assertEqual(dyson_map.anchor, (1, 2))
+        engine.on_message(_map_data({"x": 1, "y": 1, "width": 2,
+                                     "cells": [1, 2, 3, 4]}))
+        self.assertEqual([bytes(row) for row in dyson_map.rows()],
+                         [b"\x00\x00\x00\x00", b"\x00\x01\x02\x00",
+                          b"\x00\x03\x04\x00"])
+        # Tile partially outside of the grid
+        engine.on_message(_map_data({"x": 3, "y": 2, "width": 2,
+                                     "cells": [9, 9, 9, 9]}))
+        self.assertEqual(dyson_map.cell(3, 2), 9)
+        self.assertEqual(dyson_map.updates, 2)
+        self.assertIs(engine.get_map(CLEAN_ID, "1"), dyson_map)
+        self.assertEqual(dyson_map.__repr__(),
+                         "Dyson360EyeMap(grid_id=1,clean_id={0},width=4,"
+                         "height=3,updates=2)".format(CLEAN_ID))
+
+    def test_map_data_before_grid(self):
+        engine = Dyson360EyeMapEngine()
+        engine.on_message(_map_data({"width": 4, "cells": [5] * 4}))
+        self.assertIsNone(engine.get_map(CLEAN_ID, "1"))
+        dyson_map = engine.add_grid(_map_grid())
+        self.assertEqual(bytes(dyson_map.rows()[0]), b"\x05" * 4)
+
+    def test_invalid_map_data(self):
+        engine = Dyson360EyeMapEngine()
+        engine.on_message(_map_grid())
+        engine.on_message(_map_data({"width": 4}))
+        self.assertEqual(engine.get_map(CLEAN_ID, "1").updates, 0)
+
+    def test_remove_clean(self):
+        engine = Dyson360EyeMapEngine()
+        engine.on_message(_map_grid(grid_id="1"))
+        engine.on_message(_map_grid(grid_id="2"))
+        self.assertEqual(len(engine.maps(CLEAN_ID)), 2)
+        engine.remove_clean(CLEAN_ID)
+        self.assertEqual(engine.maps(), [])
+
+    def test_bounded_cleans(self):
+        engine = Dyson360EyeMapEngine(max_pending=2, max_cleans=2)
+        engine.add_grid(_map_grid(clean_id="clean-1"))
+        engine.add_data(_map_data({"cells": [1]}, clean_id="clean-2"))
+        engine.add_grid(_map_grid(clean_id="clean-1"))
+        engine.add_grid(_map_grid(clean_id="clean-3"))
+        # clean-2 is the oldest clean
+        self.assertEqual(len(engine.maps()), 2)
+        self.assertIsNotNone(engine.get_map("clean-1", "1"))
+        self.assertEqual(engine._pending, {})
+        for grid_id in ("1", "2", "3"):
+            engine.add_data(_map_data({"cells": [1]}, grid_id=grid_id,
+                                      clean_id="clean-3"))
+        self.assertEqual(list(engine._pending),
+                         [("clean-3", "2"), ("clean-3", "3")])
+
+    def test_decoder(self):
+        engine = Dyson360EyeMapEngine(
+            decoder=lambda map_data: {"cells": [7] * 12})
+        dyson_map = engine.add_grid(_map_grid())
+        engine.add_data(_map_data({}))
+        self.assertEqual(bytes(dyson_map.cells), bytes([7] * 12))
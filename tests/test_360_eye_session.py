@@ -0,0 +1,103 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from libpurecoollink.dyson_360_eye import Dyson360Eye, Dyson360EyeState, \
+    Dyson360EyeMapGlobal, Dyson360Goodbye
+from libpurecoollink.dyson_360_eye_session import \
+    Dyson360EyeSessionRecorder, Dyson360EyeSessionLog, \
+    Dyson360EyeSessionReplayer
+
+CLEAN_ID = "0e000000-4a47-3845-5548-454131323334"
+
+
+def _read(name):
+    with open("tests/data/vacuum/" + name, "r") as data_file:
+        return data_file.read()
+
+
+class TestDyson360EyeSession(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    @staticmethod
+    def _device_sample():
+        return Dyson360Eye({
+            "Active": True,
+            "Serial": "device-id-1",
+            "Name": "device-1",
+            "ScaleUnit": "SU01",
+            "Version": "11.3.5.10",
+            "LocalCredentials": "1/aJ5t52WvAfn+z+fjDuef86kQDQPefbQ6/70ZGysII1K"
+                                "e1i0ZHakFH84DZuxsSQ4KTT2vbCm7uYeTORULKLKQ==",
+            "AutoUpdate": True,
+            "NewVersionAvailable": False,
+            "ProductType": "N223"
+        })
+
+    def _record(self):
+        recorder = Dyson360EyeSessionRecorder(self.directory)
+        # No clean session yet: not recorded
+        recorder.on_raw_message(_read("goodbye.json"), 1.0)
+        recorder.on_raw_message(_read("state-change.json"), 10.0)
+        recorder.on_raw_message(_read("map-global.json"), 11.0)
+        recorder.on_raw_message(_read("goodbye.json"), 13.0)
+        self.assertEqual(recorder.clean_id, CLEAN_ID)
+        recorder.close()
+        return recorder.session_path(CLEAN_ID)
+
+    def test_record(self):
+        log_path = self._record()
+        session_log = Dyson360EyeSessionLog(log_path)
+        self.assertEqual(len(session_log), 3)
+        self.assertEqual(session_log[1][0], 11.0)
+        self.assertEqual(session_log[-1][1].decode("utf-8"),
+                         _read("goodbye.json"))
+        self.assertEqual(session_log.seek_time(10.5), 1)
+        self.assertEqual(session_log.seek_time(20), 3)
+        self.assertEqual(list(session_log.records(3)), [])
+        self.assertRaises(IndexError, session_log.__getitem__, 3)
+        self.assertRaises(IndexError, session_log.__getitem__, -4)
+
+    def test_record_invalid_message(self):
+        recorder = Dyson360EyeSessionRecorder(self.directory)
+        recorder.on_raw_message('{"msg": "X", "cleanId": "a/b"}', 1.0)
+        recorder.on_raw_message("{", 2.0)
+        recorder.close()
+        session_log = Dyson360EyeSessionLog(recorder.session_path("a/b"))
+        self.assertEqual(session_log[1], (2.0, b"{"))
+
+    def test_rebuild_index(self):
+        log_path = self._record()
+        os.remove(log_path[:-4] + ".idx")
+        session_log = Dyson360EyeSessionLog(log_path)
+        self.assertEqual([received for received, _ in session_log.records()],
+                         [10.0, 11.0, 13.0])
+
+    def test_record_device_messages(self):
+        device = self._device_sample()
+        recorder = Dyson360EyeSessionRecorder(self.directory)
+        device.add_raw_message_listener(recorder.on_raw_message)
+        Dyson360EyeSessionReplayer(
+            Dyson360EyeSessionLog(self._record()), device).replay(None)
+        device.remove_raw_message_listener(recorder.on_raw_message)
+        recorder.close()
+        self.assertEqual(len(Dyson360EyeSessionLog(
+            recorder.session_path(CLEAN_ID))), 6)
+
+    def test_replay(self):
+        messages = []
+        device = self._device_sample()
+        device.add_message_listener(messages.append)
+        replayer = Dyson360EyeSessionReplayer(
+            Dyson360EyeSessionLog(self._record()), device)
+        self.assertEqual(replayer.replay(speed=1000), 3)
+        self.assertTrue(isinstance(messages[0], Dyson360EyeState))
+        self.assertTrue(isinstance(messages[1], Dyson360EyeMapGlobal))
+        self.assertTrue(isinstance(messages[2], Dyson360Goodbye))
+        self.assertEqual(device.state.clean_id, CLEAN_ID)
+        self.assertEqual(replayer.replay(speed=None, start=2), 1)
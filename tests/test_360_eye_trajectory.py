@@ -0,0 +1,69 @@
+import json
+import unittest
+
+from libpurecoollink.dyson_360_eye import Dyson360EyeMapGlobal
+from libpurecoollink.dyson_360_eye_trajectory import \
+    Dyson360EyeTrajectory, Dyson360EyeTrajectoryStore
+
+
+def _map_global(clean_id, position_x, position_y, second):
+    return Dyson360EyeMapGlobal(json.dumps({
+        "msg": "MAP-GLOBAL",
+        "gridID": "1",
+        "x": position_x,
+        "y": position_y,
+        "angle": -180,
+        "cleanId": clean_id,
+        "time": "2017-07-16T07:31:{0:02d}Z".format(second)
+    }))
+
+
+class TestDyson360EyeTrajectory(unittest.TestCase):
+    def setUp(self):
+        self.trajectory = Dyson360EyeTrajectory("clean-1")
+        for position_x, position_y, epoch in [(0, 0, 0), (3, 4, 1),
+                                              (3, 4, 1), (3, 10, 3),
+                                              (0, 10, 4)]:
+            self.trajectory.append(position_x, position_y, 90, epoch)
+
+    def tearDown(self):
+        pass
+
+    def test_distance(self):
+        self.assertEqual(len(self.trajectory), 5)
+        self.assertEqual(self.trajectory.distance(), 14.0)
+        self.assertEqual(Dyson360EyeTrajectory("clean-2").distance(), 0)
+
+    def test_coverage_area(self):
+        self.assertEqual(self.trajectory.coverage_area(), 4)
+        self.assertEqual(self.trajectory.coverage_area(5), 50)
+
+    def test_speed_profile(self):
+        self.assertEqual(list(self.trajectory.speed_profile()),
+                         [5.0, 0.0, 3.0, 3.0])
+
+    def test_downsample(self):
+        trajectory = self.trajectory.downsample(3)
+        self.assertEqual(list(trajectory.export()["x"]), [0, 3, 0])
+        self.assertEqual(list(trajectory.export()["epoch"]), [0, 3, 4])
+        trajectory = self.trajectory.downsample(2)
+        self.assertEqual(list(trajectory.export()["epoch"]), [0, 1, 4])
+        self.assertEqual(len(Dyson360EyeTrajectory("c").downsample(2)), 0)
+
+    def test_store(self):
+        store = Dyson360EyeTrajectoryStore(max_cleans=2)
+        store.on_message(_map_global("clean-1", 0, 0, 35))
+        store.on_message(_map_global("clean-1", 0, 2, 37))
+        store.on_message(_map_global("clean-2", 0, 0, 35))
+        store.on_message(None)
+        trajectory = store.get("clean-1")
+        self.assertEqual(list(trajectory.export()["epoch"]),
+                         [1500190295, 1500190297])
+        self.assertEqual(trajectory.__repr__(),
+                         "Dyson360EyeTrajectory(clean_id=clean-1,"
+                         "positions=2)")
+        # Lookups do not create trajectories
+        self.assertIsNone(store.get("unknown"))
+        self.assertEqual(store.clean_ids, ["clean-1", "clean-2"])
+        store.on_message(_map_global("clean-3", 0, 0, 35))
+        self.assertEqual(store.clean_ids, ["clean-2", "clean-3"])
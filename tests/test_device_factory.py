@@ -0,0 +1,64 @@
+import unittest
+
+from libpurecoollink.device_factory import DeviceFactory
+from libpurecoollink.dyson_360_eye import Dyson360Eye
+from libpurecoollink.dyson_pure_cool_link import DysonPureCoolLink
+from libpurecoollink.dyson_pure_hotcool_link import DysonPureHotCoolLink
+
+
+def _manifest_entry(serial, product_type):
+    return {
+        "Active": True,
+        "Serial": serial,
+        "Name": serial,
+        "ScaleUnit": "SU01",
+        "Version": "21.03.08",
+        "LocalCredentials": "1/aJ5t52WvAfn+z+fjDuef86kQDQPefbQ6/70ZGysII1K"
+                            "e1i0ZHakFH84DZuxsSQ4KTT2vbCm7uYeTORULKLKQ==",
+        "AutoUpdate": True,
+        "NewVersionAvailable": False,
+        "ProductType": product_type
+    }
+
+
+class CustomDevice(DysonPureCoolLink):
+    pass
+
+
+class TestDeviceFactory(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_load_manifest(self):
+        devices = DeviceFactory().load_manifest("tests/data/manifest.json")
+        self.assertEqual(len(devices), 4)
+        self.assertEqual(type(devices[0]), DysonPureCoolLink)
+        self.assertEqual(type(devices[1]), DysonPureCoolLink)
+        self.assertEqual(type(devices[2]), DysonPureHotCoolLink)
+        self.assertEqual(type(devices[3]), Dyson360Eye)
+        self.assertEqual(devices[0].serial, "device-id-1")
+        self.assertEqual(devices[0].credentials, "password1")
+        self.assertFalse(devices[2].active)
+
+    def test_create_devices_from_iterator(self):
+        manifest = (_manifest_entry("device-{0}".format(idx), "475")
+                    for idx in range(3))
+        devices = DeviceFactory().create_devices(manifest)
+        self.assertEqual([device.serial for device in devices],
+                         ["device-0", "device-1", "device-2"])
+
+    def test_unknown_product_type(self):
+        device = DeviceFactory().create(_manifest_entry("device-1", "XXX"))
+        self.assertEqual(type(device), DysonPureCoolLink)
+
+    def test_register(self):
+        factory = DeviceFactory()
+        factory.register("475", CustomDevice)
+        self.assertEqual(factory.device_class("475"), CustomDevice)
+        device = factory.create(_manifest_entry("device-1", "475"))
+        self.assertTrue(isinstance(device, CustomDevice))
+        factory.unregister("475")
+        self.assertEqual(factory.device_class("475"), DysonPureCoolLink)
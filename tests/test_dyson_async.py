@@ -0,0 +1,155 @@
+import asyncio
+import json
+import unittest
+
+import aiohttp
+
+from libpurecoollink.dyson_async import AsyncDysonAccount
+from libpurecoollink.dyson_pure_cool_link import DysonPureCoolLink
+from libpurecoollink.dyson_360_eye import Dyson360Eye
+from libpurecoollink.exceptions import DysonNotLoggedException
+
+
+class MockResponse:
+    def __init__(self, json_body, status=200, delay=0, timeout=None):
+        self._json = json_body
+        self.status = status
+        self._delay = delay
+        self._timeout = timeout
+
+    async def json(self):
+        return self._json
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise aiohttp.ClientResponseError(None, (), status=self.status)
+
+    async def __aenter__(self):
+        # Like aiohttp, the request fails if the response is not received
+        # within the total timeout
+        if self._delay:
+            await asyncio.wait_for(asyncio.sleep(self._delay),
+                                   self._timeout.total)
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+class MockSession:
+    def __init__(self, login_status=200, delay=0, manifest_status=200):
+        self.posts = []
+        self.gets = []
+        self._login_status = login_status
+        self._manifest_status = manifest_status
+        self._delay = delay
+        self.closed = False
+
+    def post(self, url, data=None, ssl=None, timeout=None):
+        self.posts.append((url, data, ssl, timeout))
+        return MockResponse({'Account': 'account', 'Password': 'password'},
+                            self._login_status, self._delay, timeout)
+
+    def get(self, url, auth=None, ssl=None, timeout=None):
+        self.gets.append((url, auth, ssl, timeout))
+        with open("tests/data/manifest.json", "r") as manifest:
+            return MockResponse(json.load(manifest), self._manifest_status,
+                                self._delay, timeout)
+
+    async def close(self):
+        self.closed = True
+
+
+def _run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class TestAsyncDysonAccount(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_login(self):
+        session = MockSession()
+        account = AsyncDysonAccount("email", "password", "language",
+                                    session=session)
+        self.assertTrue(_run(account.login()))
+        self.assertTrue(account.logged)
+        self.assertEqual(session.posts[0][0],
+                         "https://api.cp.dyson.com/v1/userregistration/"
+                         "authenticate?country=language")
+        self.assertEqual(session.posts[0][1],
+                         {"Email": "email", "Password": "password"})
+
+    def test_login_failed(self):
+        account = AsyncDysonAccount("email", "password", "language",
+                                    session=MockSession(401))
+        self.assertFalse(_run(account.login()))
+        self.assertFalse(account.logged)
+
+    def test_not_logged(self):
+        account = AsyncDysonAccount("email", "password", "language",
+                                    session=MockSession())
+        self.assertRaises(DysonNotLoggedException, _run, account.devices())
+
+    def test_list_devices_unauthorized(self):
+        account = AsyncDysonAccount("email", "password", "language",
+                                    session=MockSession(manifest_status=401))
+        self.assertTrue(_run(account.login()))
+        self.assertRaises(DysonNotLoggedException, _run, account.devices())
+        self.assertFalse(account.logged)
+
+    def test_list_devices_error(self):
+        account = AsyncDysonAccount("email", "password", "language",
+                                    session=MockSession(manifest_status=500))
+        self.assertTrue(_run(account.login()))
+        with self.assertRaises(aiohttp.ClientResponseError) as context:
+            _run(account.devices())
+        self.assertEqual(context.exception.status, 500)
+        self.assertTrue(account.logged)
+
+    def test_list_devices(self):
+        session = MockSession()
+
+        async def list_devices():
+            async with AsyncDysonAccount("email", "password", "language",
+                                         session=session) as account:
+                await account.login()
+                return await account.devices()
+
+        devices = _run(list_devices())
+        self.assertEqual(len(devices), 4)
+        self.assertTrue(isinstance(devices[0], DysonPureCoolLink))
+        self.assertTrue(isinstance(devices[3], Dyson360Eye))
+        self.assertEqual(session.gets[0][1].login, "account")
+        # Timeout applied to requests of the given session
+        self.assertEqual(session.gets[0][3].total, 10)
+        # Given session is not closed by the account
+        self.assertFalse(session.closed)
+
+    def test_timeout(self):
+        session = MockSession(delay=5)
+        account = AsyncDysonAccount("email", "password", "language",
+                                    session=session, timeout=0.01)
+        self.assertRaises(asyncio.TimeoutError, _run, account.login())
+        self.assertEqual(session.posts[0][3].total, 0.01)
+        self.assertFalse(account.logged)
+
+    def test_cancel(self):
+        account = AsyncDysonAccount("email", "password", "language",
+                                    session=MockSession(delay=60))
+
+        async def cancel_login():
+            task = asyncio.ensure_future(account.login())
+            await asyncio.sleep(0.01)
+            task.cancel()
+            await task
+
+        self.assertRaises(asyncio.CancelledError, _run, cancel_login())
+        self.assertFalse(account.logged)
@@ -0,0 +1,299 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import Mock
+
+from libpurecoollink.device_factory import DeviceFactory
+from libpurecoollink.dyson_bridge import DysonMqttBridge, normalize
+from libpurecoollink.dyson_pure_state import DysonPureCoolState, \
+    DysonPureHotCoolState, DysonEnvironmentalSensorState
+from libpurecoollink.dyson_simulator import SimulatedBroker, \
+    SimulatedPureCoolLink
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+
+
+def _fixture(*path):
+    with open(os.path.join(DATA, *path), "r") as payload:
+        return payload.read()
+
+
+def _sensor_state(humidity):
+    return DysonEnvironmentalSensorState(json.dumps({
+        "msg": "ENVIRONMENTAL-CURRENT-SENSOR-DATA",
+        "time": "2017-06-17T23:05:49.001Z",
+        "data": {"tact": "2967", "hact": "{0:04d}".format(humidity),
+                 "pact": "0004", "vact": "0005", "sltm": "OFF"}
+    }))
+
+
+class _Info:
+    def __init__(self, mid, return_code, published):
+        self.mid = mid
+        self.rc = return_code  # pylint: disable=invalid-name
+        self.published = published
+
+    def wait_for_publish(self, timeout=None):
+        pass
+
+    def is_published(self):
+        return self.published
+
+
+class _Upstream:
+    """Upstream client, publications fail when disconnected."""
+
+    def __init__(self):
+        self.connected = True
+        self.messages = []
+        self.lock = threading.Lock()
+        # Number of publications accepted before a failure
+        self.fail_after = None
+        # Return code of failed publications (queue full by default)
+        self.fail_code = 15
+        # Publications not acknowledged until acknowledge() when True
+        self.hold_acks = False
+        self.held = []
+        self.mid = 0
+
+    def is_connected(self):
+        return self.connected
+
+    def publish(self, topic, payload=None, qos=0):
+        with self.lock:
+            self.mid += 1
+            if not self.connected:
+                return _Info(self.mid, 4, False)
+            if self.fail_after is not None:
+                if self.fail_after == 0:
+                    return _Info(self.mid, self.fail_code, False)
+                self.fail_after -= 1
+            self.messages.append((topic, json.loads(payload.decode())))
+            info = _Info(self.mid, 0, not self.hold_acks)
+            if self.hold_acks:
+                self.held.append(info)
+            return info
+
+    def acknowledge(self):
+        with self.lock:
+            for info in self.held:
+                info.published = True
+            self.held = []
+
+    def humidities(self):
+        with self.lock:
+            return [payload["humidity"] for _, payload in self.messages]
+
+
+def _wait(condition):
+    for _ in range(500):
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class TestDysonBridge(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "bridge.queue")
+        self.upstream = _Upstream()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _bridge(self, **kwargs):
+        kwargs.setdefault("flush_interval", 0.01)
+        kwargs.setdefault("retry_interval", 0.01)
+        bridge = DysonMqttBridge(self.upstream, self.path, **kwargs)
+        self.addCleanup(bridge.close)
+        return bridge
+
+    def test_normalize(self):
+        self.assertIsNone(normalize("device-1", "475", Mock(), 1))
+        kind, payload = normalize("device-1", "455", DysonPureHotCoolState(
+            _fixture("state_hot.json")), 1.5)
+        self.assertEqual(kind, "state")
+        self.assertEqual(json.loads(payload.decode()), {
+            "serial": "device-1", "product_type": "455", "time": 1.5,
+            "fan_mode": "AUTO", "fan_state": "FAN", "night_mode": "ON",
+            "speed": "AUTO", "oscillation": "OFF", "filter_life": 2087,
+            "quality_target": 4, "standby_monitoring": "ON", "tilt": "OK",
+            "focus_mode": "ON", "heat_target": 295.0, "heat_mode": "HEAT",
+            "heat_state": "HEAT"})
+        kind, payload = normalize("device-1", "475", _sensor_state(54), 2)
+        self.assertEqual(kind, "environment")
+        self.assertEqual(payload, b'{"serial":"device-1","product_type":'
+                                  b'"475","time":2,"humidity":54,'
+                                  b'"volatil_organic_compounds":5,'
+                                  b'"temperature":296.7,"dust":4,'
+                                  b'"sleep_timer":0}')
+
+    def test_publish(self):
+        bridge = self._bridge()
+        self.assertTrue(bridge.add("device-1", "475", _sensor_state(50), 1))
+        self.assertTrue(bridge.add("device-1", "475", DysonPureCoolState(
+            _fixture("state.json")), 2))
+        self.assertFalse(bridge.add("device-1", "475", Mock(), 3))
+        self.assertTrue(_wait(lambda: bridge.published == 2))
+        self.assertEqual([topic for topic, _ in self.upstream.messages],
+                         ["dyson/device-1/environment",
+                          "dyson/device-1/state"])
+        self.assertEqual(self.upstream.messages[1][1]["fan_mode"], "AUTO")
+        self.assertEqual(bridge.queued, 0)
+
+    def test_deduplicate(self):
+        bridge = self._bridge(prefix="home")
+        self.assertTrue(bridge.add("device-1", "475", _sensor_state(50), 1))
+        self.assertFalse(bridge.add("device-1", "475", _sensor_state(50), 2))
+        self.assertTrue(bridge.add("device-2", "475", _sensor_state(50), 2))
+        self.assertTrue(bridge.add("device-1", "475", _sensor_state(51), 3))
+        self.assertTrue(_wait(lambda: bridge.published == 3))
+        self.assertEqual(bridge.deduplicated, 1)
+        self.assertEqual([topic for topic, _ in self.upstream.messages],
+                         ["home/device-1/environment",
+                          "home/device-2/environment",
+                          "home/device-1/environment"])
+
+    def test_batch_size(self):
+        bridge = self._bridge(batch_size=3, flush_interval=60)
+        bridge.add("device-1", "475", _sensor_state(1), 1)
+        bridge.add("device-1", "475", _sensor_state(2), 2)
+        time.sleep(0.05)
+        self.assertEqual(bridge.published, 0)
+        bridge.add("device-1", "475", _sensor_state(3), 3)
+        self.assertTrue(_wait(lambda: bridge.published == 3))
+
+    def test_outage(self):
+        bridge = self._bridge()
+        self.upstream.connected = False
+        for humidity in range(5):
+            bridge.add("device-1", "475", _sensor_state(humidity), humidity)
+        self.assertTrue(_wait(lambda: bridge.queue_size == 5))
+        self.assertEqual(bridge.published, 0)
+        self.upstream.connected = True
+        bridge.add("device-1", "475", _sensor_state(5), 5)
+        self.assertTrue(_wait(lambda: bridge.published == 6))
+        # Queued messages first, in order
+        self.assertEqual(self.upstream.humidities(), list(range(6)))
+        self.assertEqual(bridge.queue_size, 0)
+        self.assertEqual(bridge.queued, 5)
+
+    def test_retry_queue(self):
+        bridge = self._bridge()
+        self.upstream.connected = False
+        bridge.add("device-1", "475", _sensor_state(1), 1)
+        self.assertTrue(_wait(lambda: bridge.queue_size == 1))
+        # Queued messages are published without new messages
+        self.upstream.connected = True
+        self.assertTrue(_wait(lambda: bridge.published == 1))
+
+    def test_partial_failure(self):
+        bridge = self._bridge(batch_size=4, flush_interval=60)
+        self.upstream.fail_after = 2
+        for humidity in range(4):
+            bridge.add("device-1", "475", _sensor_state(humidity), humidity)
+        self.assertTrue(_wait(lambda: bridge.queue_size == 2))
+        self.assertEqual(bridge.published, 2)
+        self.upstream.fail_after = None
+        self.assertTrue(_wait(lambda: bridge.published == 4))
+        self.assertEqual(self.upstream.humidities(), [0, 1, 2, 3])
+
+    def test_delayed_ack(self):
+        bridge = self._bridge(publish_timeout=0.01)
+        self.upstream.hold_acks = True
+        for humidity in range(3):
+            bridge.add("device-1", "475", _sensor_state(humidity), humidity)
+        self.assertTrue(_wait(lambda: bridge.in_flight == 3))
+        # Not acknowledged in time, still delivered by the client: not
+        # queued again
+        self.assertEqual(bridge.published, 0)
+        self.assertEqual(bridge.queue_size, 0)
+        self.assertEqual(bridge.queued, 0)
+        self.upstream.acknowledge()
+        self.assertTrue(_wait(lambda: bridge.published == 3))
+        self.assertEqual(bridge.in_flight, 0)
+        self.assertEqual(self.upstream.humidities(), [0, 1, 2])
+
+    def test_not_connected(self):
+        # QoS 1 messages are kept by the client while disconnected
+        bridge = self._bridge()
+        self.upstream.hold_acks = True
+        self.upstream.fail_after = 0
+        self.upstream.fail_code = 4
+        bridge.add("device-1", "475", _sensor_state(1), 1)
+        self.assertTrue(_wait(lambda: bridge.in_flight == 1))
+        self.assertEqual(bridge.queue_size, 0)
+        bridge.close()
+        # QoS 0 messages are dropped by the client
+        bridge = self._bridge(qos=0)
+        bridge.add("device-1", "475", _sensor_state(2), 2)
+        self.assertTrue(_wait(lambda: bridge.queue_size == 1))
+        self.assertEqual(bridge.in_flight, 0)
+
+    def test_closed(self):
+        bridge = self._bridge()
+        bridge.close()
+        self.assertFalse(bridge.add("device-1", "475", _sensor_state(1), 1))
+        self.assertEqual(bridge.deduplicated, 0)
+        # Not recorded as last published values
+        self.assertEqual(bridge._last_values, {})
+
+    def test_bounded_queue(self):
+        bridge = self._bridge(queue_capacity=3)
+        self.upstream.connected = False
+        for humidity in range(5):
+            bridge.add("device-1", "475", _sensor_state(humidity), humidity)
+        self.assertTrue(_wait(lambda: bridge.queued == 5))
+        self.assertEqual(bridge.queue_size, 3)
+        self.assertEqual(bridge.dropped, 2)
+        self.upstream.connected = True
+        self.assertTrue(_wait(lambda: bridge.published == 3))
+        self.assertEqual(self.upstream.humidities(), [2, 3, 4])
+
+    def test_message_too_long(self):
+        bridge = self._bridge(slot_size=64)
+        self.upstream.connected = False
+        bridge.add("device-1", "475", _sensor_state(1), 1)
+        self.assertTrue(_wait(lambda: bridge.dropped == 1))
+        self.assertEqual(bridge.queue_size, 0)
+
+    def test_max_pending(self):
+        bridge = self._bridge(max_pending=1, batch_size=10,
+                              flush_interval=60)
+        self.assertTrue(bridge.add("device-1", "475", _sensor_state(1), 1))
+        self.assertFalse(bridge.add("device-1", "475", _sensor_state(2), 2))
+        self.assertEqual(bridge.dropped, 1)
+
+    def test_persistent_queue(self):
+        self.upstream.connected = False
+        bridge = DysonMqttBridge(self.upstream, self.path, flush_interval=60)
+        bridge.add("device-1", "475", _sensor_state(1), 1)
+        bridge.close()
+        self.assertFalse(bridge.add("device-1", "475", _sensor_state(2), 2))
+        self.upstream.connected = True
+        bridge = self._bridge()
+        self.assertEqual(bridge.queue_size, 1)
+        self.assertTrue(_wait(lambda: bridge.published == 1))
+        self.assertEqual(self.upstream.humidities(), [1])
+
+    def test_attach(self):
+        bridge = self._bridge()
+        broker = SimulatedBroker()
+        simulated = broker.add_device(SimulatedPureCoolLink("device-1"))
+        device = DeviceFactory().create(simulated.json_body())
+        device.client_factory = broker.client
+        bridge.attach(device)
+        self.assertTrue(device.connect("127.0.0.1"))
+        self.addCleanup(device.disconnect)
+        self.assertTrue(_wait(lambda: bridge.published == 2))
+        self.assertEqual(sorted(topic for topic, _ in
+                                self.upstream.messages),
+                         ["dyson/device-1/environment",
+                          "dyson/device-1/state"])
+        self.assertEqual(self.upstream.messages[0][1]["product_type"],
+                         "475")
@@ -0,0 +1,219 @@
+import json
+import time
+import unittest
+from unittest.mock import Mock
+
+from libpurecoollink.const import FanMode, FanSpeed, Oscillation, \
+    NightMode, HeatMode
+from libpurecoollink.dyson_command import DysonCommandCoalescer, \
+    DysonCommandTracker, LatencyHistogram
+from libpurecoollink.dyson_pure_cool_link import DysonPureCoolLink
+from libpurecoollink.dyson_pure_hotcool_link import DysonPureHotCoolLink
+from libpurecoollink.dyson_pure_state import DysonPureCoolState, \
+    DysonPureHotCoolState
+from libpurecoollink.exceptions import DysonCommandTimeoutException, \
+    DysonCommandNotTrackableException
+
+
+def _device(device_class=DysonPureCoolLink, product_type="475"):
+    device = device_class({
+        "Active": True,
+        "Serial": "device-id-1",
+        "Name": "device-1",
+        "ScaleUnit": "SU01",
+        "Version": "21.03.08",
+        "LocalCredentials": "1/aJ5t52WvAfn+z+fjDuef86kQDQPefbQ6/70ZGysII1K"
+                            "e1i0ZHakFH84DZuxsSQ4KTT2vbCm7uYeTORULKLKQ==",
+        "AutoUpdate": True,
+        "NewVersionAvailable": False,
+        "ProductType": product_type
+    })
+    device.connected = True
+    device._mqtt = Mock()
+    return device
+
+
+class TestDysonCommandCoalescer(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_merge(self):
+        sent = []
+        coalescer = DysonCommandCoalescer(sent.append,
+                                          lambda: {"fnsp": "0001"}, 10)
+        coalescer.submit({"fnsp": "0003"})
+        coalescer.submit({"oson": "ON", "sltm": "STET"})
+        coalescer.submit({"fnsp": "0005"})
+        self.assertEqual(coalescer.pending,
+                         {"fnsp": "0005", "oson": "ON", "sltm": "STET"})
+        coalescer.flush()
+        self.assertEqual(sent, [{"fnsp": "0005", "oson": "ON"}])
+        self.assertEqual(coalescer.pending, {})
+
+    def test_skip_unchanged(self):
+        sent = []
+        coalescer = DysonCommandCoalescer(sent.append,
+                                          lambda: {"fnsp": "0001"}, 10)
+        coalescer.submit({"fnsp": "0001"})
+        coalescer.close()
+        self.assertEqual(sent, [])
+
+    def test_revert_in_flight(self):
+        sent = []
+        current = {"fnsp": "0001"}
+        coalescer = DysonCommandCoalescer(sent.append, lambda: current, 10)
+        coalescer.submit({"fnsp": "0005"})
+        coalescer.flush()
+        # Not reported by the device yet: the revert must be sent
+        coalescer.submit({"fnsp": "0001"})
+        coalescer.flush()
+        self.assertEqual(sent, [{"fnsp": "0005"}, {"fnsp": "0001"}])
+        coalescer.on_state({"fnsp": "0001"})
+        coalescer.submit({"fnsp": "0001"})
+        coalescer.flush()
+        self.assertEqual(len(sent), 2)
+
+    def test_in_flight_timeout(self):
+        sent = []
+        coalescer = DysonCommandCoalescer(sent.append,
+                                          lambda: {"fnsp": "0001"}, 10, 0)
+        coalescer.submit({"fnsp": "0005"})
+        coalescer.flush()
+        coalescer.submit({"fnsp": "0001"})
+        coalescer.flush()
+        self.assertEqual(sent, [{"fnsp": "0005"}])
+
+    def test_window(self):
+        sent = []
+        coalescer = DysonCommandCoalescer(sent.append, window=0.01)
+        self.assertEqual(coalescer.window, 0.01)
+        coalescer.submit({"fnsp": "0001"})
+        coalescer.submit({"nmod": "ON"})
+        for _ in range(100):
+            if sent:
+                break
+            time.sleep(0.01)
+        self.assertEqual(sent, [{"fnsp": "0001", "nmod": "ON"}])
+
+
+class TestDeviceCommandCoalescing(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_set_configuration(self):
+        device = _device()
+        with open("tests/data/state.json", "r") as state_file:
+            device.state = DysonPureCoolState(state_file.read())
+        device.enable_command_coalescing(10)
+        device.set_configuration(fan_speed=FanSpeed.FAN_SPEED_3)
+        device.set_configuration(oscillation=Oscillation.OSCILLATION_ON)
+        # Already the current value
+        device.set_configuration(night_mode=NightMode.NIGHT_MODE_ON)
+        device.set_configuration(fan_mode=FanMode.FAN, sleep_timer=0)
+        self.assertEqual(device._mqtt.publish.call_count, 0)
+        device.disable_command_coalescing()
+        self.assertEqual(device._mqtt.publish.call_count, 1)
+        payload = json.loads(device._mqtt.publish.call_args[0][1])
+        self.assertEqual(payload["msg"], "STATE-SET")
+        self.assertEqual(payload["data"], {"fnsp": "0003", "oson": "ON",
+                                           "fmod": "FAN", "sltm": 0})
+        # Not coalesced anymore
+        device.set_configuration(fan_speed=FanSpeed.FAN_SPEED_3)
+        self.assertEqual(device._mqtt.publish.call_count, 2)
+
+    def test_set_configuration_hot(self):
+        device = _device(DysonPureHotCoolLink, "455")
+        with open("tests/data/state_hot.json", "r") as state_file:
+            device.state = DysonPureHotCoolState(state_file.read())
+        device.enable_command_coalescing(10)
+        device.set_configuration(heat_mode=HeatMode.HEAT_OFF)
+        device.set_configuration(heat_target="2950")
+        device.disable_command_coalescing()
+        payload = json.loads(device._mqtt.publish.call_args[0][1])
+        self.assertEqual(payload["data"], {"hmod": "OFF"})
+
+
+class TestDysonCommandTracker(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_histogram(self):
+        histogram = LatencyHistogram((0.1, 1))
+        self.assertIsNone(histogram.mean)
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(value)
+        self.assertEqual(histogram.buckets,
+                         [(0.1, 2), (1, 1), (float("inf"), 1)])
+        self.assertEqual(histogram.count, 4)
+        self.assertEqual(histogram.sum, 3.65)
+
+    def test_acknowledged(self):
+        tracker = DysonCommandTracker("device-id-1")
+        future = tracker.track({"fnsp": "0003"}, {"fnsp": "0001"})
+        self.assertEqual(tracker.pending, 1)
+        tracker.on_state({"fnsp": "0001"})
+        self.assertFalse(future.done())
+        tracker.on_state({"fnsp": "0003", "oson": "ON"})
+        self.assertTrue(future.result(0) >= 0)
+        self.assertEqual(tracker.pending, 0)
+        self.assertEqual(tracker.histogram.count, 1)
+
+    def test_already_applied(self):
+        tracker = DysonCommandTracker("device-id-1")
+        future = tracker.track({"fnsp": "0003"}, {"fnsp": "0003"})
+        self.assertEqual(future.result(0), 0.0)
+        self.assertEqual(tracker.pending, 0)
+
+    def test_timeout(self):
+        tracker = DysonCommandTracker("device-id-1")
+        future = tracker.track({"fnsp": "0003"}, timeout=0.01)
+        exception = future.exception(5)
+        self.assertTrue(isinstance(exception, DysonCommandTimeoutException))
+        self.assertEqual(exception.serial, "device-id-1")
+        self.assertEqual(exception.expected, {"fnsp": "0003"})
+        self.assertEqual(exception.timeout, 0.01)
+        self.assertEqual(tracker.pending, 0)
+
+    def test_device_set_configuration_with_ack(self):
+        device = _device()
+        with open("tests/data/state.json", "r") as state_file:
+            payload = json.loads(state_file.read())
+        device.state = DysonPureCoolState(json.dumps(payload))
+        shared = LatencyHistogram()
+        device.command_tracker.histogram = shared
+        future = device.set_configuration_with_ack(
+            fan_speed=FanSpeed.FAN_SPEED_3,
+            oscillation=Oscillation.OSCILLATION_ON)
+        self.assertEqual(device._mqtt.publish.call_count, 1)
+        self.assertFalse(future.done())
+        payload["msg"] = "STATE-CHANGE"
+        payload["product-state"]["fnsp"] = ["AUTO", "0003"]
+        payload["product-state"]["oson"] = ["OFF", "ON"]
+        message = Mock()
+        message.payload.decode.return_value = json.dumps(payload)
+        DysonPureCoolLink.on_message(None, device, message)
+        self.assertTrue(future.result(0) >= 0)
+        self.assertEqual(shared.count, 1)
+
+    def test_device_set_configuration_not_trackable(self):
+        device = _device()
+        with open("tests/data/state.json", "r") as state_file:
+            device.state = DysonPureCoolState(state_file.read())
+        with self.assertRaises(DysonCommandNotTrackableException) as context:
+            device.set_configuration_with_ack(fan_speed=FanSpeed.FAN_SPEED_3,
+                                              sleep_timer=10)
+        self.assertEqual(context.exception.serial, "device-id-1")
+        self.assertEqual(context.exception.fields, ["sltm"])
+        self.assertTrue("sltm" in context.exception.__repr__())
+        # Nothing sent
+        self.assertEqual(device._mqtt.publish.call_count, 0)
+        self.assertEqual(device.command_tracker.pending, 0)
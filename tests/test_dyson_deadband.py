@@ -0,0 +1,148 @@
+import json
+import unittest
+from unittest.mock import Mock
+
+from libpurecoollink.dyson_deadband import Deadband, DysonDeadbandFilter
+from libpurecoollink.dyson_pure_cool_link import DysonPureCoolLink
+from libpurecoollink.dyson_pure_state import DysonEnvironmentalSensorState, \
+    DysonPureCoolState
+
+
+def _sensor_payload(temperature=2967, dust=4, humidity=54):
+    return json.dumps({
+        "msg": "ENVIRONMENTAL-CURRENT-SENSOR-DATA",
+        "time": "2017-06-17T23:05:49.001Z",
+        "data": {"tact": str(temperature), "hact": "{0:04d}".format(humidity),
+                 "pact": "{0:04d}".format(dust), "vact": "0005",
+                 "sltm": "OFF"}
+    })
+
+
+def _sensor_state(**kwargs):
+    return DysonEnvironmentalSensorState(_sensor_payload(**kwargs))
+
+
+def _fan_state(fan_mode="AUTO"):
+    with open("tests/data/state.json", "r") as state_file:
+        payload = json.loads(state_file.read())
+    payload["product-state"]["fmod"] = fan_mode
+    return DysonPureCoolState(json.dumps(payload))
+
+
+class TestDeadband(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_absolute(self):
+        deadband = Deadband(absolute=0.2)
+        self.assertFalse(deadband.exceeded(296.7, 296.9))
+        self.assertFalse(deadband.exceeded(296.7, 296.5))
+        self.assertTrue(deadband.exceeded(296.7, 297.0))
+        self.assertTrue(deadband.exceeded(296.7, 296.4))
+        self.assertEqual(deadband.__repr__(),
+                         "Deadband(absolute=0.2,relative=None)")
+
+    def test_relative(self):
+        deadband = Deadband(relative=0.1)
+        self.assertFalse(deadband.exceeded(50, 55))
+        self.assertTrue(deadband.exceeded(50, 56))
+        self.assertTrue(deadband.exceeded(0, 1))
+        deadband = Deadband(absolute=10, relative=0.1)
+        self.assertTrue(deadband.exceeded(200, 215))
+        self.assertTrue(deadband.exceeded(20, 31))
+        self.assertFalse(deadband.exceeded(200, 210))
+
+
+class TestDysonDeadbandFilter(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_default_deadbands(self):
+        deadband_filter = DysonDeadbandFilter(heartbeat=None)
+        self.assertTrue(deadband_filter.accept(_sensor_state(), 0))
+        self.assertFalse(deadband_filter.accept(_sensor_state(), 1))
+        self.assertFalse(deadband_filter.accept(
+            _sensor_state(temperature=2969, dust=6), 2))
+        self.assertTrue(deadband_filter.accept(
+            _sensor_state(temperature=2970), 3))
+        self.assertTrue(deadband_filter.accept(_sensor_state(dust=7), 4))
+        self.assertEqual(deadband_filter.emitted, 3)
+        self.assertEqual(deadband_filter.suppressed, 2)
+        self.assertEqual(deadband_filter.__repr__(),
+                         "DysonDeadbandFilter(heartbeat=None,emitted=3,"
+                         "suppressed=2)")
+
+    def test_drift(self):
+        deadband_filter = DysonDeadbandFilter(heartbeat=None)
+        self.assertTrue(deadband_filter.accept(_sensor_state(dust=4), 0))
+        self.assertFalse(deadband_filter.accept(_sensor_state(dust=5), 1))
+        self.assertFalse(deadband_filter.accept(_sensor_state(dust=6), 2))
+        # Compared with the last emitted value
+        self.assertTrue(deadband_filter.accept(_sensor_state(dust=7), 3))
+
+    def test_fan_state(self):
+        deadband_filter = DysonDeadbandFilter(heartbeat=None)
+        self.assertTrue(deadband_filter.accept(_fan_state(), 0))
+        self.assertTrue(deadband_filter.accept(_sensor_state(), 0))
+        self.assertFalse(deadband_filter.accept(_fan_state(), 1))
+        self.assertTrue(deadband_filter.accept(_fan_state("FAN"), 2))
+        self.assertTrue(deadband_filter.accept(Mock(), 3))
+        self.assertTrue(deadband_filter.accept(None, 3))
+
+    def test_custom_deadbands(self):
+        deadband_filter = DysonDeadbandFilter(
+            {"humidity": Deadband(relative=0.1)}, heartbeat=None)
+        self.assertTrue(deadband_filter.accept(_sensor_state(humidity=50), 0))
+        self.assertFalse(deadband_filter.accept(_sensor_state(humidity=55),
+                                                1))
+        # Temperature without deadband
+        self.assertTrue(deadband_filter.accept(
+            _sensor_state(humidity=50, temperature=2968), 2))
+
+    def test_heartbeat(self):
+        deadband_filter = DysonDeadbandFilter(heartbeat=60)
+        self.assertEqual(deadband_filter.heartbeat, 60)
+        self.assertTrue(deadband_filter.accept(_sensor_state(), 0))
+        self.assertFalse(deadband_filter.accept(_sensor_state(), 59))
+        self.assertTrue(deadband_filter.accept(_sensor_state(), 60))
+        self.assertFalse(deadband_filter.accept(_sensor_state(), 119))
+        deadband_filter.reset()
+        self.assertTrue(deadband_filter.accept(_sensor_state(), 119))
+
+    def test_device(self):
+        device = DysonPureCoolLink({
+            "Active": True,
+            "Serial": "device-id-1",
+            "Name": "device-1",
+            "ScaleUnit": "SU01",
+            "Version": "21.03.08",
+            "LocalCredentials": "1/aJ5t52WvAfn+z+fjDuef86kQDQPefbQ6/"
+                                "70ZGysII1Ke1i0ZHakFH84DZuxsSQ4KTT2v"
+                                "bCm7uYeTORULKLKQ==",
+            "AutoUpdate": True,
+            "NewVersionAvailable": False,
+            "ProductType": "475"
+        })
+        messages = []
+        device.add_message_listener(messages.append)
+        self.assertIsNone(device.deadband_filter)
+        deadband_filter = device.enable_deadband_filter()
+        self.assertIs(device.deadband_filter, deadband_filter)
+        for temperature in (2967, 2968, 2969, 2970):
+            msg = Mock()
+            msg.payload = _sensor_payload(temperature).encode("utf-8")
+            DysonPureCoolLink.on_message(None, device, msg)
+        self.assertEqual([message.temperature for message in messages],
+                         [296.7, 297.0])
+        # Device state updated with every message
+        self.assertEqual(device.environmental_state.temperature, 297.0)
+        device.disable_deadband_filter()
+        self.assertIsNone(device.deadband_filter)
+        DysonPureCoolLink.on_message(None, device, msg)
+        self.assertEqual(len(messages), 3)
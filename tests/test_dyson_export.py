@@ -0,0 +1,289 @@
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import Mock
+
+from libpurecoollink.device_factory import DeviceFactory
+from libpurecoollink.dyson_360_eye import Dyson360Goodbye
+from libpurecoollink.dyson_export import DysonStateExporter, CsvFormat, \
+    LineProtocolFormat, FileSink, SocketSink
+from libpurecoollink.dyson_pure_state import DysonPureCoolState, \
+    DysonPureHotCoolState, DysonEnvironmentalSensorState
+from libpurecoollink.dyson_simulator import SimulatedBroker, \
+    SimulatedPureCoolLink
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+
+
+def _fixture(*path):
+    with open(os.path.join(DATA, *path), "r") as payload:
+        return payload.read()
+
+
+class _MemorySink:
+    def __init__(self, fail=False):
+        self.batches = []
+        self.closed = False
+        self.fail = fail
+        self.release = threading.Event()
+        self.release.set()
+
+    def write(self, data):
+        self.release.wait()
+        if self.fail:
+            raise OSError("Sink failure")
+        self.batches.append(data.decode("utf-8"))
+
+    def close(self):
+        self.closed = True
+
+
+def _wait(condition):
+    for _ in range(500):
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class TestDysonExport(unittest.TestCase):
+    def setUp(self):
+        self.sensor = DysonEnvironmentalSensorState(_fixture("sensor.json"))
+        self.state = DysonPureCoolState(_fixture("state.json"))
+        self.hot_state = DysonPureHotCoolState(_fixture("state_hot.json"))
+
+    def tearDown(self):
+        pass
+
+    def _exporter(self, sink, **kwargs):
+        exporter = DysonStateExporter(sink, **kwargs)
+        self.addCleanup(exporter.close)
+        return exporter
+
+    def test_line_protocol(self):
+        self.assertIsNone(LineProtocolFormat().header())
+        self.assertEqual(LineProtocolFormat().serialize([
+            (1500000000.5, "NN2-EU-KCA0000A", self.sensor),
+            (1500000001, "a,b c=d", self.state),
+            (1500000002, "hot", self.hot_state)]),
+            'dyson_environment,serial=NN2-EU-KCA0000A humidity=54.0,'
+            'volatil_organic_compounds=5.0,temperature=296.7,dust=4.0,'
+            'sleep_timer=28i 1500000000500000000\n'
+            'dyson_state,serial=a\\,b\\ c\\=d fan_mode="AUTO",'
+            'fan_state="FAN",night_mode="ON",speed="AUTO",oscillation="OFF",'
+            'filter_life="2087",quality_target="0004",'
+            'standby_monitoring="ON" 1500000001000000000\n'
+            'dyson_state,serial=hot fan_mode="AUTO",fan_state="FAN",'
+            'night_mode="ON",speed="AUTO",oscillation="OFF",'
+            'filter_life="2087",quality_target="0004",'
+            'standby_monitoring="ON",tilt="OK",focus_mode="ON",'
+            'heat_target="2950",heat_mode="HEAT",heat_state="HEAT" '
+            '1500000002000000000\n')
+
+    def test_line_protocol_sensor_off(self):
+        payload = json.loads(_fixture("sensor.json"))
+        payload["data"].update(tact="OFF", hact="OFF", vact="INIT",
+                               sltm="OFF")
+        sensor_off = DysonEnvironmentalSensorState(json.dumps(payload))
+        self.assertEqual(LineProtocolFormat().serialize([
+            (1, "device-1", sensor_off), (2, "device-1", self.sensor)]),
+            'dyson_environment,serial=device-1 humidity=0.0,'
+            'volatil_organic_compounds=0.0,temperature=0.0,dust=4.0,'
+            'sleep_timer=0i 1000000000\n'
+            'dyson_environment,serial=device-1 humidity=54.0,'
+            'volatil_organic_compounds=5.0,temperature=296.7,dust=4.0,'
+            'sleep_timer=28i 2000000000\n')
+
+    def test_csv(self):
+        self.assertIsNone(CsvFormat(header=False).header())
+        self.assertEqual(
+            CsvFormat().header(),
+            "time,serial,measurement,humidity,volatil_organic_compounds,"
+            "temperature,dust,sleep_timer,fan_mode,fan_state,night_mode,"
+            "speed,oscillation,filter_life,quality_target,"
+            "standby_monitoring,tilt,focus_mode,heat_target,heat_mode,"
+            "heat_state\r\n")
+        self.assertEqual(CsvFormat().serialize([
+            (1500000000.5, "device-1", self.sensor),
+            (1500000001, "device,1", self.state),
+            (1500000002, "device-1", self.hot_state)]),
+            "1500000000.5,device-1,dyson_environment,54,5,296.7,4,28,,,,,,,,"
+            ",,,,,\r\n"
+            '1500000001,"device,1",dyson_state,,,,,,AUTO,FAN,ON,AUTO,OFF,'
+            "2087,0004,ON,,,,,\r\n"
+            "1500000002,device-1,dyson_state,,,,,,AUTO,FAN,ON,AUTO,OFF,"
+            "2087,0004,ON,OK,ON,2950,HEAT,HEAT\r\n")
+
+    def test_batch_size(self):
+        sink = _MemorySink()
+        exporter = self._exporter(sink, batch_size=2, flush_interval=60)
+        self.assertTrue(exporter.add("device-1", self.sensor, 1))
+        self.assertFalse(exporter.add("device-1", Mock(), 1))
+        self.assertEqual(exporter.pending, 1)
+        time.sleep(0.05)
+        self.assertEqual(sink.batches, [])
+        self.assertTrue(exporter.add("device-1", self.state, 2))
+        self.assertTrue(_wait(lambda: exporter.batches == 1))
+        self.assertEqual(exporter.exported, 2)
+        self.assertEqual(exporter.pending, 0)
+        self.assertEqual(len(sink.batches[0].splitlines()), 2)
+
+    def test_flush_interval(self):
+        sink = _MemorySink()
+        exporter = self._exporter(sink, flush_interval=0.05)
+        exporter.add("device-1", self.sensor, 1)
+        self.assertTrue(_wait(lambda: exporter.batches == 1))
+        exporter.add("device-1", self.sensor, 2)
+        self.assertTrue(_wait(lambda: exporter.batches == 2))
+        self.assertEqual(exporter.exported, 2)
+
+    def test_close(self):
+        sink = _MemorySink()
+        exporter = DysonStateExporter(sink, CsvFormat(), flush_interval=60)
+        exporter.add("device-1", self.sensor, 1)
+        exporter.add("device-1", self.state, 2)
+        exporter.close()
+        self.assertTrue(sink.closed)
+        self.assertEqual(len(sink.batches), 1)
+        self.assertEqual(len(sink.batches[0].splitlines()), 3)
+        self.assertTrue(sink.batches[0].startswith("time,serial,"))
+        self.assertFalse(exporter.add("device-1", self.sensor, 3))
+
+    def test_flush(self):
+        sink = _MemorySink()
+        exporter = self._exporter(sink, state_format=CsvFormat(),
+                                  flush_interval=60)
+        exporter.add("device-1", self.sensor, 1)
+        exporter.flush()
+        exporter.add("device-1", self.sensor, 2)
+        exporter.flush()
+        exporter.flush()
+        self.assertEqual(len(sink.batches), 2)
+        # Header written once
+        self.assertTrue(sink.batches[0].startswith("time,serial,"))
+        self.assertTrue(sink.batches[1].startswith("2,device-1,"))
+
+    def test_drop_when_full(self):
+        sink = _MemorySink()
+        sink.release.clear()
+        exporter = self._exporter(sink, batch_size=1, max_pending=1,
+                                  block=False)
+        self.addCleanup(sink.release.set)
+        exporter.add("device-1", self.sensor, 1)
+        # Wait for the writer to be blocked by the sink
+        self.assertTrue(_wait(lambda: exporter.pending == 0))
+        self.assertTrue(exporter.add("device-1", self.sensor, 2))
+        self.assertFalse(exporter.add("device-1", self.sensor, 3))
+        self.assertEqual(exporter.dropped, 1)
+        sink.release.set()
+        self.assertTrue(_wait(lambda: exporter.exported == 2))
+
+    def test_block_when_full(self):
+        sink = _MemorySink()
+        sink.release.clear()
+        exporter = self._exporter(sink, batch_size=1, max_pending=1)
+        self.addCleanup(sink.release.set)
+        exporter.add("device-1", self.sensor, 1)
+        self.assertTrue(_wait(lambda: exporter.pending == 0))
+        exporter.add("device-1", self.sensor, 2)
+        producer = threading.Thread(
+            target=exporter.add, args=("device-1", self.sensor, 3))
+        producer.start()
+        producer.join(0.1)
+        self.assertTrue(producer.is_alive())
+        sink.release.set()
+        producer.join(5)
+        self.assertFalse(producer.is_alive())
+        self.assertTrue(_wait(lambda: exporter.exported == 3))
+        self.assertEqual(exporter.dropped, 0)
+
+    def test_sink_error(self):
+        sink = _MemorySink(fail=True)
+        exporter = self._exporter(sink, flush_interval=60)
+        exporter.add("device-1", self.sensor, 1)
+        exporter.flush()
+        self.assertEqual(exporter.dropped, 1)
+        self.assertEqual(exporter.exported, 0)
+
+    def test_file_sink(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "states.txt")
+        exporter = DysonStateExporter(FileSink(path))
+        exporter.add("device-1", self.sensor, 1)
+        exporter.close()
+        exporter = DysonStateExporter(FileSink(path))
+        exporter.add("device-1", self.sensor, 2)
+        exporter.close()
+        with open(path, "r") as states:
+            lines = states.read().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].endswith(" 2000000000"))
+
+    def test_file_sink_csv_header(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "states.csv")
+        for timestamp in (1, 2):
+            sink = FileSink(path)
+            self.assertEqual(sink.empty, timestamp == 1)
+            exporter = DysonStateExporter(sink, state_format=CsvFormat())
+            exporter.add("device-1", self.sensor, timestamp)
+            exporter.close()
+        with open(path, "r") as states:
+            lines = states.read().splitlines()
+        # Header written once, to the empty file
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].startswith("time,serial,"))
+        self.assertTrue(lines[2].startswith("2,device-1,"))
+
+    def test_socket_sink(self):
+        server = socket.socket()
+        self.addCleanup(server.close)
+        server.bind(("127.0.0.1", 0))
+        server.listen(1)
+        sink = SocketSink("127.0.0.1", server.getsockname()[1])
+        sink.write(b"line 1\n")
+        connection = server.accept()[0]
+        self.addCleanup(connection.close)
+        sink.write(b"line 2\n")
+        sink.close()
+        received = b""
+        while True:
+            data = connection.recv(1024)
+            if not data:
+                break
+            received += data
+        self.assertEqual(received, b"line 1\nline 2\n")
+        sink.close()
+
+    def test_socket_sink_error(self):
+        server = socket.socket()
+        server.bind(("127.0.0.1", 0))
+        port = server.getsockname()[1]
+        server.close()
+        sink = SocketSink("127.0.0.1", port)
+        self.assertRaises(OSError, sink.write, b"line\n")
+
+    def test_attach(self):
+        sink = _MemorySink()
+        exporter = self._exporter(sink, flush_interval=60)
+        broker = SimulatedBroker()
+        simulated = broker.add_device(SimulatedPureCoolLink("device-1"))
+        device = DeviceFactory().create(simulated.json_body())
+        device.client_factory = broker.client
+        exporter.attach(device)
+        self.assertTrue(device.connect("127.0.0.1"))
+        self.addCleanup(device.disconnect)
+        self.assertTrue(_wait(lambda: exporter.pending == 2))
+        exporter.listener("device-2")(Dyson360Goodbye(
+            _fixture("vacuum", "goodbye.json")))
+        exporter.flush()
+        lines = sink.batches[0].splitlines()
+        self.assertTrue(lines[0].startswith("dyson_state,serial=device-1 "))
+        self.assertTrue(lines[1].startswith(
+            "dyson_environment,serial=device-1 "))
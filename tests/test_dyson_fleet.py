@@ -0,0 +1,94 @@
+import json
+import unittest
+from unittest.mock import Mock
+
+from libpurecoollink.const import NightMode, HeatMode
+from libpurecoollink.dyson_device import DysonConnectResult
+from libpurecoollink.dyson_fleet import DysonFleet
+from libpurecoollink.dyson_pure_cool_link import DysonPureCoolLink
+from libpurecoollink.dyson_pure_hotcool_link import DysonPureHotCoolLink
+
+
+def _device(serial, device_class=DysonPureCoolLink, product_type="475",
+            connected=True, published=True):
+    device = device_class({
+        "Active": True,
+        "Serial": serial,
+        "Name": serial,
+        "ScaleUnit": "SU01",
+        "Version": "21.03.08",
+        "LocalCredentials": "1/aJ5t52WvAfn+z+fjDuef86kQDQPefbQ6/70ZGysII1K"
+                            "e1i0ZHakFH84DZuxsSQ4KTT2vbCm7uYeTORULKLKQ==",
+        "AutoUpdate": True,
+        "NewVersionAvailable": False,
+        "ProductType": product_type
+    })
+    device.connected = connected
+    device._mqtt = Mock()
+    device._mqtt.publish.return_value.is_published.return_value = published
+    return device
+
+
+class TestDysonFleet(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_set_configuration(self):
+        devices = [_device("device-{0}".format(idx)) for idx in range(20)]
+        hot = _device("hot-1", DysonPureHotCoolLink, "455")
+        fleet = DysonFleet(devices, max_workers=4)
+        fleet.add(hot)
+        result = fleet.set_configuration(night_mode=NightMode.NIGHT_MODE_ON,
+                                         heat_mode=HeatMode.HEAT_OFF,
+                                         sleep_timer=0)
+        self.assertEqual(len(result.succeeded), 21)
+        self.assertEqual(result.failed, {})
+        self.assertEqual(result.latency.count, 21)
+        topic, payload, qos = devices[3]._mqtt.publish.call_args[0]
+        self.assertEqual(topic, "475/device-3/command")
+        self.assertEqual(qos, 1)
+        payload = json.loads(payload.decode("utf-8"))
+        self.assertEqual(payload["msg"], "STATE-SET")
+        self.assertEqual(payload["mode-reason"], "LAPP")
+        self.assertEqual(payload["data"], {"nmod": "ON", "sltm": 0})
+        # Payload is serialized once for all devices of the same model
+        self.assertIs(devices[0]._mqtt.publish.call_args[0][1],
+                      devices[1]._mqtt.publish.call_args[0][1])
+        payload = json.loads(hot._mqtt.publish.call_args[0][1].decode())
+        self.assertEqual(payload["data"], {"nmod": "ON", "sltm": 0,
+                                           "hmod": "OFF"})
+
+    def test_failures(self):
+        fleet = DysonFleet([_device("device-1"),
+                            _device("device-2", connected=False),
+                            _device("device-3", published=False)])
+        error = _device("device-4")
+        error._mqtt.publish.side_effect = OSError("broken pipe")
+        fleet.add(error)
+        fleet.remove(error)
+        fleet.remove(error)
+        fleet.add(error)
+        result = fleet.set_configuration(night_mode=NightMode.NIGHT_MODE_ON)
+        self.assertEqual(result.succeeded, ["device-1"])
+        self.assertEqual(result.failed, {"device-2": "not connected",
+                                         "device-3": "timeout",
+                                         "device-4": "broken pipe"})
+        self.assertEqual(len(fleet.devices), 4)
+        self.assertTrue(result.__repr__().startswith(
+            "DysonFleetResult(succeeded=1,failed=3,"))
+
+    def test_connect(self):
+        devices = [_device("device-{0}".format(idx)) for idx in range(3)]
+        for device in devices:
+            device.connect_with_deadline = Mock(
+                return_value=DysonConnectResult(device.serial, 5))
+        fleet = DysonFleet(devices)
+        results = fleet.connect({"device-0": "192.168.0.2",
+                                 "device-2": "192.168.0.4"}, timeout=5)
+        self.assertEqual(sorted(results), ["device-0", "device-2"])
+        devices[2].connect_with_deadline.assert_called_with("192.168.0.4",
+                                                            timeout=5)
+        self.assertEqual(devices[1].connect_with_deadline.call_count, 0)
@@ -0,0 +1,133 @@
+import threading
+import unittest
+from unittest import mock
+
+from libpurecoollink.dyson_mdns_simulator import DiscoveryBenchmark, \
+    DiscoveryBenchmarkResult, SimulatedResponder, service_name
+from libpurecoollink.dyson_simulator import SimulatedPureCoolLink
+
+
+class _Network:
+    """In-process mDNS: registered services are announced to browsers."""
+
+    def __init__(self):
+        self.services = {}
+        self.browsers = []
+        self.instances = []
+        self.lock = threading.Lock()
+
+    def zeroconf(self, interfaces=None):
+        zeroconf = _Zeroconf(self)
+        self.instances.append(zeroconf)
+        return zeroconf
+
+    def browser(self, zeroconf, service_type, listener):
+        with self.lock:
+            self.browsers.append((zeroconf, listener))
+            names = list(self.services)
+        for name in names:
+            listener.add_service(zeroconf, service_type, name)
+
+    def register(self, info):
+        with self.lock:
+            self.services[info.name] = info
+            browsers = [browser for browser in self.browsers
+                        if not browser[0].closed]
+        for zeroconf, listener in browsers:
+            zeroconf.packets_sent += 1
+            listener.add_service(zeroconf, info.type, info.name)
+
+
+class _Zeroconf:
+    def __init__(self, network):
+        self._network = network
+        self.services = {}
+        self.closed = False
+        self.packets_sent = 0
+        self.bytes_sent = 0
+        self.packets_dropped = 0
+
+    def register_service(self, info, ttl):
+        self.services[info.name.lower()] = info
+        self._network.register(info)
+
+    def unregister_service(self, info):
+        with self._network.lock:
+            self._network.services.pop(info.name, None)
+
+    def get_service_info(self, service_type, name):
+        return self._network.services[name]
+
+    def close(self):
+        self.closed = True
+
+
+class TestDysonMdnsSimulator(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_service_name(self):
+        self.assertEqual(service_name(SimulatedPureCoolLink("AB-CD")),
+                         "475_AB-CD._dyson_mqtt._tcp.local.")
+
+    @mock.patch('libpurecoollink.dyson_mdns_simulator.CountingZeroconf')
+    def test_responder(self, mocked_zeroconf):
+        zeroconf = mocked_zeroconf.return_value
+        zeroconf.services = {}
+        zeroconf.register_service.side_effect = \
+            lambda info, ttl: zeroconf.services.__setitem__(
+                info.name.lower(), info)
+        responder = SimulatedResponder(workers=2)
+        devices = [SimulatedPureCoolLink("device-{0}".format(index))
+                   for index in range(3)]
+        responder.advertise(devices, 10)
+        self.assertEqual(len(responder.services), 3)
+        info = zeroconf.services["475_device-1._dyson_mqtt._tcp.local."]
+        self.assertEqual(info.port, 1883)
+        self.assertEqual(info.address, b'\x7f\x00\x00\x01')
+        self.assertEqual(info.server, "device-1.local.")
+        zeroconf.register_service.assert_called_with(mock.ANY, 10)
+        responder.withdraw(devices[:1])
+        self.assertEqual(zeroconf.unregister_service.call_count, 1)
+        # Expired devices are not answered anymore, without goodbye
+        responder.expire(devices[1:2])
+        self.assertEqual(zeroconf.unregister_service.call_count, 1)
+        self.assertNotIn("475_device-1._dyson_mqtt._tcp.local.",
+                         zeroconf.services)
+        self.assertEqual(responder.services,
+                         ["475_device-2._dyson_mqtt._tcp.local."])
+        responder.close()
+        self.assertEqual(zeroconf.close.call_count, 1)
+
+    def test_result(self):
+        result = DiscoveryBenchmarkResult(2)
+        self.assertFalse(result.complete)
+        result.discovered = 2
+        self.assertTrue(result.complete)
+        self.assertEqual(
+            repr(result), "DiscoveryBenchmarkResult(expected=2,"
+                          "discovered=2,elapsed=0.000,"
+                          "cpu_time=0.000,packets_sent=0,bytes_sent=0,"
+                          "packets_dropped=0)")
+
+    def test_benchmark(self):
+        network = _Network()
+        with mock.patch('libpurecoollink.dyson_mdns_simulator.'
+                        'CountingZeroconf', network.zeroconf), \
+                mock.patch('libpurecoollink.dyson_pure_cool_link.'
+                           'ServiceBrowser', network.browser):
+            result = DiscoveryBenchmark(4, churn=1, expired=1, timeout=5,
+                                        workers=2).run()
+        self.assertTrue(result.complete, result)
+        self.assertEqual(result.expected, 4)
+        # Responder and one Zeroconf instance per search
+        self.assertEqual(len(network.instances), 5)
+        self.assertTrue(all(zeroconf.closed
+                            for zeroconf in network.instances))
+        # Withdrawn device not advertised anymore
+        self.assertNotIn("475_SIM-00001._dyson_mqtt._tcp.local.",
+                         network.services)
+        self.assertEqual(result.packets_dropped, 0)
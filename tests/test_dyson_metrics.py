@@ -0,0 +1,192 @@
+import time
+import unittest
+from unittest.mock import Mock
+
+from libpurecoollink import dyson_metrics
+from libpurecoollink.const import FanMode
+from libpurecoollink.device_factory import DeviceFactory
+from libpurecoollink.dyson_device import DysonConnectResult
+from libpurecoollink.dyson_metrics import MetricsRegistry, enable_metrics, \
+    disable_metrics
+from libpurecoollink.dyson_simulator import SimulatedBroker, \
+    SimulatedPureCoolLink, Simulated360Eye
+from libpurecoollink.zeroconf import Zeroconf, DNSCache, DNSIncoming, \
+    DNSOutgoing, DNSPointer, _FLAGS_QR_RESPONSE, _TYPE_PTR, _CLASS_IN
+
+
+def _wait(condition):
+    for _ in range(500):
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class TestDysonMetrics(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        disable_metrics()
+
+    def test_counter(self):
+        registry = MetricsRegistry()
+        counter = registry.counter("requests_total", "Requests.",
+                                   ("method",))
+        counter.inc(("GET",))
+        counter.inc(("GET",), 2)
+        counter.inc(('P"O\\ST',))
+        self.assertEqual(counter.value(("GET",)), 3)
+        self.assertIsNone(counter.value(("PUT",)))
+        self.assertEqual(registry.counter("requests_total", "Requests."),
+                         counter)
+        self.assertRaises(ValueError, registry.gauge, "requests_total",
+                          "Requests.")
+        self.assertEqual(registry.render(),
+                         '# HELP requests_total Requests.\n'
+                         '# TYPE requests_total counter\n'
+                         'requests_total{method="GET"} 3\n'
+                         'requests_total{method="P\\"O\\\\ST"} 1\n')
+
+    def test_gauge(self):
+        registry = MetricsRegistry()
+        gauge = registry.gauge("size", "Size.")
+        gauge.set(4)
+        gauge.set(2)
+        self.assertEqual(gauge.value(), 2)
+        self.assertEqual(registry.get("size"), gauge)
+        self.assertEqual(gauge.render(), "# HELP size Size.\n"
+                                         "# TYPE size gauge\n"
+                                         "size 2")
+
+    def test_histogram(self):
+        registry = MetricsRegistry()
+        histogram = registry.histogram("latency_seconds", "Latency.",
+                                       ("device",), buckets=(0.1, 1))
+        histogram.observe(0.05, ("a",))
+        histogram.observe(0.1, ("a",))
+        histogram.observe(0.5, ("a",))
+        histogram.observe(2, ("a",))
+        self.assertEqual(histogram.value(("a",)), (4, 2.65))
+        self.assertIsNone(histogram.value(("b",)))
+        self.assertEqual(histogram.render(),
+                         '# HELP latency_seconds Latency.\n'
+                         '# TYPE latency_seconds histogram\n'
+                         'latency_seconds_bucket{device="a",le="0.1"} 2\n'
+                         'latency_seconds_bucket{device="a",le="1"} 3\n'
+                         'latency_seconds_bucket{device="a",le="+Inf"} 4\n'
+                         'latency_seconds_sum{device="a"} 2.65\n'
+                         'latency_seconds_count{device="a"} 4')
+
+    def test_enable_disable(self):
+        self.assertIsNone(dyson_metrics.METRICS)
+        registry = MetricsRegistry()
+        self.assertEqual(enable_metrics(registry), registry)
+        self.assertEqual(dyson_metrics.METRICS.registry, registry)
+        self.assertIsNotNone(registry.get("dyson_messages_total"))
+        disable_metrics()
+        self.assertIsNone(dyson_metrics.METRICS)
+
+    def test_connect_result(self):
+        registry = enable_metrics()
+        result = DysonConnectResult("device-1", 5)
+        result.add_timing("tcp", 0.01)
+        result.add_timing("connack", 5)
+        result.fail("connack", "timeout")
+        dyson_metrics.METRICS.connect_result(result)
+        self.assertEqual(registry.get("dyson_connect_phase_seconds").value(
+            ("tcp",)), (1, 0.01))
+        self.assertEqual(registry.get("dyson_connect_failures_total").value(
+            ("connack",)), 1)
+
+    def test_pure_cool_link(self):
+        registry = enable_metrics()
+        broker = SimulatedBroker()
+        simulated = broker.add_device(SimulatedPureCoolLink("device-1"))
+        device = DeviceFactory().create(simulated.json_body())
+        device.client_factory = broker.client
+        self.addCleanup(device.disconnect)
+        listener = Mock()
+        device.add_message_listener(listener)
+        self.assertTrue(device.connect("127.0.0.1"))
+        device.set_configuration(fan_mode=FanMode.FAN)
+        self.assertTrue(_wait(lambda: listener.call_count == 3))
+        messages = registry.get("dyson_messages_total")
+        self.assertEqual(messages.value(("475", "DysonPureCoolState")), 2)
+        self.assertEqual(messages.value(
+            ("475", "DysonEnvironmentalSensorState")), 1)
+        self.assertEqual(registry.get("dyson_message_parse_seconds").value(
+            ("475",))[0], 3)
+        self.assertTrue(_wait(lambda: registry.get(
+            "dyson_message_callback_seconds").value(("475",))[0] == 3))
+        commands = registry.get("dyson_commands_total")
+        self.assertEqual(commands.value(("475", "REQUEST-CURRENT-STATE")), 1)
+        self.assertEqual(commands.value(
+            ("475", "REQUEST-PRODUCT-ENVIRONMENT-CURRENT-SENSOR-DATA")), 1)
+        self.assertEqual(commands.value(("475", "STATE-SET")), 1)
+        self.assertEqual(registry.get("dyson_connections_total").value(
+            ("475", "accepted")), 1)
+        for phase in ("tcp", "connack", "state", "sensor"):
+            self.assertEqual(registry.get(
+                "dyson_connect_phase_seconds").value((phase,))[0], 1)
+        self.assertIn('dyson_messages_total{product_type="475",'
+                      'type="DysonPureCoolState"} 2', registry.render())
+
+    def test_360_eye(self):
+        registry = enable_metrics()
+        broker = SimulatedBroker()
+        simulated = broker.add_device(Simulated360Eye("device-1"))
+        device = DeviceFactory().create(simulated.json_body())
+        device.client_factory = broker.client
+        self.addCleanup(lambda: device._mqtt.loop_stop())
+        self.assertTrue(device.connect("127.0.0.1"))
+        device.start()
+        self.assertTrue(_wait(lambda: registry.get(
+            "dyson_message_callback_seconds").value(("N223",)) is not None and
+            registry.get("dyson_message_callback_seconds").value(
+                ("N223",))[0] == 2))
+        self.assertEqual(registry.get("dyson_messages_total").value(
+            ("N223", "Dyson360EyeState")), 2)
+        self.assertEqual(registry.get("dyson_commands_total").value(
+            ("N223", "START")), 1)
+
+    def test_zeroconf(self):
+        registry = enable_metrics()
+        zeroconf = Mock(_respond_sockets=[], _GLOBAL_DONE=False,
+                        cache=DNSCache())
+        out = DNSOutgoing(_FLAGS_QR_RESPONSE)
+        out.add_answer_at_time(DNSPointer(
+            "_dyson_mqtt._tcp.local.", _TYPE_PTR, _CLASS_IN, 3600,
+            "475_device-1._dyson_mqtt._tcp.local."), 0)
+        Zeroconf.send(zeroconf, out)
+        self.assertEqual(registry.get("dyson_mdns_packets_sent_total").value(),
+                         1)
+        self.assertEqual(registry.get("dyson_mdns_sent_bytes_total").value(),
+                         len(out.packet()))
+        Zeroconf.handle_response(zeroconf, DNSIncoming(out.packet()))
+        self.assertEqual(registry.get("dyson_mdns_responses_total").value(),
+                         1)
+        self.assertEqual(registry.get("dyson_mdns_cache_records").value(), 1)
+
+    def test_dns_cache_size(self):
+        cache = DNSCache()
+        records = [DNSPointer("_dyson_mqtt._tcp.local.", _TYPE_PTR, _CLASS_IN,
+                              3600, "475_device-{0}._dyson_mqtt._tcp.local."
+                              .format(index)) for index in range(2)]
+        for record in records:
+            cache.add(record)
+        self.assertEqual(cache.size, 2)
+        cache.remove(records[0])
+        # Not cached anymore
+        cache.remove(records[0])
+        self.assertEqual(cache.size, 1)
+        self.assertEqual(cache.size, len(cache.entries()))
+
+    def test_disabled(self):
+        broker = SimulatedBroker()
+        simulated = broker.add_device(SimulatedPureCoolLink("device-1"))
+        device = DeviceFactory().create(simulated.json_body())
+        device.client_factory = broker.client
+        self.addCleanup(device.disconnect)
+        self.assertTrue(device.connect("127.0.0.1"))
+        self.assertIsNone(dyson_metrics.METRICS)
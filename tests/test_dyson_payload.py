@@ -0,0 +1,55 @@
+import json
+import unittest
+from unittest import mock
+
+from libpurecoollink.dyson_payload import serialize_command, \
+    encoded_timestamp, REQUEST_CURRENT_STATE, STATE_SET, MODE_REASON_APP
+
+
+class TestDysonPayload(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    @mock.patch('libpurecoollink.dyson_payload.time.time',
+                return_value=1500190471.6)
+    def test_request(self, mocked_time):
+        payload = serialize_command(REQUEST_CURRENT_STATE)
+        self.assertEqual(payload, b'{"msg": "REQUEST-CURRENT-STATE", '
+                                  b'"time": "2017-07-16T07:34:31Z"}')
+
+    @mock.patch('libpurecoollink.dyson_payload.time.time',
+                return_value=1500190471.6)
+    def test_state_set(self, mocked_time):
+        data = {"fmod": "FAN", "fnsp": "0003", "sltm": 0}
+        payload = serialize_command(STATE_SET, {"data": data},
+                                    MODE_REASON_APP)
+        self.assertEqual(payload, json.dumps({
+            "msg": "STATE-SET",
+            "time": "2017-07-16T07:34:31Z",
+            "mode-reason": "LAPP",
+            "data": data
+        }).encode("utf-8"))
+        self.assertEqual(serialize_command("START",
+                                           {"fullCleanType": "immediate"}),
+                         b'{"msg": "START", "time": "2017-07-16T07:34:31Z", '
+                         b'"fullCleanType": "immediate"}')
+
+    @mock.patch('libpurecoollink.dyson_payload.time.strftime',
+                return_value="2017-07-16T07:34:31Z")
+    def test_timestamp_cache(self, mocked_strftime):
+        with mock.patch('libpurecoollink.dyson_payload.time.time',
+                        return_value=1500190471.1):
+            self.assertEqual(encoded_timestamp(), b"2017-07-16T07:34:31Z")
+        count = mocked_strftime.call_count
+        with mock.patch('libpurecoollink.dyson_payload.time.time',
+                        return_value=1500190471.9):
+            encoded_timestamp()
+            encoded_timestamp()
+        self.assertEqual(mocked_strftime.call_count, count)
+        with mock.patch('libpurecoollink.dyson_payload.time.time',
+                        return_value=1500190472.0):
+            encoded_timestamp()
+        self.assertEqual(mocked_strftime.call_count, count + 1)
@@ -0,0 +1,125 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+import types
+import unittest
+from unittest.mock import Mock
+
+import paho.mqtt.client as mqtt
+
+from libpurecoollink.dyson_profiler import SamplingProfiler, thread_kind
+from libpurecoollink.dyson_pure_cool_link import EnvironmentalSensorThread
+from libpurecoollink.dyson_reconnect import ReconnectThread
+from libpurecoollink.zeroconf import Engine, Reaper, ServiceBrowser
+
+
+def _network_loop(event):
+    event.wait()
+
+
+def _client_thread(event=None):
+    # Thread running a paho Client method, unnamed like paho 1.x threads
+    def thread_main(client, event):
+        _network_loop(event)
+    return threading.Thread(target=types.MethodType(
+        thread_main, Mock(spec=mqtt.Client)), args=(event,))
+
+
+def _waiting(thread):
+    # pylint: disable=protected-access
+    frame = sys._current_frames().get(thread.ident)
+    return frame is not None and frame.f_code.co_name == "wait" and \
+        frame.f_back.f_code.co_name == "wait" and \
+        frame.f_back.f_back.f_code.co_name in ("_network_loop", "run")
+
+
+class TestDysonProfiler(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def _start_threads(self):
+        event = threading.Event()
+        self.addCleanup(event.set)
+        paho = _client_thread(event)
+        paho.start()
+        sensor = EnvironmentalSensorThread(event.wait, 0)
+        sensor.start()
+        self.addCleanup(sensor.stop)
+        other = threading.Thread(target=_network_loop, args=(event,))
+        other.start()
+        for _ in range(500):
+            if _waiting(paho) and _waiting(sensor):
+                break
+            time.sleep(0.01)
+
+    def test_thread_kind(self):
+        self.assertEqual(thread_kind(Engine.__new__(Engine)), "Engine")
+        self.assertEqual(thread_kind(Reaper.__new__(Reaper)), "Reaper")
+        self.assertEqual(thread_kind(ServiceBrowser.__new__(ServiceBrowser)),
+                         "ServiceBrowser")
+        self.assertEqual(thread_kind(ReconnectThread(Mock())),
+                         "ReconnectThread")
+        self.assertEqual(thread_kind(EnvironmentalSensorThread(Mock())),
+                         "EnvironmentalSensorThread")
+        self.assertEqual(thread_kind(_client_thread()), "paho")
+        self.assertIsNone(thread_kind(threading.Thread(
+            target=_network_loop)))
+        self.assertIsNone(thread_kind(threading.current_thread()))
+
+    def test_sample(self):
+        self._start_threads()
+        profiler = SamplingProfiler()
+        profiler.sample()
+        profiler.sample()
+        self.assertEqual(profiler.samples, 2)
+        stacks = profiler.stacks
+        self.assertEqual(sorted(stack[0] for stack in stacks),
+                         ["EnvironmentalSensorThread", "paho"])
+        self.assertEqual(set(stacks.values()), {2})
+        paho = [stack for stack in stacks if stack[0] == "paho"][0]
+        self.assertEqual(paho[1], "threading._bootstrap")
+        self.assertTrue(paho[-3].endswith("test_dyson_profiler._network_loop"))
+        self.assertEqual(paho[-1], "threading.wait")
+        functions = profiler.functions()
+        self.assertEqual(functions, [
+            ("libpurecoollink.dyson_pure_cool_link.run", 0, 2)])
+        collapsed = profiler.collapsed().splitlines()
+        self.assertEqual(len(collapsed), 2)
+        self.assertTrue(collapsed[0].startswith(
+            "EnvironmentalSensorThread;threading._bootstrap;"))
+        self.assertTrue(collapsed[0].endswith(
+            "libpurecoollink.dyson_pure_cool_link.run;threading.wait;"
+            "threading.wait 2"))
+        profiler.reset()
+        self.assertEqual(profiler.samples, 0)
+        self.assertEqual(profiler.collapsed(), "")
+
+    def test_max_depth(self):
+        self._start_threads()
+        profiler = SamplingProfiler(max_depth=2)
+        profiler.sample()
+        self.assertEqual(set(profiler.stacks), {
+            ("paho", "threading.wait", "threading.wait"),
+            ("EnvironmentalSensorThread", "threading.wait",
+             "threading.wait")})
+
+    def test_dump(self):
+        self._start_threads()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "stacks.txt")
+        profiler = SamplingProfiler(interval=0.001, dump_path=path,
+                                    dump_interval=0)
+        profiler.start()
+        profiler.stop()
+        profiler.join()
+        with open(path, "r") as dump_file:
+            self.assertEqual(dump_file.read(), profiler.collapsed())
+        other = os.path.join(directory.name, "other.txt")
+        profiler.dump(other)
+        self.assertTrue(os.path.exists(other))
@@ -0,0 +1,121 @@
+import time
+import unittest
+from unittest import mock
+from unittest.mock import Mock
+
+from libpurecoollink.dyson_device import DysonConnectResult
+from libpurecoollink.dyson_pure_cool_link import DysonPureCoolLink
+from libpurecoollink.dyson_reconnect import ReconnectRateLimiter, \
+    ReconnectThread, backoff_delay
+
+
+def _result(connected):
+    result = DysonConnectResult("device-id-1", 1)
+    if not connected:
+        result.fail("tcp", "Connection refused")
+    return result
+
+
+def _device():
+    return DysonPureCoolLink({
+        "Active": True,
+        "Serial": "device-id-1",
+        "Name": "device-1",
+        "ScaleUnit": "SU01",
+        "Version": "21.03.08",
+        "LocalCredentials": "1/aJ5t52WvAfn+z+fjDuef86kQDQPefbQ6/70ZGysII1K"
+                            "e1i0ZHakFH84DZuxsSQ4KTT2vbCm7uYeTORULKLKQ==",
+        "AutoUpdate": True,
+        "NewVersionAvailable": False,
+        "ProductType": "475"
+    })
+
+
+def _wait(condition):
+    for _ in range(500):
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class TestDysonReconnect(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    @mock.patch('libpurecoollink.dyson_reconnect.random.uniform',
+                side_effect=lambda low, high: high)
+    def test_backoff_delay(self, mocked_uniform):
+        self.assertEqual([backoff_delay(attempt, 1, 10)
+                          for attempt in range(6)], [1, 2, 4, 8, 10, 10])
+        mocked_uniform.assert_called_with(0, 10)
+
+    def test_rate_limiter(self):
+        limiter = ReconnectRateLimiter(rate=10, burst=2)
+        self.assertEqual(limiter.try_acquire(), 0)
+        self.assertEqual(limiter.try_acquire(), 0)
+        self.assertTrue(0 < limiter.try_acquire() <= 0.1)
+        self.assertTrue(limiter.acquire())
+        self.assertEqual(limiter.rate, 10)
+        self.assertEqual(limiter.burst, 2)
+
+    def test_reconnect_thread(self):
+        device = Mock()
+        device.reconnect.side_effect = [_result(False), _result(False),
+                                        _result(False), _result(True)]
+        thread = ReconnectThread(device, 0.001, 0.01,
+                                 ReconnectRateLimiter(1000, 10), 2)
+        thread.start()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(device.reconnect.call_count, 4)
+        self.assertEqual(device.rediscover.call_count, 1)
+
+    def test_stop_reconnect_thread(self):
+        device = Mock()
+        thread = ReconnectThread(device, 60, 60)
+        thread.start()
+        thread.stop()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(device.reconnect.call_count, 0)
+
+    def test_device_connection_lost(self):
+        device = _device()
+        device.connected = True
+        device._device_available = True
+        device._request_thread = Mock()
+        device.reconnect = Mock(return_value=_result(True))
+        # Expected disconnection
+        DysonPureCoolLink.on_disconnect(None, device, 0)
+        self.assertTrue(device.connected)
+        # Without auto reconnection
+        DysonPureCoolLink.on_disconnect(None, device, 7)
+        self.assertFalse(device.connected)
+        self.assertFalse(device.device_available)
+        self.assertEqual(device._request_thread.stop.call_count, 1)
+        self.assertEqual(device.reconnect.call_count, 0)
+        device.enable_auto_reconnect(0.001, 0.01)
+        DysonPureCoolLink.on_disconnect(None, device, 7)
+        self.assertTrue(_wait(lambda: device.reconnect.call_count == 1))
+        device.disable_auto_reconnect()
+        self.assertIsNone(device._reconnect_thread)
+
+    def test_device_reconnect(self):
+        device = _device()
+        device._mqtt = Mock()
+        device._mqtt_connect = Mock(return_value=_result(True))
+        device.enable_auto_reconnect(timeout=3)
+        self.assertTrue(device.reconnect().connected)
+        device._mqtt_connect.assert_called_with(3)
+        self.assertEqual(device.reconnects, 1)
+        network_device = Mock(address="192.168.0.3")
+        device._find_network_device = Mock(side_effect=[None,
+                                                        network_device])
+        device.rediscover()
+        self.assertIsNone(device.network_device)
+        device.rediscover()
+        self.assertEqual(device.network_device, network_device)
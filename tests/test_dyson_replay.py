@@ -0,0 +1,129 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock
+
+from libpurecoollink.device_factory import DeviceFactory
+from libpurecoollink.dyson_replay import ReplayTransport, TrafficRecorder, \
+    read_capture
+from libpurecoollink.dyson_simulator import SimulatedPureCoolLink, \
+    Simulated360Eye
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+
+
+def _fixture(*path):
+    with open(os.path.join(DATA, *path), "r") as payload:
+        return payload.read().encode("utf-8")
+
+
+def _pure_records(serial="device-1"):
+    topic = "475/{0}/status/current".format(serial)
+    return [(0, topic, _fixture("state.json")),
+            (0.1, "475/device-2/status/current", _fixture("state.json")),
+            (0.1, topic, _fixture("sensor.json")),
+            (0.2, topic, _fixture("sensor_sltm_off.json"))]
+
+
+class TestDysonReplay(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def _capture_path(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        return os.path.join(directory.name, "capture.jsonl")
+
+    def _pure_device(self, transport):
+        device = DeviceFactory().create(SimulatedPureCoolLink(
+            "device-1").json_body())
+        device.client_factory = transport.client
+        return device
+
+    def test_recorder(self):
+        path = self._capture_path()
+        recorder = TrafficRecorder(path)
+        recorder.record("475/device-1/status/current", b'{"msg": "A"}', 12.5)
+        msg = Mock(topic="475/device-1/status/current",
+                   payload='{"msg": "B"}')
+        recorder.on_message(None, None, msg)
+        self.assertEqual(recorder.recorded, 2)
+        recorder.close()
+        records = list(read_capture(path))
+        self.assertEqual(records[0], (12.5, "475/device-1/status/current",
+                                      b'{"msg": "A"}'))
+        self.assertEqual(records[1][1:], ("475/device-1/status/current",
+                                          b'{"msg": "B"}'))
+        with open(path, "r") as capture:
+            self.assertEqual(json.loads(capture.readline())["payload"],
+                             '{"msg": "A"}')
+
+    def test_replay_pure_cool_link(self):
+        transport = ReplayTransport(_pure_records())
+        device = self._pure_device(transport)
+        listener = Mock()
+        device.add_message_listener(listener)
+        self.assertTrue(device.connect("127.0.0.1"))
+        self.addCleanup(device.disconnect)
+        self.assertTrue(transport.wait(5))
+        self.assertEqual(listener.call_count, 3)
+        self.assertEqual(device.state.speed, "AUTO")
+        self.assertEqual(device.environmental_state.sleep_timer, 0)
+        client = transport.clients[0]
+        self.assertTrue(client.finished)
+        self.assertEqual(client.delivered, 3)
+        self.assertEqual(transport.delivered, 3)
+        self.assertGreaterEqual(client.published, 1)
+        self.assertLess(client.elapsed, 0.2)
+
+    def test_replay_capture_file(self):
+        path = self._capture_path()
+        recorder = TrafficRecorder(path)
+        for timestamp, topic, payload in _pure_records():
+            recorder.record(topic, payload, timestamp)
+        recorder.close()
+        transport = ReplayTransport(path)
+        device = self._pure_device(transport)
+        self.assertTrue(device.connect("127.0.0.1"))
+        self.addCleanup(device.disconnect)
+        self.assertTrue(transport.wait(5))
+        self.assertEqual(transport.delivered, 3)
+
+    def test_replay_speed(self):
+        transport = ReplayTransport(_pure_records(), speed=2)
+        self.assertEqual(transport.speed, 2)
+        device = self._pure_device(transport)
+        self.assertTrue(device.connect("127.0.0.1"))
+        self.addCleanup(device.disconnect)
+        self.assertTrue(transport.wait(5))
+        self.assertGreaterEqual(transport.clients[0].elapsed, 0.1)
+
+    def test_replay_stopped(self):
+        transport = ReplayTransport([])
+        client = transport.client(Mock())
+        client.loop_start()
+        self.assertFalse(transport.wait(0.01))
+        client.loop_stop()
+        self.assertTrue(transport.wait(5))
+        self.assertIsNone(client.elapsed)
+        self.assertEqual(client.delivered, 0)
+
+    def test_replay_360_eye(self):
+        topic = "N223/device-1/status"
+        transport = ReplayTransport([
+            (0, topic, _fixture("vacuum", "state.json")),
+            (1, topic, _fixture("vacuum", "map-global.json"))])
+        device = DeviceFactory().create(Simulated360Eye(
+            "device-1").json_body())
+        device.client_factory = transport.client
+        listener = Mock()
+        device.add_message_listener(listener)
+        self.assertTrue(device.connect("127.0.0.1"))
+        self.addCleanup(lambda: device._mqtt.loop_stop())
+        self.assertTrue(transport.wait(5))
+        self.assertEqual(listener.call_count, 2)
+        self.assertEqual(transport.delivered, 2)
@@ -0,0 +1,173 @@
+import time
+import unittest
+
+from libpurecoollink.const import FanMode, FanSpeed, Oscillation, \
+    Dyson360EyeMode, PowerMode
+from libpurecoollink.device_factory import DeviceFactory
+from libpurecoollink.dyson_360_eye import Dyson360Eye, Dyson360EyeMapGlobal
+from libpurecoollink.dyson_pure_cool_link import DysonPureCoolLink
+from libpurecoollink.dyson_pure_hotcool_link import DysonPureHotCoolLink
+from libpurecoollink.dyson_pure_state import DysonEnvironmentalSensorState
+from libpurecoollink.dyson_simulator import SimulatedBroker, \
+    SimulatedPureCoolLink, SimulatedPureHotCoolLink, Simulated360Eye
+from libpurecoollink.utils import decrypt_password, encrypt_password
+
+
+def _wait(condition):
+    for _ in range(500):
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class TestDysonSimulator(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def _connect(self, broker, simulated):
+        device = DeviceFactory().create(simulated.json_body())
+        device.client_factory = broker.client
+        if isinstance(device, DysonPureCoolLink):
+            self.addCleanup(device.disconnect)
+        else:
+            self.addCleanup(lambda: device._mqtt.loop_stop())
+        self.assertTrue(device.connect("127.0.0.1"))
+        return device
+
+    def test_encrypt_password(self):
+        self.assertEqual(decrypt_password(encrypt_password("secret")),
+                         "secret")
+
+    def test_json_body(self):
+        broker = SimulatedBroker()
+        devices = broker.add_devices(SimulatedPureCoolLink, 2) + \
+            broker.add_devices(SimulatedPureHotCoolLink, 1) + \
+            broker.add_devices(Simulated360Eye, 1)
+        self.assertEqual(len(broker.devices), 4)
+        self.assertEqual(devices[1].serial, "SIM-475-00001")
+        self.assertEqual(broker.device("SIM-N223-00003"), devices[3])
+        created = DeviceFactory().create_devices(
+            device.json_body() for device in devices)
+        self.assertTrue(isinstance(created[0], DysonPureCoolLink))
+        self.assertTrue(isinstance(created[2], DysonPureHotCoolLink))
+        self.assertTrue(isinstance(created[3], Dyson360Eye))
+        self.assertEqual(created[0].credentials, "password")
+
+    def test_pure_cool_link(self):
+        broker = SimulatedBroker()
+        simulated = broker.add_device(SimulatedPureCoolLink("device-1"))
+        device = self._connect(broker, simulated)
+        self.assertTrue(device.device_available)
+        self.assertEqual(device.state.fan_mode, "AUTO")
+        self.assertEqual(device.environmental_state.humidity, 54)
+        messages = []
+        device.add_message_listener(messages.append)
+        device.set_configuration(fan_mode=FanMode.FAN,
+                                 fan_speed=FanSpeed.FAN_SPEED_3,
+                                 oscillation=Oscillation.OSCILLATION_ON)
+        self.assertTrue(_wait(lambda: messages))
+        self.assertEqual(simulated.product_state["fnsp"], "0003")
+        self.assertEqual(device.state.fan_mode, "FAN")
+        self.assertEqual(device.state.speed, "0003")
+        self.assertEqual(device.state.oscillation, "ON")
+        # Unchanged fields are kept
+        self.assertEqual(device.state.night_mode, "ON")
+        self.assertEqual(simulated.commands, 3)
+
+    def test_pure_hot_cool_link(self):
+        broker = SimulatedBroker()
+        simulated = broker.add_device(SimulatedPureHotCoolLink("device-1"))
+        device = self._connect(broker, simulated)
+        self.assertEqual(device.state.heat_target, "2950")
+
+    def test_streams(self):
+        broker = SimulatedBroker()
+        simulated = broker.add_device(SimulatedPureCoolLink(
+            "device-1", seed=1, state_interval=10, sensor_interval=1))
+        device = self._connect(broker, simulated)
+        messages = []
+        device.add_message_listener(messages.append)
+        broker.update(100)
+        broker.update(100.5)
+        broker.update(101)
+        self.assertTrue(_wait(lambda: len(messages) == 3))
+        self.assertEqual(len([message for message in messages
+                              if isinstance(message,
+                                            DysonEnvironmentalSensorState)]),
+                         2)
+        self.assertEqual(device.state.filter_life, "2086")
+
+    def test_360_eye(self):
+        broker = SimulatedBroker()
+        simulated = broker.add_device(Simulated360Eye(
+            "device-1", seed=1, state_interval=1, map_interval=1))
+        device = self._connect(broker, simulated)
+        self.assertEqual(device.state.state,
+                         Dyson360EyeMode.INACTIVE_CHARGED)
+        messages = []
+        device.add_message_listener(messages.append)
+        # No stream while docked
+        broker.update(100)
+        device.start()
+        self.assertTrue(_wait(lambda: len(messages) == 1))
+        self.assertEqual(device.state.state,
+                         Dyson360EyeMode.FULL_CLEAN_INITIATED)
+        broker.update(101)
+        self.assertTrue(_wait(lambda: len(messages) == 3))
+        self.assertEqual(device.state.state,
+                         Dyson360EyeMode.FULL_CLEAN_RUNNING)
+        self.assertEqual(device.state.battery_level, 99)
+        self.assertTrue(isinstance(messages[2], Dyson360EyeMapGlobal))
+        self.assertEqual(messages[2].clean_id, device.state.clean_id)
+        device.set_power_mode(PowerMode.MAX)
+        device.pause()
+        self.assertTrue(_wait(lambda: len(messages) == 5))
+        self.assertEqual(device.state.state,
+                         Dyson360EyeMode.FULL_CLEAN_PAUSED)
+        self.assertEqual(simulated.current_state()["defaultVacuumPowerMode"],
+                         "fullPower")
+
+    def test_bad_credentials(self):
+        broker = SimulatedBroker()
+        broker.add_device(SimulatedPureCoolLink("device-1"))
+        device = DeviceFactory().create(SimulatedPureCoolLink(
+            "device-1", password="other").json_body())
+        device.client_factory = broker.client
+        self.assertFalse(device.connect("127.0.0.1"))
+
+    def test_offline(self):
+        broker = SimulatedBroker()
+        simulated = broker.add_device(SimulatedPureCoolLink("device-1"))
+        simulated.online = False
+        device = DeviceFactory().create(simulated.json_body())
+        device.client_factory = broker.client
+        result = device.connect_with_deadline("127.0.0.1", timeout=1)
+        self.assertFalse(result.connected)
+        self.assertEqual(result.failed_phase, "tcp")
+
+    def test_connection_lost(self):
+        broker = SimulatedBroker()
+        simulated = broker.add_device(SimulatedPureCoolLink("device-1"))
+        device = self._connect(broker, simulated)
+        device.enable_auto_reconnect(0.001, 0.01, timeout=1)
+        simulated.disconnect_clients()
+        self.assertTrue(_wait(lambda: device.reconnects == 1 and
+                              device.device_available))
+
+    def test_start_stop(self):
+        broker = SimulatedBroker(tick=0.01)
+        simulated = broker.add_devices(SimulatedPureCoolLink, 5,
+                                       sensor_interval=0.01)
+        devices = [self._connect(broker, device) for device in simulated]
+        published = broker.published
+        broker.start()
+        self.assertTrue(_wait(lambda: broker.published >= published + 10))
+        broker.stop()
+        self.assertTrue(_wait(lambda: all(
+            device._mqtt._queue.empty() for device in devices)))
+        # Commands have no subscriber
+        self.assertEqual(broker.delivered, broker.published - 10)
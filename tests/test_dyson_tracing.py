@@ -0,0 +1,169 @@
+import time
+import unittest
+from unittest.mock import Mock
+
+from libpurecoollink import dyson_tracing
+from libpurecoollink.device_factory import DeviceFactory
+from libpurecoollink.dyson_simulator import SimulatedBroker, \
+    SimulatedPureCoolLink, Simulated360Eye
+from libpurecoollink.dyson_tracing import RateSampler, RecordingTracer, \
+    Tracer, Span, enable_tracing, disable_tracing
+
+
+def _wait(condition):
+    for _ in range(500):
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def _pure_message(payload):
+    msg = Mock()
+    msg.payload = Mock()
+    msg.payload.decode.return_value = payload
+    return msg
+
+
+def _listener(message):
+    pass
+
+
+class TestDysonTracing(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        disable_tracing()
+
+    def test_rate_sampler(self):
+        sampler = RateSampler(3)
+        self.assertEqual(sampler.interval, 3)
+        self.assertEqual([sampler.sample() for _ in range(7)],
+                         [True, False, False, True, False, False, True])
+        self.assertTrue(all(RateSampler(1).sample() for _ in range(5)))
+        self.assertRaises(ValueError, RateSampler, 0)
+
+    def test_tracer(self):
+        tracer = Tracer(RateSampler(2))
+        self.assertIsNotNone(tracer.start_trace("device-1"))
+        self.assertIsNone(tracer.start_trace("device-1"))
+        self.assertEqual(Tracer().sampler.interval,
+                         dyson_tracing.DEFAULT_SAMPLE_INTERVAL)
+
+    def test_trace(self):
+        tracer = RecordingTracer(RateSampler(1), max_spans=5)
+        trace = tracer.start_trace("device-1")
+        trace.stage(dyson_tracing.DECODE)
+        trace.stage(dyson_tracing.PUBLISH)
+        listener = Mock()
+        trace.call_listeners([_listener, listener], "message")
+        trace.finish("DysonPureCoolState")
+        listener.assert_called_once_with("message")
+        spans = tracer.spans
+        self.assertEqual([span.name for span in spans],
+                         ["decode", "listener", "listener", "publish",
+                          "receive"])
+        self.assertEqual(spans[1].listener, "_listener")
+        self.assertIn("Mock", spans[2].listener)
+        self.assertEqual(spans[1].parent, spans[3])
+        self.assertEqual(spans[3].parent, spans[4])
+        self.assertIsNone(spans[4].parent)
+        for span in spans:
+            self.assertEqual(span.serial, "device-1")
+            self.assertEqual(span.message_type, "DysonPureCoolState")
+            self.assertGreaterEqual(span.duration, 0)
+            self.assertGreaterEqual(span.end, span.start)
+        self.assertTrue(spans[4].start <= spans[0].start and
+                        spans[3].end <= spans[4].end)
+        trace = tracer.start_trace("device-1")
+        trace.finish("unknown")
+        self.assertEqual(len(tracer.spans), 5)
+        self.assertEqual(tracer.spans[-1].message_type, "unknown")
+        tracer.clear()
+        self.assertEqual(tracer.spans, [])
+
+    def test_span(self):
+        span = Span("decode", "device-1")
+        self.assertIsNone(span.duration)
+        self.assertIsNone(span.end)
+        self.assertIsNone(span.listener)
+        span.finish()
+        self.assertEqual(repr(span), "Span(name=decode,serial=device-1,"
+                                     "message_type=None,listener=None,"
+                                     "duration={0})".format(span.duration))
+
+    def test_enable_disable(self):
+        self.assertIsNone(dyson_tracing.TRACER)
+        tracer = Tracer()
+        self.assertEqual(enable_tracing(tracer), tracer)
+        self.assertEqual(dyson_tracing.TRACER, tracer)
+        disable_tracing()
+        self.assertIsNone(dyson_tracing.TRACER)
+
+    def test_pure_cool_link(self):
+        tracer = enable_tracing(RecordingTracer(RateSampler(1)))
+        broker = SimulatedBroker()
+        simulated = broker.add_device(SimulatedPureCoolLink("device-1"))
+        device = DeviceFactory().create(simulated.json_body())
+        device.client_factory = broker.client
+        self.addCleanup(device.disconnect)
+        device.add_message_listener(_listener)
+        self.assertTrue(device.connect("127.0.0.1"))
+        self.assertTrue(_wait(lambda: len(tracer.spans) == 12))
+        spans = tracer.spans
+        self.assertEqual([span.name for span in spans[:6]],
+                         ["decode", "classify", "construct", "listener",
+                          "publish", "receive"])
+        self.assertEqual(
+            {span.message_type for span in spans},
+            {"DysonPureCoolState", "DysonEnvironmentalSensorState"})
+        self.assertEqual({span.serial for span in spans}, {"device-1"})
+        self.assertEqual(spans[3].listener, "_listener")
+
+    def test_pure_cool_link_unknown_message(self):
+        tracer = enable_tracing(RecordingTracer(RateSampler(1)))
+        device = DeviceFactory().create(SimulatedPureCoolLink(
+            "device-1").json_body())
+        device.on_message(None, device, _pure_message('{"msg": "OTHER"}'))
+        self.assertEqual([(span.name, span.message_type)
+                          for span in tracer.spans],
+                         [("decode", "unknown"), ("classify", "unknown"),
+                          ("receive", "unknown")])
+
+    def test_pure_cool_link_sampled(self):
+        tracer = enable_tracing(RecordingTracer(RateSampler(2)))
+        device = DeviceFactory().create(SimulatedPureCoolLink(
+            "device-1").json_body())
+        for _ in range(4):
+            device.on_message(None, device,
+                              _pure_message('{"msg": "OTHER"}'))
+        self.assertEqual(len([span for span in tracer.spans
+                              if span.name == "receive"]), 2)
+
+    def test_360_eye(self):
+        tracer = enable_tracing(RecordingTracer(RateSampler(1)))
+        broker = SimulatedBroker()
+        simulated = broker.add_device(Simulated360Eye("device-1"))
+        device = DeviceFactory().create(simulated.json_body())
+        device.client_factory = broker.client
+        self.addCleanup(lambda: device._mqtt.loop_stop())
+        device.add_message_listener(_listener)
+        device.add_raw_message_listener(_listener)
+        self.assertTrue(device.connect("127.0.0.1"))
+        self.assertTrue(_wait(lambda: len(tracer.spans) == 8))
+        spans = tracer.spans
+        self.assertEqual([span.name for span in spans],
+                         ["decode", "listener", "raw_publish", "classify",
+                          "construct", "listener", "publish", "receive"])
+        self.assertEqual(spans[1].parent, spans[2])
+        self.assertEqual(spans[5].parent, spans[6])
+        self.assertEqual({span.message_type for span in spans},
+                         {"Dyson360EyeState"})
+
+    def test_disabled(self):
+        tracer = RecordingTracer(RateSampler(1))
+        device = DeviceFactory().create(SimulatedPureCoolLink(
+            "device-1").json_body())
+        device.on_message(None, device, _pure_message('{"msg": "OTHER"}'))
+        self.assertEqual(tracer.spans, [])
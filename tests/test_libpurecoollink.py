@@ -199,6 +199,107 @@ class TestLibPureCoolLink(unittest.TestCase):
         self.assertEqual(mocked_loop_start.call_count, 1)
         self.assertEqual(mocked_loop_stop.call_count, 1)
 
+    @mock.patch('paho.mqtt.client.Client.loop_start')
+    @mock.patch('paho.mqtt.client.Client.connect')
+    def test_connect_with_deadline(self, mocked_connect, mocked_loop):
+        device = DysonPureCoolLink({
+            "Active": True,
+            "Serial": "device-id-1",
+            "Name": "device-1",
+            "ScaleUnit": "SU01",
+            "Version": "21.03.08",
+            "LocalCredentials": "1/aJ5t52WvAfn+z+fjDuef86kQDQPefbQ6/"
+                                "70ZGysII1Ke1i0ZHakFH84DZuxsSQ4KTT2v"
+                                "bCm7uYeTORULKLKQ==",
+            "AutoUpdate": True,
+            "NewVersionAvailable": False,
+            "ProductType": "475"
+        })
+        # Left over from a previous connection
+        device.connection_callback(False)
+
+        def connect(*args):
+            device.connection_callback(True)
+            device.state_data_available()
+            device.sensor_data_available()
+        mocked_connect.side_effect = connect
+        result = device.connect_with_deadline("192.168.0.2", timeout=5)
+        self.addCleanup(device.disconnect)
+        self.assertTrue(result.connected)
+        self.assertTrue(device.device_available)
+        self.assertIsNone(result.failed_phase)
+        self.assertEqual(sorted(result.timings),
+                         ["connack", "sensor", "state", "tcp"])
+        self.assertTrue(result.elapsed < 5)
+        self.assertTrue(0 < device._mqtt.connect_timeout <= 5)
+
+    @mock.patch('paho.mqtt.client.Client.disconnect')
+    @mock.patch('paho.mqtt.client.Client.loop_stop')
+    @mock.patch('paho.mqtt.client.Client.loop_start')
+    @mock.patch('paho.mqtt.client.Client.connect')
+    @mock.patch('paho.mqtt.client.Client.publish')
+    def test_connect_with_deadline_timeout(self, mocked_publish,
+                                           mocked_connect, mocked_loop_start,
+                                           mocked_loop_stop,
+                                           mocked_disconnect):
+        device = DysonPureCoolLink({
+            "Active": True,
+            "Serial": "device-id-1",
+            "Name": "device-1",
+            "ScaleUnit": "SU01",
+            "Version": "21.03.08",
+            "LocalCredentials": "1/aJ5t52WvAfn+z+fjDuef86kQDQPefbQ6/"
+                                "70ZGysII1Ke1i0ZHakFH84DZuxsSQ4KTT2v"
+                                "bCm7uYeTORULKLKQ==",
+            "AutoUpdate": True,
+            "NewVersionAvailable": False,
+            "ProductType": "475"
+        })
+
+        def connect(*args):
+            device.connection_callback(True)
+            device.state_data_available()
+        mocked_connect.side_effect = connect
+        result = device.connect_with_deadline("192.168.0.2", timeout=0.05)
+        self.assertFalse(result.connected)
+        self.assertFalse(device.connected)
+        self.assertFalse(device.device_available)
+        self.assertEqual(result.failed_phase, "sensor")
+        self.assertEqual(result.error, "timeout")
+        self.assertEqual(sorted(result.timings),
+                         ["connack", "sensor", "state", "tcp"])
+        self.assertEqual(mocked_loop_stop.call_count, 1)
+        self.assertEqual(mocked_disconnect.call_count, 1)
+        self.assertTrue("failed_phase=sensor" in result.__repr__())
+        # Late first data are discarded
+        device.sensor_data_available()
+        device._abort_connection()
+        self.assertTrue(device._sensor_data_available.empty())
+
+    @mock.patch('paho.mqtt.client.Client.loop_stop')
+    @mock.patch('paho.mqtt.client.Client.connect',
+                side_effect=ConnectionRefusedError("Connection refused"))
+    def test_connect_with_deadline_unreachable(self, mocked_connect,
+                                               mocked_loop_stop):
+        device = DysonPureCoolLink({
+            "Active": True,
+            "Serial": "device-id-1",
+            "Name": "device-1",
+            "ScaleUnit": "SU01",
+            "Version": "21.03.08",
+            "LocalCredentials": "1/aJ5t52WvAfn+z+fjDuef86kQDQPefbQ6/"
+                                "70ZGysII1Ke1i0ZHakFH84DZuxsSQ4KTT2v"
+                                "bCm7uYeTORULKLKQ==",
+            "AutoUpdate": True,
+            "NewVersionAvailable": False,
+            "ProductType": "475"
+        })
+        result = device.connect_with_deadline("192.168.0.2")
+        self.assertFalse(result.connected)
+        self.assertEqual(result.failed_phase, "tcp")
+        self.assertEqual(result.error, "Connection refused")
+        self.assertEqual(list(result.timings), ["tcp"])
+
     @mock.patch('libpurecoollink.zeroconf.Zeroconf.close')
     def test_connect_device_fail(self, mocked_close_zeroconf):
         device = DysonPureCoolLink({
@@ -405,6 +506,8 @@ class TestLibPureCoolLink(unittest.TestCase):
         device.state_data_available()
         device.sensor_data_available()
         connected = device.connect(None)
+        # Connection mocked, stop the paho network loop
+        self.addCleanup(device._mqtt.loop_stop)
         self.assertTrue(connected)
         self.assertEqual(mocked_connect.call_count, 1)
         self.assertEqual(mocked_publish.call_count, 2)
@@ -466,6 +569,8 @@ class TestLibPureCoolLink(unittest.TestCase):
         device.state_data_available()
         device.sensor_data_available()
         connected = device.auto_connect()
+        # Connection mocked, stop the paho network loop
+        self.addCleanup(device._mqtt.loop_stop)
         self.assertTrue(connected)
         self.assertEqual(mocked_connect.call_count, 1)
         device.set_configuration(fan_mode=FanMode.FAN,
@@ -508,6 +613,8 @@ class TestLibPureCoolLink(unittest.TestCase):
         device.state_data_available()
         device.sensor_data_available()
         connected = device.auto_connect()
+        # Connection mocked, stop the paho network loop
+        self.addCleanup(device._mqtt.loop_stop)
         self.assertTrue(connected)
         self.assertEqual(mocked_connect.call_count, 1)
         device.set_configuration(fan_mode=FanMode.FAN,
@@ -554,6 +661,8 @@ class TestLibPureCoolLink(unittest.TestCase):
         device.state_data_available()
         device.sensor_data_available()
         connected = device.auto_connect()
+        # Connection mocked, stop the paho network loop
+        self.addCleanup(device._mqtt.loop_stop)
         self.assertTrue(connected)
         self.assertEqual(mocked_connect.call_count, 1)
         device.set_configuration(fan_mode=FanMode.FAN,
@@ -597,6 +706,8 @@ class TestLibPureCoolLink(unittest.TestCase):
         device.state_data_available()
         device.sensor_data_available()
         connected = device.auto_connect()
+        # Connection mocked, stop the paho network loop
+        self.addCleanup(device._mqtt.loop_stop)
         self.assertTrue(connected)
         self.assertEqual(mocked_connect.call_count, 1)
         device.set_configuration(sleep_timer=10)
@@ -633,6 +744,8 @@ class TestLibPureCoolLink(unittest.TestCase):
         device.state_data_available()
         device.sensor_data_available()
         connected = device.auto_connect()
+        # Connection mocked, stop the paho network loop
+        self.addCleanup(device._mqtt.loop_stop)
         self.assertTrue(connected)
         self.assertEqual(mocked_connect.call_count, 1)
         device.set_configuration(sleep_timer=0)
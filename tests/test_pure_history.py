@@ -0,0 +1,169 @@
+import json
+import unittest
+
+from libpurecoollink.dyson_pure_cool_link import DysonPureCoolLink
+from libpurecoollink.dyson_pure_history import \
+    DysonEnvironmentalSensorHistory, DysonEnvironmentalSensorRollup, \
+    percentile
+from libpurecoollink.dyson_pure_state import DysonEnvironmentalSensorState
+
+
+def _sensor_state(humidity, temperature=2950, dust=1):
+    return DysonEnvironmentalSensorState(json.dumps({
+        "msg": "ENVIRONMENTAL-CURRENT-SENSOR-DATA",
+        "time": "2017-06-17T23:05:49.001Z",
+        "data": {
+            "tact": str(temperature),
+            "hact": "{0:04d}".format(humidity),
+            "pact": "{0:04d}".format(dust),
+            "vact": "0005",
+            "sltm": "OFF"
+        }
+    }))
+
+
+class TestDysonEnvironmentalSensorHistory(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_percentile(self):
+        self.assertIsNone(percentile([], 50))
+        self.assertEqual(percentile([1, 2, 3, 4], 50), 2.5)
+        self.assertEqual(percentile([1, 2, 3, 4], 100), 4)
+        self.assertEqual(percentile([7], 90), 7)
+
+    def test_window_stats(self):
+        history = DysonEnvironmentalSensorHistory(retention=300, interval=30)
+        self.assertEqual(history.capacity, 11)
+        for second in range(0, 300, 30):
+            history.add(_sensor_state(second // 30), second)
+        self.assertEqual(len(history), 10)
+        stats = history.stats("humidity", 90, now=270)
+        self.assertEqual(stats["count"], 4)
+        self.assertEqual(stats["min"], 6)
+        self.assertEqual(stats["max"], 9)
+        self.assertEqual(stats["mean"], 7.5)
+        self.assertEqual(stats["p50"], 7.5)
+        self.assertEqual(list(history.timestamps(60, now=270)),
+                         [210, 240, 270])
+        self.assertEqual(history.values("temperature", 0, now=270)[0], 295)
+        # Samples newer than the end of the window are excluded
+        self.assertEqual(list(history.timestamps(60, now=100)), [60, 90])
+        self.assertEqual(list(history.values("humidity", 50, now=100)),
+                         [2, 3])
+        self.assertEqual(list(history.values("humidity", 10, now=-100)), [])
+        empty = history.stats("dust", 10, now=1000)
+        self.assertEqual(empty["count"], 0)
+        self.assertIsNone(empty["mean"])
+        self.assertIsNone(empty["p99"])
+
+    def test_ring_buffer(self):
+        history = DysonEnvironmentalSensorHistory(retention=60, interval=30)
+        for second in range(0, 300, 30):
+            history.add(_sensor_state(second // 30), second)
+        self.assertEqual(len(history), 3)
+        self.assertEqual(list(history.values("humidity", now=270)),
+                         [7, 8, 9])
+        # Window is limited by retention
+        self.assertEqual(list(history.values("humidity", 1000, now=270)),
+                         [7, 8, 9])
+        self.assertEqual(history.__repr__(),
+                         "DysonEnvironmentalSensorHistory(retention=60,"
+                         "capacity=3,size=3)")
+
+    def test_device_history(self):
+        device = DysonPureCoolLink({
+            "Active": True,
+            "Serial": "device-id-1",
+            "Name": "device-1",
+            "ScaleUnit": "SU01",
+            "Version": "21.03.08",
+            "LocalCredentials": "1/aJ5t52WvAfn+z+fjDuef86kQDQPefbQ6/70ZGysII1K"
+                                "e1i0ZHakFH84DZuxsSQ4KTT2vbCm7uYeTORULKLKQ==",
+            "AutoUpdate": True,
+            "NewVersionAvailable": False,
+            "ProductType": "475"
+        })
+        self.assertIsNone(device.environmental_history)
+        history = device.enable_environmental_history(3600)
+        device.environmental_state = _sensor_state(40)
+        device.environmental_state = _sensor_state(60)
+        self.assertEqual(history.stats("humidity", 60)["mean"], 50)
+        history.on_message(_sensor_state(20))
+        history.on_message(None)
+        self.assertEqual(len(device.environmental_history), 3)
+        device.disable_environmental_history()
+        self.assertIsNone(device.environmental_history)
+        rollup = device.enable_environmental_rollup()
+        device.environmental_state = _sensor_state(40)
+        self.assertEqual(rollup.query("humidity", 60)[-1][1:], (40, 40, 40, 1))
+        self.assertIs(device.environmental_rollup, rollup)
+        device.disable_environmental_rollup()
+        self.assertIsNone(device.environmental_rollup)
+
+
+class TestDysonEnvironmentalSensorRollup(unittest.TestCase):
+    def setUp(self):
+        self.rollup = DysonEnvironmentalSensorRollup(
+            ((3600, 4), (60, 10), (900, 4)))
+        for second in range(0, 7200, 30):
+            self.rollup.add(_sensor_state(second // 30 % 10,
+                                          temperature=3000), second)
+
+    def tearDown(self):
+        pass
+
+    def test_tiers(self):
+        self.assertEqual(self.rollup.resolutions, [60, 900, 3600])
+        self.assertEqual(self.rollup.tier().resolution, 60)
+        self.assertEqual(self.rollup.tier(30).resolution, 60)
+        self.assertEqual(self.rollup.tier(1000).resolution, 900)
+        self.assertEqual(self.rollup.tier(86400).resolution, 3600)
+        # Finer tiers do not cover the window
+        self.assertEqual(self.rollup.tier(60, 600).resolution, 60)
+        self.assertEqual(self.rollup.tier(60, 601).resolution, 900)
+        self.assertEqual(self.rollup.tier(60, 7200).resolution, 3600)
+        self.assertEqual(self.rollup.tier(900, 3600).resolution, 900)
+        self.assertRaises(ValueError, self.rollup.tier, 60, 14401)
+        self.assertRaises(ValueError, self.rollup.query, "dust", 86400)
+
+    def test_query(self):
+        buckets = self.rollup.query("humidity", 120, now=7200)
+        self.assertEqual(buckets, [(7080, 6, 7, 6.5, 2),
+                                   (7140, 8, 9, 8.5, 2)])
+        buckets = self.rollup.query("humidity", 7200, 60, now=7199)
+        self.assertEqual([bucket[0] for bucket in buckets], [0, 3600])
+        buckets = self.rollup.query("humidity", 3600, 3600, now=7200)
+        self.assertEqual(buckets, [(3600, 0, 9, 4.5, 120)])
+        self.rollup.on_message(_sensor_state(50, temperature=3000))
+        self.rollup.on_message(None)
+
+    def test_bounded_memory(self):
+        # Only the last 10 minutes are kept with a resolution of 1 min
+        buckets = self.rollup.query("temperature", 600, 60, now=7199)
+        self.assertEqual(len(buckets), 10)
+        self.assertEqual(buckets[0][0], 6600)
+        self.assertEqual(buckets[0][1:], (300, 300, 300, 2))
+        # Old buckets are not returned once their slot is reused
+        self.assertEqual(self.rollup.query("dust", 60, 900, now=900), [])
+
+    def test_out_of_order(self):
+        # Older sample merged into its own bucket
+        self.rollup.add(_sensor_state(50, temperature=3000), 7000)
+        buckets = self.rollup.query("humidity", 180, 60, now=7199)
+        self.assertEqual(buckets[0], (6960, 2, 50, 55 / 3, 3))
+        self.assertEqual(buckets[-1], (7140, 8, 9, 8.5, 2))
+        # Sample older than the 1 min tier retention, the newer bucket
+        # using its slot is kept
+        self.rollup.add(_sensor_state(50, temperature=3000), 6500)
+        buckets = self.rollup.query("humidity", 600, 60, now=7199)
+        self.assertEqual(buckets[0], (6600, 0, 1, 0.5, 2))
+        self.assertEqual(buckets[8], (7080, 6, 7, 6.5, 2))
+        self.assertEqual(len(buckets), 10)
+        # Still merged into coarser tiers
+        buckets = self.rollup.query("humidity", 3600, 3600, now=7199)
+        self.assertEqual(buckets[-1][1:3], (0, 50))
+        self.assertEqual(buckets[-1][4], 122)
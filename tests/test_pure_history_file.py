@@ -0,0 +1,126 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from libpurecoollink.dyson_pure_history_file import DysonHistoryFile, \
+    DysonHistoryFileStore, ENVIRONMENTAL_RECORD, decode_state_record
+from libpurecoollink.dyson_pure_state import DysonEnvironmentalSensorState, \
+    DysonPureCoolState, DysonPureHotCoolState
+
+
+def _sensor_state(humidity):
+    return DysonEnvironmentalSensorState(json.dumps({
+        "msg": "ENVIRONMENTAL-CURRENT-SENSOR-DATA",
+        "time": "2017-06-17T23:05:49.001Z",
+        "data": {"tact": "2967", "hact": "{0:04d}".format(humidity),
+                 "pact": "0004", "vact": "0005", "sltm": "0028"}
+    }))
+
+
+class TestDysonHistoryFile(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "history.hist")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_ring_buffer(self):
+        history = DysonHistoryFile(self.path, ENVIRONMENTAL_RECORD, 4)
+        self.assertEqual(list(history.records()), [])
+        for second in range(6):
+            history.append(second, second * 10, 0, 0, 0, 0)
+        self.assertEqual(len(history), 4)
+        self.assertEqual([record[0] for record in history.records()],
+                         [2, 3, 4, 5])
+        self.assertEqual(len(history.views()), 2)
+        self.assertEqual([record[1] for record in history.records(1, 5)],
+                         [40, 50])
+        # Records newer than the end of the window are excluded
+        self.assertEqual([record[1] for record in history.records(1, 3)],
+                         [20, 30])
+        self.assertEqual([record[0] for record in history.records(now=4)],
+                         [2, 3, 4])
+        self.assertEqual(history.views(1, 0), [])
+        history.flush()
+        history.close()
+        self.assertEqual(os.path.getsize(self.path),
+                         32 + 4 * ENVIRONMENTAL_RECORD.size)
+
+    def test_reopen(self):
+        history = DysonHistoryFile(self.path, ENVIRONMENTAL_RECORD, 4)
+        history.append(1, 2, 3, 4, 5, 6)
+        history.close()
+        history = DysonHistoryFile(self.path, ENVIRONMENTAL_RECORD, 100)
+        self.assertEqual(history.capacity, 4)
+        self.assertEqual(list(history.records()), [(1, 2, 3, 4, 5, 6)])
+        self.assertEqual(history.__repr__(),
+                         "DysonHistoryFile(path={0},capacity=4,size=1)"
+                         .format(self.path))
+        history.close()
+
+    def test_discard(self):
+        history = DysonHistoryFile(self.path, ENVIRONMENTAL_RECORD, 4)
+        for second in range(6):
+            history.append(second, 0, 0, 0, 0, 0)
+        history.discard(3)
+        self.assertEqual([record[0] for record in history.records()], [5])
+        history.append(6, 0, 0, 0, 0, 0)
+        history.close()
+        history = DysonHistoryFile(self.path, ENVIRONMENTAL_RECORD, 4)
+        self.assertEqual([record[0] for record in history.records()], [5, 6])
+        history.discard(10)
+        self.assertEqual(len(history), 0)
+        history.close()
+
+    def test_invalid_file(self):
+        with open(self.path, "wb") as history_file:
+            history_file.write(b"x" * 64)
+        self.assertRaises(ValueError, DysonHistoryFile, self.path,
+                          ENVIRONMENTAL_RECORD)
+
+
+class TestDysonHistoryFileStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_store(self):
+        store = DysonHistoryFileStore(self.directory, "device-id-1", 10)
+        store.on_message(_sensor_state(45))
+        store.on_message(None)
+        with open("tests/data/state.json", "r") as state_file:
+            store.add_state(DysonPureCoolState(state_file.read()), 1.0)
+        with open("tests/data/state_hot.json", "r") as state_file:
+            store.add_state(DysonPureHotCoolState(state_file.read()), 5.0)
+        store.flush()
+        store.close()
+
+        store = DysonHistoryFileStore(self.directory, "device-id-1")
+        environmental = list(store.environmental.records())
+        self.assertEqual(environmental[0][1:], (45, 5, 296.7, 4, 28))
+        states = list(store.state.records())
+        self.assertEqual(len(states), 2)
+        self.assertEqual(states[0][1:4], (b"AUTO\x00\x00\x00\x00",
+                                          b"FAN\x00\x00\x00\x00\x00",
+                                          b"ON\x00\x00\x00\x00\x00\x00"))
+        fields = decode_state_record(states[0])[1]
+        self.assertEqual(fields["fmod"], "AUTO")
+        self.assertEqual(fields["filf"], "2087")
+        self.assertIsNone(fields["hmod"])
+        self.assertEqual(decode_state_record(states[1])[1]["hmax"], "2950")
+        self.assertEqual(states[1][0], 5.0)
+        self.assertEqual(list(store.state.records(2, 6)), [states[1]])
+        # Values longer than a record field are not truncated
+        with open("tests/data/state.json", "r") as state_file:
+            payload = json.loads(state_file.read())
+        payload["product-state"]["filf"] = "123456789"
+        store.add_state(DysonPureCoolState(json.dumps(payload)), 6.0)
+        fields = decode_state_record(list(store.state.records())[-1])[1]
+        self.assertIsNone(fields["filf"])
+        self.assertEqual(fields["fmod"], "AUTO")
+        store.close()
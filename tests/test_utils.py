@@ -1,7 +1,9 @@
+import datetime
 import unittest
 
 from libpurecoollink.utils import support_heating, is_heating_device, \
-    is_360_eye_device, printable_fields, decrypt_password
+    is_360_eye_device, printable_fields, decrypt_password, \
+    parse_timestamp, epoch_to_datetime
 
 
 class TestUtils(unittest.TestCase):
@@ -36,3 +38,25 @@ class TestUtils(unittest.TestCase):
                                     "ZGysII1Ke1i0ZHakFH84DZuxsSQ4KTT2vbCm7"
                                     "uYeTORULKLKQ==")
         self.assertEqual(password, "password1")
+
+    def test_parse_timestamp(self):
+        self.assertEqual(parse_timestamp("2017-07-16T07:34:31Z"), 1500190471)
+        # Cached value
+        self.assertEqual(parse_timestamp("2017-07-16T07:34:31Z"), 1500190471)
+        self.assertEqual(parse_timestamp("2016-02-29T23:59:59Z"), 1456790399)
+        self.assertRaises(ValueError, parse_timestamp, "2017-07-16 07:34:31")
+        self.assertRaises(ValueError, parse_timestamp, "2017-07-16T07:34:3xZ")
+        self.assertRaises(ValueError, parse_timestamp, "2017-02-30T00:00:00Z")
+        self.assertRaises(ValueError, parse_timestamp, "2017-13-01T00:00:00Z")
+        self.assertRaises(ValueError, parse_timestamp, "2017-07-16T24:00:00Z")
+        self.assertRaises(ValueError, parse_timestamp, "2017-07-16T07:60:00Z")
+        # Leap seconds are rejected, like datetime does
+        self.assertRaises(ValueError, parse_timestamp, "2017-01-01T00:00:60Z")
+        self.assertRaises(ValueError, parse_timestamp, "2017-01-01T00:00:61Z")
+        self.assertRaises(ValueError, parse_timestamp, "2017-07-16T 7:34:31Z")
+        self.assertRaises(ValueError, parse_timestamp, "2017-07-16T-7:34:31Z")
+        self.assertRaises(ValueError, parse_timestamp, "2017-07-16T+7:34:31Z")
+
+    def test_epoch_to_datetime(self):
+        self.assertEqual(epoch_to_datetime(1500190471),
+                         datetime.datetime(2017, 7, 16, 7, 34, 31))